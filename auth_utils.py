@@ -28,8 +28,14 @@ answers "IS THE EMPTY STRING A LEGITIMATE VALUE FOR THIS COLUMN" for every NOT
 NULL column with a bounded value domain, and the answer is always no.
 """
 
+import os
 import re
 
+import pymysql
+
+import ownership_cache
+from structured_log import log
+
 # MySQL's integer grammar for a string cast to an INT column, and NOTHING WIDER.
 # `[0-9]` is deliberate where `\d` would be shorter: Python's `\d` matches Unicode
 # digit classes ('٩٨٢٥', '１９８２５') that MySQL reads as 0, and
@@ -108,15 +114,15 @@ def check_body_keys(table, bodies):
         seen = {}
         for key in body:
             if not isinstance(key, str) or not _PLAIN_IDENTIFIER_RE.fullmatch(key):
-                print(f"Auth: {table} write with a key that is not a plain column "
-                      f"name: {key!r} — it would reach MySQL as an identifier "
-                      "spelled differently from the one this gateway checked")
+                log.info(f"Auth: {table} write with a key that is not a plain column "
+                         f"name: {key!r} — it would reach MySQL as an identifier "
+                         "spelled differently from the one this gateway checked")
                 return (400, 'BAD REQUEST')
             folded = key.lower()
             if folded in seen:
-                print(f"Auth: {table} write naming the same column twice as "
-                      f"{seen[folded]!r} and {key!r} — MySQL applies the last one, "
-                      "so any check of the first would be meaningless")
+                log.info(f"Auth: {table} write naming the same column twice as "
+                         f"{seen[folded]!r} and {key!r} — MySQL applies the last one, "
+                         "so any check of the first would be meaningless")
                 return (400, 'BAD REQUEST')
             seen[folded] = key
     return None
@@ -300,6 +306,28 @@ PROFILE_TABLE = 'profiles'
 # They are deliberately NOT read predicates: `dep_step_fk` is NULL on a
 # wall-clock gate row, so ANDing it into a SELECT would hide those rows entirely.
 #
+# `strategy` picks how that predicate is SPELLED, never what it means. All three
+# select exactly the same rows; they differ in the plan MySQL can find:
+#
+#     'in'      the form above, the default. SELECT runs it as a semi-join, but
+#               a single-table UPDATE or DELETE could not before MySQL 8.0.21
+#               and evaluates it as a dependent subquery per scanned row.
+#     'exists'  EXISTS (SELECT 1 FROM <parent> WHERE <parent>.id = <table>.<col>
+#               AND <parent>.creator_fk = %s) — correlated, one PK probe of the
+#               parent per row, for a table whose own filters are selective.
+#     'ids'     the caller's parent ids fetched FIRST, and the predicate sent as
+#               `<col> IN (<the ids>)` — a range on the scope column's index.
+#               Worth a round trip only where the parent set is small and the
+#               child set is huge; above `scope_id_list_max` parents it spells
+#               'in' instead.
+#
+# A JOIN is not offered: it is a FROM clause rather than a predicate, and a
+# multi-table DELETE accepts no ORDER BY / LIMIT, which `_purge` and chunked
+# filtered writes are built on. `tools/explain_scope_strategies.py` still
+# EXPLAINs it beside the three, for comparison, against seeded data. The
+# `junction_scope_strategies` env var (`table=strategy,...`) overrides an
+# entry without a deploy.
+#
 # ADDING A TABLE. Every table without `creator_fk` belongs here — surrogate id or
 # not, junction or child. A `verify` entry is only correct where the database
 # already enforces the reference with a real FK; see `priority_card_order` below
@@ -374,6 +402,13 @@ JUNCTION_OWNERSHIP = {
     # Maps. `map_coordinates` is a child table rather than a junction and is here
     # for exactly the same reason: no creator_fk, a surrogate id, and a GPS track
     # per row. An unscoped LIST on it hands over every user's routes.
+    #
+    # It is the table 'ids' was built for — millions of coordinates under a few
+    # hundred runs per user, and `DELETE ... ?map_run_fk=` / `_purge` are
+    # single-table statements — but 'ids' costs every GET, PUT and DELETE an
+    # extra round trip, so it stays on 'in' until
+    # `tools/explain_scope_strategies.py` shows the examined rows pay for it.
+    # `junction_scope_strategies=map_coordinates=ids` tries it without a deploy.
     'map_coordinates': {
         'scope': ('map_run_fk', 'map_runs'),
     },
@@ -754,13 +789,13 @@ def check_enum_blanks(table, bodies):
     and `.effort` one) and on a PUT it means "unchanged". Only a key the caller
     actually sent is inspected.
     """
-    columns = ENUM_COLUMNS.get(table)
+    columns = table_policy(table).enum_columns
     if not columns:
         return None
     for body in bodies:
         if not isinstance(body, dict):
             return (400, 'BAD REQUEST')
-        for column in sorted(columns):
+        for column in columns:
             present, value = body_column(body, column)
             if present and _is_blank(value):
                 # Two different outcomes were being averted, so say which one.
@@ -775,9 +810,9 @@ def check_enum_blanks(table, bodies):
                     because = ("the empty string is a legal VARCHAR and would be "
                                "stored silently under this instance's non-strict "
                                "sql_mode, matching no branch in any reader")
-                print(f"Auth: {table} write supplying a blank value for the NOT "
-                      f"NULL column {column} ({value!r}) — {because} (req #3432). "
-                      "Omit the column to take its default, or send a real value.")
+                log.info(f"Auth: {table} write supplying a blank value for the NOT "
+                         f"NULL column {column} ({value!r}) — {because} (req #3432). "
+                         "Omit the column to take its default, or send a real value.")
                 return (400, 'BAD REQUEST')
     return None
 
@@ -788,10 +823,8 @@ def junction_parent_columns(table):
 
     The scope column comes first; `verify` entries follow in declaration order.
     """
-    entry = JUNCTION_OWNERSHIP.get(table)
-    if entry is None:
-        return []
-    return [entry['scope']] + list(entry.get('verify', ()))
+    policy = table_policy(table)
+    return list(policy.references) if policy.kind == 'junction' else []
 
 
 def creator_table_reference_columns(table):
@@ -810,11 +843,9 @@ def referenced_parent_columns(table):
     The two are mutually exclusive by construction — `JUNCTION_OWNERSHIP` holds
     tables with no `creator_fk`, `CREATOR_TABLE_REFERENCES` holds tables that have
     one — and `test_the_two_registries_never_name_the_same_table` keeps it that
-    way, so the order of these branches can never matter.
+    way, so `TablePolicy` can fold them into one tuple.
     """
-    if table in JUNCTION_OWNERSHIP:
-        return junction_parent_columns(table)
-    return creator_table_reference_columns(table)
+    return list(table_policy(table).references)
 
 
 def _scope_column(table):
@@ -824,11 +855,10 @@ def _scope_column(table):
     a column comparison, so its references are all optional — which is the one
     behavioural difference between the two registries.
     """
-    entry = JUNCTION_OWNERSHIP.get(table)
-    return entry['scope'][0] if entry else None
+    return table_policy(table).scope_column
 
 
-def junction_scope_clause(table):
+def junction_scope_clause(table, strategy=None):
     """The SQL predicate scoping `table` to its owner, or None.
 
     Returns a fragment carrying exactly ONE `%s` placeholder, which the caller
@@ -836,6 +866,10 @@ def junction_scope_clause(table):
 
         step_fk IN (SELECT id FROM pipeline_steps WHERE creator_fk = %s)
 
+    spelled in `strategy`, by default the table's own (see the `strategy` key
+    above). `'ids'` needs the parent ids first, so it is spelled `'in'` here —
+    `TablePolicy.scope` is what fetches them.
+
     Table and column names come from the hard-coded registry above, never from a
     request, so the interpolation here introduces no injection surface. The
     subquery always targets a DIFFERENT table than the statement it scopes, so it
@@ -845,9 +879,172 @@ def junction_scope_clause(table):
     if entry is None:
         return None
     column, parent = entry['scope']
+    if strategy is None:
+        strategy = _scope_strategy(table)
+    if strategy == 'exists':
+        return (f"EXISTS (SELECT 1 FROM {parent} WHERE {parent}.id = {table}.{column} "
+                f"AND {parent}.creator_fk = %s)")
     return f"{column} IN (SELECT id FROM {parent} WHERE creator_fk = %s)"
 
 
+def scope_id_list_clause(column, ids):
+    """`'ids'`' predicate: `column` among `ids`, one `%s` per id. No ids — a
+    caller who owns no parent — is FALSE, not `IN ()`, which MySQL refuses."""
+    if not ids:
+        return 'FALSE'
+    return f"{column} IN ({', '.join(['%s'] * len(ids))})"
+
+
+def owned_parent_ids(conn, parent, authenticated_user):
+    """The ids of every `parent` row the caller owns, or None when there are
+    more than SCOPE_ID_LIST_MAX or the read failed — either way the caller
+    spells the subquery instead, which is correct at any size.
+
+    Swallowing the error is safe for the same reason: the statement this was
+    for runs next, on the same connection, and answers any real failure.
+    """
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT id FROM {parent} WHERE creator_fk = %s "
+                           f"LIMIT {SCOPE_ID_LIST_MAX + 1}", (authenticated_user,))
+            rows = cursor.fetchall()
+    except pymysql.Error as e:
+        log.warning(f"Auth: {parent} id prefetch failed, scoping by subquery: {e}")
+        return None
+    if len(rows) > SCOPE_ID_LIST_MAX:
+        return None
+    # Either cursor class, as in `resolve_parent_lookups`.
+    return [row['id'] if isinstance(row, dict) else row[0] for row in rows]
+
+
+# How each junction's scope is spelled — the `strategy` key above.
+SCOPE_STRATEGIES = ('in', 'exists', 'ids')
+
+# `table=strategy,...`, overriding the registry per table without a deploy.
+JUNCTION_SCOPE_STRATEGIES = dict(
+    pair.strip().split('=', 1)
+    for pair in os.environ.get('junction_scope_strategies', '').split(',')
+    if '=' in pair)
+
+# Most parent ids the 'ids' strategy will send as a list; above it, 'in'.
+SCOPE_ID_LIST_MAX = int(os.environ.get('scope_id_list_max', '500'))
+
+
+def _scope_strategy(table):
+    """`table`'s scope strategy: the env override, its registry entry, or 'in'.
+
+    An unknown name is a ValueError at import (`TablePolicy` compiles every
+    table), so a typo fails the cold start instead of silently spelling 'in'.
+    """
+    strategy = JUNCTION_SCOPE_STRATEGIES.get(
+        table, JUNCTION_OWNERSHIP.get(table, {}).get('strategy', 'in'))
+    if strategy not in SCOPE_STRATEGIES:
+        raise ValueError(f"unknown scope strategy {strategy!r} for {table}; "
+                         f"expected one of {SCOPE_STRATEGIES}")
+    return strategy
+
+
+# ---------------------------------------------------------------------------
+# Compiled per-table policy — every registry above, resolved once per table
+# ---------------------------------------------------------------------------
+#
+# The registries are the source of truth and stay hand-written, reviewable and
+# test-derived; this section is only a DIFFERENT SHAPE of the same facts. Every
+# verb used to re-derive its table's answer on every request — `table in
+# CREATOR_FK_TABLES`, then `== PROFILE_TABLE`, then format the junction's
+# subquery — and the same if/elif ladder was pasted into `rest_get_table`,
+# `rest_put` (twice, with `junction_scope_clause` formatted up to three times
+# per single-row PUT), `rest_delete` (twice), `rest_post` and the handler's
+# identity gate. Seven copies of one decision is seven places for a new
+# registry to be wired into six of them.
+#
+# So the decision is made once, here, at import, and every verb reads the
+# result. A table nobody registered gets `_UNSCOPED_POLICY`, which scopes
+# nothing — the same answer the ladders' final `else` gave, and the one
+# `UNSCOPED_TABLES` (empty) says no real table is allowed to get.
+#
+# Nothing here reads a request. The scope fragment is built from registry
+# names only, by `junction_scope_clause`, so precomputing it changes no SQL
+# text; a junction's `strategy` is the only thing that does. The one the
+# policy cannot precompute is 'ids', whose list is the caller's: `scope()`
+# fetches it when handed a connection.
+
+
+class TablePolicy:
+    """How the gateway treats one table, precomputed from the registries.
+
+    `kind` is `'creator_fk'`, `'profile'`, `'junction'` or None, and
+    `scope_sql` the WHERE fragment for it, with ONE `%s` for the caller.
+    `owner_column` is the column a POST forces from the token. `references`
+    is every (column, parent) a write must own, scope column first.
+    `enum_columns` is sorted, so a refusal always names the same column.
+    """
+
+    def __init__(self, table=None):
+        junction = JUNCTION_OWNERSHIP.get(table)
+        self.creator_fk = table in CREATOR_FK_TABLES
+        if self.creator_fk:
+            self.kind, self.owner_column = 'creator_fk', 'creator_fk'
+            self.scope_sql = 'creator_fk = %s'
+        elif table == PROFILE_TABLE:
+            self.kind, self.owner_column = 'profile', 'id'
+            self.scope_sql = 'id = %s'
+        elif junction is not None:
+            self.kind, self.owner_column = 'junction', None
+            self.scope_sql = junction_scope_clause(table)
+        else:
+            self.kind = self.owner_column = self.scope_sql = None
+
+        self.strategy = _scope_strategy(table) if junction is not None else None
+        if junction is not None:
+            self.scope_column, self.scope_parent = junction['scope']
+            self.references = (junction['scope'],) + tuple(junction.get('verify', ()))
+            self.fk_enforced = junction.get('fk_enforced', True)
+        else:
+            self.scope_column = self.scope_parent = None
+            self.references = tuple(CREATOR_TABLE_REFERENCES.get(table, ()))
+            self.fk_enforced = True
+
+        self.enum_columns = tuple(sorted(ENUM_COLUMNS.get(table, ())))
+        # Never reassigned by an upsert's UPDATE: the row keeps its id and owner.
+        self.protected = frozenset({'id', 'creator_fk'} if self.creator_fk else {'id'})
+        # Every verb on a scoped table needs an identity: with none there is no
+        # predicate to add, and the statement would reach every user's rows.
+        self.requires_identity = self.scope_sql is not None
+
+    def scope(self, authenticated_user, conn=None):
+        """(sql, params) confining a statement to the caller's rows, or None.
+
+        `params` binds `sql`'s placeholders: the caller, or — the `'ids'`
+        strategy, given `conn` to fetch them on — the parent ids themselves.
+        Without `conn` every strategy spells its subquery.
+        """
+        if authenticated_user is None or self.scope_sql is None:
+            return None
+        if self.strategy == 'ids' and conn is not None:
+            ids = owned_parent_ids(conn, self.scope_parent, authenticated_user)
+            if ids is not None:
+                return scope_id_list_clause(self.scope_column, ids), ids
+        return self.scope_sql, [authenticated_user]
+
+    def __repr__(self):
+        return f"TablePolicy(kind={self.kind!r}, scope_sql={self.scope_sql!r})"
+
+
+_UNSCOPED_POLICY = TablePolicy()
+
+_POLICIES = {
+    table: TablePolicy(table)
+    for table in (CREATOR_FK_TABLES | {PROFILE_TABLE} | set(JUNCTION_OWNERSHIP)
+                  | set(CREATOR_TABLE_REFERENCES) | set(ENUM_COLUMNS))
+}
+
+
+def table_policy(table):
+    """The compiled `TablePolicy` for `table`; the unscoped one if unregistered."""
+    return _POLICIES.get(table, _UNSCOPED_POLICY)
+
+
 def _reference_value(raw):
     """The id a body field names, CANONICALIZED, or None when it names nothing.
 
@@ -973,15 +1170,15 @@ def plan_parent_lookups(table, bodies, require_scope=True):
         except ValueError as e:
             # Not an integer id. MySQL would have truncated it silently under
             # this instance's non-strict sql_mode; say no instead.
-            print(f"Auth: {table} write with a non-integer parent reference: {e}")
+            log.info(f"Auth: {table} write with a non-integer parent reference: {e}")
             return {}, (400, 'BAD REQUEST')
 
         # Only a junction has a scope column, and only INSERT requires it. A
         # creator_fk table's ownership is settled by its own column, so every
         # reference it declares is optional on both verbs.
         if require_scope and scope_column is not None and named[scope_column] is None:
-            print(f"Auth: {table} write with no {scope_column} — ownership "
-                  "cannot be established")
+            log.info(f"Auth: {table} write with no {scope_column} — ownership "
+                     "cannot be established")
             return {}, (400, 'BAD REQUEST')
 
         for column, parent in columns:
@@ -998,25 +1195,63 @@ def plan_parent_lookups(table, bodies, require_scope=True):
 def resolve_parent_lookups(cursor, table, lookups, authenticated_user):
     """`(status, message)` when a planned lookup names a foreign row, else None.
 
-    One SELECT per distinct parent table. THE VERDICT IS DERIVED FROM THE ROWS THE
-    DATABASE RETURNED, never from the request's own values — see the comment on
-    the loop below; that distinction was itself a shipped bug once.
+    ONE statement for every parent table the write names — a SELECT per
+    parent, joined by UNION ALL and tagged with the parent's name — so a
+    `requirements` or `customer_releases` write naming three parents pays one
+    round trip before its INSERT rather than three. THE VERDICT IS DERIVED
+    FROM THE ROWS THE DATABASE RETURNED, never from the request's own values —
+    see the comment on the loop below; that distinction was itself a shipped
+    bug once.
     """
-    fk_enforced = JUNCTION_OWNERSHIP.get(table, {}).get('fk_enforced', True)
-
+    fk_enforced = table_policy(table).fk_enforced
+
+    # Parents this container has just seen the caller own are not asked again
+    # (ownership_cache.py). Only where the FK backs the verdict: an
+    # `fk_enforced: False` table must learn that a parent is GONE, and a cache
+    # of "yours" cannot tell it.
+    if fk_enforced:
+        lookups = {parent: [i for i in ids
+                            if not ownership_cache.owned(parent, i, authenticated_user)]
+                   for parent, ids in lookups.items()}
+        lookups = {parent: ids for parent, ids in lookups.items() if ids}
+        if not lookups:
+            return None
+
+    # Selecting creator_fk rather than filtering on it is what separates
+    # "somebody else's row" from "no row at all" — the distinction the
+    # docstring above turns on. An absent id simply is not in the result.
+    #
+    # The tag is the registry's own table name, never a request's. creator_fk
+    # is CONVERTed because UNION aggregates each column's collation across its
+    # branches and refuses ("Illegal mix of collations") when two parents were
+    # created under different ones; every scope/verify id is an INT, so `id`
+    # needs nothing.
+    branches, params = [], []
     for parent, ids in lookups.items():
-        # Selecting creator_fk rather than filtering on it is what separates
-        # "somebody else's row" from "no row at all" — the distinction the
-        # docstring above turns on. An absent id simply is not in the result.
         placeholders = ', '.join(['%s'] * len(ids))
-        cursor.execute(
-            f"SELECT id, creator_fk FROM {parent} WHERE id IN ({placeholders})",
-            tuple(ids))
-        # Tolerate either cursor class. db_connection.py opens a plain (tuple)
-        # cursor today, but tests/conftest.py builds a DictCursor connection, so
-        # both shapes live in this repo — and a KeyError raised here is NOT a
-        # pymysql.Error, so it would escape the caller's guard.
-        #
+        branches.append(f"SELECT '{parent}' AS parent_table, id, "
+                        f"CONVERT(creator_fk USING utf8mb4) AS creator_fk "
+                        f"FROM {parent} WHERE id IN ({placeholders})")
+        params.extend(ids)
+    cursor.execute(' UNION ALL '.join(branches), tuple(params))
+
+    # Tolerate either cursor class. db_connection.py opens a plain (tuple)
+    # cursor today, but tests/conftest.py builds a DictCursor connection, so
+    # both shapes live in this repo — and a KeyError raised here is NOT a
+    # pymysql.Error, so it would escape the caller's guard.
+    found = {parent: [] for parent in lookups}
+    for row in cursor.fetchall():
+        if isinstance(row, dict):
+            parent, row_id, owner = row['parent_table'], row['id'], row['creator_fk']
+        else:
+            parent, row_id, owner = row
+        found[parent].append((str(row_id), owner))
+        if fk_enforced:
+            ownership_cache.remember(parent, str(row_id), owner, authenticated_user)
+
+    # Parents are judged in plan order, so a refusal names the same parent in
+    # the log that the one-SELECT-per-parent version did.
+    for parent, ids in lookups.items():
         # THE VERDICT IS DERIVED FROM THE ROWS THE DATABASE RETURNED, never from
         # the request's own values. An earlier version keyed a dict on the DB's
         # ids and then iterated the REQUEST's strings to decide — so any id whose
@@ -1025,20 +1260,13 @@ def resolve_parent_lookups(cursor, table, lookups, authenticated_user):
         # back and wrote the row. `_reference_value` now canonicalizes as well;
         # both halves are needed, because only this one is guaranteed to be
         # comparing what the database actually said.
-        found = []
-        for row in cursor.fetchall():
-            if isinstance(row, dict):
-                found.append((str(row['id']), row['creator_fk']))
-            else:
-                found.append((str(row[0]), row[1]))
-
-        foreign = sorted(row_id for row_id, owner in found
+        foreign = sorted(row_id for row_id, owner in found[parent]
                          if owner != authenticated_user)
         if foreign:
             # Detail to the log, never to the client: the response body is a bare
             # 'FORBIDDEN' so it cannot report back which ids were the problem.
-            print(f"Auth: refused {table} write referencing {parent} row(s) "
-                  f"{foreign} owned by another creator")
+            log.warning(f"Auth: refused {table} write referencing {parent} row(s) "
+                        f"{foreign} owned by another creator")
             return (403, 'FORBIDDEN')
 
         # A parent that does not exist is normally left to the FK (see the
@@ -1047,12 +1275,12 @@ def resolve_parent_lookups(cursor, table, lookups, authenticated_user):
         # AUTO_INCREMENT reaches that id and hands it to whoever gets there.
         # Compared by COUNT, so a canonicalization slip cannot turn this into a
         # false refusal of the caller's own row either.
-        if not fk_enforced and len(found) != len(ids):
-            present = {row_id for row_id, _ in found}
+        if not fk_enforced and len(found[parent]) != len(ids):
+            present = {row_id for row_id, _ in found[parent]}
             absent = sorted(i for i in ids if i not in present)
-            print(f"Auth: refused {table} write referencing {parent} row(s) "
-                  f"{absent} that do not exist ({table} declares no foreign "
-                  "key, so nothing else would reject them)")
+            log.warning(f"Auth: refused {table} write referencing {parent} row(s) "
+                        f"{absent} that do not exist ({table} declares no foreign "
+                        "key, so nothing else would reject them)")
             return (403, 'FORBIDDEN')
 
     return None
@@ -1112,8 +1340,9 @@ def check_junction_parent_ownership(cursor, table, bodies, authenticated_user,
     absence means "unchanged", which is the common case and must not be a 400 —
     `PriorityCard.jsx` bulk-PUTs `{id, sort_order}` on every hand-sort save.
 
-    One SELECT per distinct parent TABLE, not per row and not per column, so a
-    3,000-row `map_coordinates` bulk import costs exactly one extra query.
+    One statement for every distinct parent TABLE, not per row and not per
+    column, so a 3,000-row `map_coordinates` bulk import costs exactly one extra
+    query.
 
     Three answers, and the third is the subtle one:
 
@@ -1,19 +1,42 @@
 import os
+import time
+
 import pymysql
 
+import timing
+from structured_log import log
+
 # DB credentials from environment
 endpoint = os.environ['endpoint']
 username = os.environ['username']
 password = os.environ['db_password']
 
+# How long a released connection may sit idle before it is closed instead of
+# reused. RDS drops idle sessions at `wait_timeout` (8h by default) and a NAT or
+# proxy in the path can drop them far sooner, silently — the ping below catches
+# that, but only at the price of a failed round trip. Capping idle age well
+# below any of those keeps the ping the exception rather than the rule. 0
+# disables pooling outright: every invocation connects fresh, as it did before.
+POOL_MAX_IDLE_SECONDS = float(os.environ.get('db_pool_max_idle_sec', '300'))
 
-def get_connection(database):
-    """Return a fresh DB connection for this invocation.
+# Warm-container pool: {database: (connection, released_at)}.
+#
+# One idle connection per database, because a Lambda container serves ONE
+# invocation at a time — there is never a second caller to hand a second
+# connection to. Module scope is what makes it survive between warm invocations;
+# a cold start begins with it empty.
+_POOL = {}
 
-    New connection per invocation — eliminates stale connection and zombie
-    transaction bugs entirely. Within-VPC connect time is ~5-15ms, negligible
-    vs Lambda cold start and network RTT.
-    """
+# How the pool has been earning its keep since the container started.
+#   reused     a pooled connection passed validation and was handed out
+#   opened     a fresh pymysql.connect() was made (cold, expired, or failed check)
+#   expired    a pooled connection sat idle past POOL_MAX_IDLE_SECONDS
+#   discarded  a pooled connection failed validation, or was released unhealthy
+POOL_STATS = {'reused': 0, 'opened': 0, 'expired': 0, 'discarded': 0}
+
+
+def _connect(database):
+    POOL_STATS['opened'] += 1
     return pymysql.connect(
         host=endpoint,
         user=username,
@@ -24,3 +47,201 @@ def get_connection(database):
         read_timeout=15,
         write_timeout=15,
     )
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _validate(conn):
+    """Make a pooled connection safe to hand to the next invocation, or raise.
+
+    Three checks, each for a way the previous invocation can leak state into
+    this one:
+
+      * `ping(reconnect=False)` — the server may have dropped the session while
+        the container was frozen. Reconnecting here would hide that behind a
+        fresh session that lost nothing we know about, so a dead connection is
+        discarded and the caller connects through the normal path instead.
+      * `rollback()` — a bulk write that failed half-way leaves its transaction
+        open if anything skipped the rollback; the next request must not
+        commit somebody else's half-finished batch.
+      * `autocommit(True)` — every module assumes it. A transactional path that
+        turned it off and then raised must not hand the next request a
+        connection where nothing commits.
+    """
+    conn.ping(reconnect=False)
+    conn.rollback()
+    conn.autocommit(True)
+
+
+def get_connection(database):
+    """Return a healthy DB connection for this invocation.
+
+    Reuses the connection the previous warm invocation released for the same
+    database when it is younger than POOL_MAX_IDLE_SECONDS and passes
+    `_validate`; otherwise connects fresh. A connection handed out here is no
+    longer in the pool — it goes back only through `release_connection`, so
+    two callers can never share one.
+    """
+    pooled = _POOL.pop(database, None)
+    if pooled is not None:
+        conn, released_at = pooled
+        if time.monotonic() - released_at > POOL_MAX_IDLE_SECONDS:
+            POOL_STATS['expired'] += 1
+            _close_quietly(conn)
+        else:
+            try:
+                _validate(conn)
+            except Exception as e:
+                POOL_STATS['discarded'] += 1
+                log.warning(f"DB pool: discarding {database} connection that failed "
+                            f"validation: {type(e).__name__}: {e}")
+                _close_quietly(conn)
+            else:
+                POOL_STATS['reused'] += 1
+                return conn
+    return _connect(database)
+
+
+def release_connection(database, conn, healthy=True):
+    """Return `conn` to the pool for the next warm invocation, or close it.
+
+    `healthy=False` is for a connection whose invocation ended in a driver
+    error: it may be mid-packet or mid-transaction, and validation on the next
+    acquire would only be guessing. It is closed, never pooled. With pooling
+    disabled every connection is closed, exactly as before the pool existed.
+    """
+    if not conn:
+        return
+    if not healthy or POOL_MAX_IDLE_SECONDS <= 0:
+        if not healthy:
+            POOL_STATS['discarded'] += 1
+        _close_quietly(conn)
+        return
+
+    # A connection is already parked for this database only if something
+    # acquired twice in one invocation. Keep the newer one; never leak either.
+    previous = _POOL.pop(database, None)
+    if previous is not None and previous[0] is not conn:
+        _close_quietly(previous[0])
+    _POOL[database] = (conn, time.monotonic())
+
+
+def pool_stats():
+    """A snapshot of POOL_STATS plus the databases currently holding a connection."""
+    return dict(POOL_STATS, idle=sorted(_POOL))
+
+
+class DeferredConnectError(Exception):
+    """A connect that failed on a LazyConnection's first use.
+
+    Deliberately NOT a `pymysql.Error`. The connect now happens inside whichever
+    CRUD module asks for the first cursor, and every one of them answers
+    `except pymysql.Error` with a 500 naming its own statement — so a 1040 "Too
+    many connections" would have reached the client as "HTTP GET helper SQL
+    command failed" instead of the 503 DB_CONNECTION_LIMIT that darwin-mcp backs
+    off on. Raised as something those blocks do not catch, it travels to
+    `lambda_handler`, which answers it exactly as it answered a failed eager
+    connect. `args` are the driver's own, so `args[0]` is still the errno.
+    """
+
+
+class LazyConnection:
+    """A connection that does not exist until something asks it for a cursor.
+
+    Handed to every CRUD module in place of a pymysql connection. A request the
+    gateway answers without SQL — an OPTIONS preflight, a 403 for a missing
+    identity, a 400 from `check_body_keys` or `check_enum_blanks`, a refused
+    method on a composed route — never connects at all.
+
+    `rollback()` and `commit()` on a connection that was never opened are
+    no-ops: there is no transaction to end. Anything else is forwarded to the
+    real connection, opening it first.
+    """
+
+    def __init__(self, database, connect=None):
+        self.database = database
+        self._connect = connect or get_connection
+        self._conn = None
+        self._state = 'none'
+
+    @property
+    def opened(self):
+        """True once a connection was acquired — still True after `release()`."""
+        return self._state != 'none'
+
+    @property
+    def state(self):
+        """'none' (never connected), 'reused' (from the pool) or 'opened' (fresh)."""
+        return self._state
+
+    def _open(self):
+        if self._conn is None:
+            reused_before = POOL_STATS['reused']
+            try:
+                with timing.span('connect'):
+                    self._conn = self._connect(self.database)
+            except pymysql.Error as e:
+                raise DeferredConnectError(*e.args) from e
+            self._state = ('reused' if POOL_STATS['reused'] > reused_before
+                           else 'opened')
+        return self._conn
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._open().cursor(*args, **kwargs))
+
+    def rollback(self):
+        if self._conn is not None:
+            self._conn.rollback()
+
+    def commit(self):
+        if self._conn is not None:
+            self._conn.commit()
+
+    def release(self, healthy=True):
+        """Hand the underlying connection back to the pool, if one was opened."""
+        if self._conn is not None:
+            release_connection(self.database, self._conn, healthy)
+            self._conn = None
+
+    def __getattr__(self, name):
+        return getattr(self._open(), name)
+
+
+class TimedCursor:
+    """A cursor whose statements are counted and timed into `timing`.
+
+    Handed out by `LazyConnection.cursor`, so every statement a request runs
+    lands in the `sql` phase and the `sql_statements` count without a line in
+    the CRUD modules. Everything but `execute`/`executemany` is the wrapped
+    cursor's own.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __enter__(self):
+        return TimedCursor(self._cursor.__enter__())
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, *args, **kwargs):
+        timing.count('sql_statements')
+        with timing.span('sql'):
+            return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        timing.count('sql_statements')
+        with timing.span('sql'):
+            return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
@@ -3,16 +3,23 @@ import json
 import re
 import pymysql
 
-from classifier import varDump, pretty_print_sql
-from rest_api_utils import compose_rest_response
-from db_connection import get_connection
+from structured_log import log
+from rest_api_utils import compose_rest_response, ETAG_FROM_BODY, request_header
+from db_connection import (get_connection, pool_stats, DeferredConnectError,
+                           LazyConnection)
+from response_compression import compress_response
+import timing
 from rest_get_database import rest_get_database
 from rest_get_table import rest_get_table
 from rest_put import rest_put
 from rest_post import rest_post
 from rest_delete import rest_delete
-from auth_utils import (get_authenticated_user, CREATOR_FK_TABLES,
-                        JUNCTION_OWNERSHIP, PROFILE_TABLE)
+from rest_filtered import rest_filtered_write, is_filtered_write
+from rest_batch import rest_batch, BATCH_ROUTE
+from rest_tx import rest_tx, TX_ROUTE
+from rest_purge import rest_purge, PURGE_ROUTE
+from idempotency import idempotent_write, IDEMPOTENCY_HEADER
+from auth_utils import get_authenticated_user, table_policy
 import pipeline2_compose
 
 # req #3367 — the ONE non-generic route (remediation B, composing form).
@@ -58,6 +65,27 @@ def _parse_id_qsp(event):
         return None
     return int(raw.strip())
 
+def _return_preference(event):
+    """What a POST or PUT answers with beyond the status: `minimal` (the id
+    only) or `rows` (every row written, read back), from `?return=` or RFC
+    7240's `Prefer: return=minimal`. None for the default. A PUT reads `rows`
+    only."""
+    qsp = event.get('queryStringParameters') or {}
+    if qsp.get('return') in ('minimal', 'rows'):
+        return qsp['return']
+    prefer = request_header(event, 'Prefer') or ''
+    if any(p.strip() == 'return=minimal' for p in prefer.split(',')):
+        return 'minimal'
+    return None
+
+def _conflict_preference(event):
+    """(`?on_conflict=`, `?update_columns=a,b` as a list) for a POST; (None,
+    None) for a plain INSERT. rest_post refuses an on_conflict it does not know."""
+    qsp = event.get('queryStringParameters') or {}
+    columns = [name.strip() for name in (qsp.get('update_columns') or '').split(',')
+               if name.strip()]
+    return qsp.get('on_conflict'), columns or None
+
 def parse_path(path):
 
     #
@@ -72,20 +100,51 @@ def parse_path(path):
     if table and not SAFE_NAME_RE.match(table):
         return {'path': path, 'database': database, 'table': '', 'conn': '', 'error': f"Invalid table name: {table}"}
 
-    conn = get_connection(database) if database in db_names else ''
+    # Lazy: nothing connects until a CRUD module asks for its first cursor, so
+    # the requests answered without SQL (OPTIONS, the 403s, the body-validation
+    # 400s) never pay for a handshake. `get_connection` is passed rather than
+    # defaulted so a patch of this module's name still reaches the connect.
+    conn = LazyConnection(database, get_connection) if database in db_names else ''
 
-    #varDump({'path': path, 'database': database, 'table': table}, 'parse_path results', 'json')
+    #log.debug('parse_path results', path=path, database=database, table=table)
     return {'path': path, 'database': database, 'table': table, 'conn': conn}
 
 
+def _route(event):
+    """`METHOD /database/table` for the per-route compression and timing
+    metrics. Anything that is not one of our databases and a well-formed table
+    name is `unrouted`, so a scan of random paths cannot mint a metric
+    dimension per path."""
+    method = event.get('httpMethod')
+    split_path = (event.get('path') or '/')[1:].split('/')
+    database = split_path[0]
+    table = split_path[1] if len(split_path) > 1 else ''
+    if database not in db_names or (table and not SAFE_NAME_RE.match(table)):
+        return f"{method} unrouted"
+    return f"{method} /{database}/{table}"
+
+
 #FAAS ENTRY POINT: the AWS Lambda function is configured to call this function by name.
 def lambda_handler(event, context):
+    # Timed around everything, the pool release included, so `total` in the
+    # Server-Timing header and the metrics line is the invocation as billed.
+    route = _route(event)
+    timing.start_invocation(context)
+    log.begin_invocation(route)
+    response = _handle_event(event, context)
+    timing.finish_invocation(response, route)
+    return response
+
+
+def _handle_event(event, context):
     db_info = None
+    # A connection whose invocation ended in a driver error is closed rather
+    # than pooled — see db_connection.release_connection.
+    healthy = True
     try:
-        #varDump(event, 'lambda_handler dump event')
-        #varDump(context, 'lambda_handler context')
+        #log.dump(event, 'lambda_handler dump event')
         path = event.get('path')
-        print(f"Lambda Handler Invoked for {path}.{event['httpMethod']}")
+        log.debug('Lambda Handler Invoked', path=path, method=event['httpMethod'])
 
         if path:
             db_info = parse_path(path)
@@ -100,42 +159,68 @@ def lambda_handler(event, context):
         else:
             response = compose_rest_response(404, '', f"URL/path not found: {path}")
 
-        return response
-    except pymysql.OperationalError as e:
+        # Every route's response, compressed in one place rather than
+        # threading Accept-Encoding through each CRUD module. Keyed by method
+        # and path so COMPRESSION_STATS reports the bytes saved per route.
+        compress_response(response, request_header(event, 'Accept-Encoding'),
+                          _route(event))
+        return _record_connection(response, db_info)
+    except (pymysql.OperationalError, DeferredConnectError) as e:
+        # DeferredConnectError is the lazy connect failing inside a CRUD module
+        # — the same failure the eager connect in parse_path used to raise here.
+        healthy = False
         code = e.args[0] if e.args else 0
         if code == 1040:
-            print(f"DB_CONNECTION_LIMIT ({code}): {e}")
+            log.error(f"DB_CONNECTION_LIMIT ({code}): {e}")
             return compose_rest_response(503, '', 'DB_CONNECTION_LIMIT')
-        print(f"DB_ERROR ({code}): {e}")
+        log.error(f"DB_ERROR ({code}): {e}")
         return compose_rest_response(503, '', 'DB_UNAVAILABLE')
     except Exception as e:
-        print(f"UNHANDLED_EXCEPTION {type(e).__name__}: {e}")
+        healthy = False
+        log.error(f"UNHANDLED_EXCEPTION {type(e).__name__}: {e}")
         return compose_rest_response(503, '', 'SERVICE_UNAVAILABLE')
     finally:
+        # Released, not closed: the next warm invocation against the same
+        # database reuses it after db_connection validates it. A LazyConnection
+        # that never connected has nothing to release.
         if db_info and db_info.get('conn'):
-            try:
-                db_info['conn'].close()
-            except Exception:
-                pass
+            db_info['conn'].release(healthy)
+            if log.enabled('DEBUG'):
+                log.debug('DB pool', **pool_stats())
+
+
+def _record_connection(response, db_info):
+    """Stamp whether this invocation touched the database at all.
+
+    `X-Db-Connection` is `none` when the request was answered without SQL,
+    `reused` for a warm pooled connection and `opened` for a fresh connect —
+    countable per route in the API Gateway access log, which is how we measure
+    the invocations that skip the database entirely.
+    """
+    conn = db_info.get('conn')
+    state = conn.state if isinstance(conn, LazyConnection) else 'none'
+    response.setdefault('headers', {})['X-Db-Connection'] = state
+    log.debug('DB connection', state=state)
+    return response
 
 def rest_api_from_table(event, db_info):
 
-    #varDump(db_info, "db_info at start of rest_api_from_table call")
+    #log.dump(db_info, "db_info at start of rest_api_from_table call")
     database = db_info['database']
     table = db_info['table']
     conn = db_info['conn']
     http_method = event.get('httpMethod')
 
     if not event:
-        print('no event')
+        log.error('no event')
         return compose_rest_response(500, '', 'REST API call received with no event')
 
     if not conn:
-        print('no conn')
+        log.error('no conn')
         return compose_rest_response(500, '', 'REST API call, no database connection')
 
     if not http_method:
-        print('No HTTP method')
+        log.error('No HTTP method')
         return compose_rest_response(500, '', 'REST API call received with no HTTP method')
 
     # OPTIONS (CORS preflight) — no auth required
@@ -151,7 +236,29 @@ def rest_api_from_table(event, db_info):
         return _rest_pipeline_compose(table, conn, event, http_method,
                                        authenticated_user)
 
-    # Block unauthenticated access to user-scoped tables.
+    # Many sub-requests, one invocation and one connection. Each item comes back
+    # through this function, so it meets every check below on its own merits.
+    if table == BATCH_ROUTE:
+        body = json.loads(event['body']) if event['body'] is not None else None
+        return rest_batch(http_method, conn, database, event, body,
+                          lambda sub_event, sub_table: rest_api_from_table(
+                              sub_event, dict(db_info, table=sub_table)))
+
+    # An ordered write graph in ONE transaction, later items naming the rows
+    # earlier ones created (`"area_fk": "$ref:0"`). Same per-item dispatch.
+    if table == TX_ROUTE:
+        body = json.loads(event['body']) if event['body'] is not None else None
+        return rest_tx(http_method, conn, database, event, body,
+                       lambda sub_event, sub_table: rest_api_from_table(
+                           sub_event, dict(db_info, table=sub_table)))
+
+    # Chunked, deadline-aware pruning of the append-only telemetry tables.
+    # It answers a missing identity itself: the table is in the query string.
+    if table == PURGE_ROUTE:
+        return rest_purge(http_method, conn, database, event, authenticated_user)
+
+    # Block unauthenticated access to user-scoped tables — every table whose
+    # compiled policy carries a scope (auth_utils.TablePolicy).
     #
     # JUNCTION_OWNERSHIP tables join in (req #3122). Their scoping is derived
     # from a parent's creator_fk, so with no identity there is nothing to derive
@@ -159,23 +266,45 @@ def rest_api_from_table(event, db_info):
     # back every user's rows. API Gateway's Cognito authorizer should mean this
     # never fires; it is the second lock, for the day the authorizer is
     # misconfigured on one route.
-    if (table in CREATOR_FK_TABLES or table == PROFILE_TABLE
-            or table in JUNCTION_OWNERSHIP):
+    if table_policy(table).requires_identity:
         if authenticated_user is None:
-            print(f'Auth: unauthenticated request to user table {table}')
+            log.warning(f'Auth: unauthenticated request to user table {table}')
             return compose_rest_response(403, '', 'FORBIDDEN')
 
     body = None
     if event['body'] is not None:
         body = json.loads(event['body'])
 
+    # A retried write with the same key answers with the first attempt's
+    # response instead of running again — see idempotency.py.
+    idempotency_key = request_header(event, IDEMPOTENCY_HEADER)
+    if idempotency_key is not None and http_method in (put_method, post_method,
+                                                       delete_method):
+        return idempotent_write(conn, event, authenticated_user, idempotency_key,
+                                lambda: _dispatch_method(event, conn, database, table,
+                                                         body, authenticated_user))
+
+    return _dispatch_method(event, conn, database, table, body, authenticated_user)
+
+
+def _dispatch_method(event, conn, database, table, body, authenticated_user):
+    http_method = event.get('httpMethod')
+
     #
     # FILTER BY HTTP METHOD
     #
+    # `PUT|DELETE ?area_fk=12&confirm=true` — the rows are chosen by the GET
+    # filter grammar rather than by ids in the body. See rest_filtered.py.
+    if http_method in (put_method, delete_method) and is_filtered_write(
+            event, conn, database, table):
+        return rest_filtered_write(http_method, conn, database, table, event, body,
+                                   authenticated_user)
+
     if http_method == put_method:
 
         # PUT Method
-        return rest_put(put_method, conn, database, table, body, authenticated_user)
+        return rest_put(put_method, conn, database, table, body, authenticated_user,
+                        return_rows=_return_preference(event) == 'rows')
 
     elif http_method == get_method:
 
@@ -188,7 +317,12 @@ def rest_api_from_table(event, db_info):
     elif http_method == post_method:
 
         # POST Method
-        return rest_post(post_method, conn, database, table, body, authenticated_user)
+        preference = _return_preference(event)
+        on_conflict, update_columns = _conflict_preference(event)
+        return rest_post(post_method, conn, database, table, body, authenticated_user,
+                         return_minimal=preference == 'minimal',
+                         return_rows=preference == 'rows',
+                         on_conflict=on_conflict, update_columns=update_columns)
 
     elif http_method == delete_method:
 
@@ -204,11 +338,11 @@ def _rest_pipeline_compose(table, conn, event, http_method, authenticated_user):
         return compose_rest_response(
             400, '', f"{table} is a read-only composed route; {http_method} not allowed")
 
-    # Same gate the generic CREATOR_FK_TABLES check gives every other
+    # Same gate the generic `requires_identity` check gives every other
     # user-scoped table — this route names none of the real table names that
     # check matches on, so it needs its own.
     if authenticated_user is None:
-        print(f'Auth: unauthenticated request to composed route {table}')
+        log.warning(f'Auth: unauthenticated request to composed route {table}')
         return compose_rest_response(403, '', 'FORBIDDEN')
 
     row_id = _parse_id_qsp(event)
@@ -222,9 +356,12 @@ def _rest_pipeline_compose(table, conn, event, http_method, authenticated_user):
         # A data-integrity issue (epic names a pipeline_fk that does not
         # resolve for this creator) — real but not the caller's fault to fix
         # by retrying, so 500 rather than 400/404.
-        print(f"{table} data integrity error: {e}")
+        log.error(f"{table} data integrity error: {e}")
         return compose_rest_response(500, '', str(e))
 
     if composed is None:
         return compose_rest_response(404, '', 'NOT FOUND')
-    return compose_rest_response(200, composed)
+    # darwin-mcp re-polls this route constantly. It reads a dozen tables, so
+    # there is no cheap validator; hashing the body still saves the bytes.
+    return compose_rest_response(200, composed, etag=ETAG_FROM_BODY,
+                                 if_none_match=request_header(event, 'If-None-Match'))
@@ -0,0 +1,188 @@
+"""`Idempotency-Key` for POST, PUT and DELETE: a retried write answers with
+the first attempt's response instead of running again.
+
+darwin-mcp retries on 503 and the UI retries on a timeout. Without this a
+retried POST inserts its rows twice, or hits 1062 and comes back 409, and the
+caller spends more GETs working out what actually happened.
+
+The first response is kept in one small table, keyed by (caller, key):
+
+    CREATE TABLE idempotency_keys (
+        creator_fk    VARCHAR(64)  NOT NULL,
+        idem_key      VARCHAR(255) NOT NULL,
+        request_hash  CHAR(64)     NOT NULL,
+        response      MEDIUMTEXT   NULL,
+        created_at    TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (creator_fk, idem_key),
+        KEY idx_idempotency_keys_created (created_at)
+    );
+
+How one keyed write runs, in ONE transaction:
+
+  1. `INSERT IGNORE` the key row. Inserted: this request owns the key, and
+     holds the row's lock until it commits. Ignored: the key exists — and if
+     its owner is still running, InnoDB makes this INSERT wait on that lock
+     rather than race it, so a concurrent duplicate reads a finished answer.
+     The ignored INSERT leaves the duplicate holding a SHARED lock on the
+     row, so it reads the row `LOCK IN SHARE MODE` and never asks for more:
+     two duplicates that both waited each hold S, and either one upgrading
+     to X (`FOR UPDATE`) would wait on the other — a 1213 deadlock.
+  2. Owner: run the write, store its response on the key row, commit — the
+     rows and the stored answer land together or not at all. A write that
+     fails is rolled back with its key, so a retry genuinely retries.
+  3. Duplicate: replay the stored response with `Idempotent-Replayed: true`.
+     The same key with a different method, path, query or body is a 422: it
+     is a client bug, and replaying either answer would hide it.
+
+A key older than `idempotency_ttl_sec` is forgotten — deleted and claimed
+afresh by the next request carrying it. Only that branch takes the row's
+exclusive lock; two duplicates racing for one expired key can still deadlock
+there, and the loser answers 409 like a lock wait timeout, to be retried. Expired rows nobody reuses are left
+to a periodic `DELETE ... WHERE created_at < ...` off the request path.
+
+Inside a transaction that is already open (a `_tx`, a transactional
+`_batch`) the key row joins it and the outer transaction decides.
+
+If the table does not exist the write runs exactly as it would without the
+header: idempotency is a safety net, not a gate.
+"""
+import hashlib
+import json
+import os
+
+import pymysql
+
+from rest_api_utils import compose_rest_response, error_detail, in_transaction
+from structured_log import log
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+IDEMPOTENCY_TABLE = os.environ.get('idempotency_table', 'idempotency_keys')
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('idempotency_ttl_sec', '86400'))
+
+MAX_KEY_LENGTH = 255
+
+# A duplicate that waited out innodb_lock_wait_timeout behind a slow owner,
+# or lost a deadlock to another duplicate re-claiming the same expired key.
+# Both mean "someone else has this key right now": 409, try again.
+LOCK_WAIT_TIMEOUT = 1205
+DEADLOCK = 1213
+
+
+def request_hash(event):
+    """sha256 of what makes two requests the same request."""
+    fingerprint = json.dumps([event.get('httpMethod'), event.get('path'),
+                              event.get('queryStringParameters') or {},
+                              event.get('body')], sort_keys=True)
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+
+def _replay(stored):
+    response = json.loads(stored)
+    response['headers'][REPLAYED_HEADER] = 'true'
+    exposed = response['headers'].get('Access-Control-Expose-Headers')
+    response['headers']['Access-Control-Expose-Headers'] = \
+        f"{exposed}, {REPLAYED_HEADER}" if exposed else REPLAYED_HEADER
+    return response
+
+
+def _claim(cursor, creator, key, fingerprint):
+    """None when this request now owns the key, else the key's stored
+    (request_hash, response) — after waiting for its owner to finish."""
+    cursor.execute(f"INSERT IGNORE INTO {IDEMPOTENCY_TABLE} "
+                   "(creator_fk, idem_key, request_hash) VALUES (%s, %s, %s)",
+                   (creator, key, fingerprint))
+    if cursor.rowcount == 1:
+        return None
+
+    # A locking read, so an outer transaction's older snapshot cannot hide
+    # the owner's committed response — but SHARED: the ignored INSERT already
+    # holds S, and asking for X here deadlocks against every other duplicate
+    # that waited on the same owner.
+    cursor.execute(f"SELECT request_hash, response, "
+                   f"created_at < NOW() - INTERVAL %s SECOND "
+                   f"FROM {IDEMPOTENCY_TABLE} "
+                   "WHERE creator_fk = %s AND idem_key = %s LOCK IN SHARE MODE",
+                   (IDEMPOTENCY_TTL_SECONDS, creator, key))
+    rows = cursor.fetchall()
+    if rows and not rows[0][2]:
+        return rows[0][:2]
+
+    # Expired (or deleted by a sweep since the INSERT): claim it afresh. The
+    # DELETE is the only exclusive lock a duplicate ever takes.
+    cursor.execute(f"DELETE FROM {IDEMPOTENCY_TABLE} "
+                   "WHERE creator_fk = %s AND idem_key = %s", (creator, key))
+    cursor.execute(f"INSERT INTO {IDEMPOTENCY_TABLE} "
+                   "(creator_fk, idem_key, request_hash) VALUES (%s, %s, %s)",
+                   (creator, key, fingerprint))
+    return None
+
+
+def idempotent_write(conn, event, authenticated_user, key, write):
+    """`write()`'s response, or the stored one when `key` has answered before.
+
+    `write` is the un-keyed dispatch — rest_post, rest_put or rest_delete with
+    every one of their checks — called at most once.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return compose_rest_response(
+            400, '', f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+
+    creator = authenticated_user or ''
+    fingerprint = request_hash(event)
+    own_transaction = not in_transaction(conn)
+
+    try:
+        if own_transaction:
+            conn.begin()
+        with conn.cursor() as cursor:
+            stored = _claim(cursor, creator, key, fingerprint)
+    except pymysql.Error as e:
+        if own_transaction:
+            conn.rollback()
+        errno, detail = error_detail(e)
+        if errno == 1146:
+            log.warning('Idempotency table missing, write runs unkeyed',
+                        table=IDEMPOTENCY_TABLE)
+            return write()
+        if errno in (LOCK_WAIT_TIMEOUT, DEADLOCK):
+            return compose_rest_response(
+                409, '', f"{IDEMPOTENCY_HEADER} {key!r} is still in progress")
+        errorMsg = f"Idempotency-Key claim failed: {errno} {detail}"
+        log.error(errorMsg)
+        return compose_rest_response(500, '', errorMsg)
+
+    if stored is not None:
+        if own_transaction:
+            conn.rollback()
+        stored_hash, response = stored
+        if stored_hash != fingerprint:
+            return compose_rest_response(
+                422, '', f"{IDEMPOTENCY_HEADER} {key!r} was used for a different request")
+        log.info('Idempotent replay', key=key)
+        return _replay(response)
+
+    response = write()
+    if response.get('statusCode', 500) >= 300:
+        # The key goes with the failed write, so the retry runs it again.
+        # Inside an outer transaction that rollback is the outer's to make.
+        if own_transaction:
+            conn.rollback()
+        return response
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"UPDATE {IDEMPOTENCY_TABLE} SET response = %s "
+                           "WHERE creator_fk = %s AND idem_key = %s",
+                           (json.dumps(response), creator, key))
+        if own_transaction:
+            conn.commit()
+    except pymysql.Error as e:
+        if own_transaction:
+            conn.rollback()
+        errno, detail = error_detail(e)
+        errorMsg = f"Idempotency-Key store failed, write rolled back: {errno} {detail}"
+        log.error(errorMsg)
+        return compose_rest_response(500, '', errorMsg)
+    return response
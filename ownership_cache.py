@@ -0,0 +1,78 @@
+"""Per-container memory of parent rows the caller was just shown to own.
+
+`parent_reference_guard` asks the same question over and over: every
+`PUT /darwin/tasks` that sets `area_fk` re-reads the same area, and every
+`map_coordinates` import re-reads the same `map_run_fk`. The answer — this
+row's creator_fk — does not change under the gateway: rest_post and rest_put
+force creator_fk from the token, so no request can hand a row to somebody
+else. This module keeps `(parent_table, id) -> creator_fk` at module scope,
+like the schema cache and the connection pool, so a warm container skips the
+lookup for a parent it has recently seen the same caller own.
+
+What it will and will not remember is the whole point:
+
+  * **Only positive ownership, by the creator asking.** A row found under
+    another creator is never stored, and neither is a row that was not found:
+    "absent" falls through to the FK as a 409, "foreign" is a 403 (see
+    `check_junction_parent_ownership`), and both are re-asked of the database
+    every time. A hit can only ever turn a lookup into the "yours" the
+    database gave moments before.
+  * **Never for a table whose verdict needs existence.** On an
+    `fk_enforced: False` table (`priority_card_order`) a parent that has been
+    deleted must be refused here, because nothing downstream will; a cached
+    "yours" would outlive the row. Those tables always ask.
+
+A parent deleted within the TTL is, on every other table, the FK's to
+refuse — the same 409 an absent parent got before there was a cache. A
+DELETE through this container forgets the table at once (`forget`); other
+warm containers keep their entry for at most OWNERSHIP_CACHE_TTL_SECONDS.
+0 turns the cache off.
+"""
+import os
+import time
+from collections import OrderedDict
+
+OWNERSHIP_CACHE_TTL_SECONDS = float(os.environ.get('ownership_cache_ttl_sec', '30'))
+OWNERSHIP_CACHE_MAX_ENTRIES = int(os.environ.get('ownership_cache_max_entries', '4096'))
+
+# {(parent_table, canonical id): (creator_fk, stored_at)}, least recently used first.
+_OWNED = OrderedDict()
+
+OWNERSHIP_STATS = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def owned(parent, row_id, authenticated_user):
+    """True when `parent` row `row_id` was recently found to be the caller's."""
+    key = (parent, row_id)
+    entry = _OWNED.get(key)
+    if entry is not None:
+        owner, stored_at = entry
+        if time.monotonic() - stored_at > OWNERSHIP_CACHE_TTL_SECONDS:
+            del _OWNED[key]
+        elif owner == authenticated_user:
+            _OWNED.move_to_end(key)
+            OWNERSHIP_STATS['hits'] += 1
+            return True
+    OWNERSHIP_STATS['misses'] += 1
+    return False
+
+
+def remember(parent, row_id, owner, authenticated_user):
+    """Store a row the database just returned — if it is the caller's."""
+    if OWNERSHIP_CACHE_TTL_SECONDS <= 0 or owner != authenticated_user:
+        return
+    key = (parent, row_id)
+    _OWNED[key] = (owner, time.monotonic())
+    _OWNED.move_to_end(key)
+    while len(_OWNED) > OWNERSHIP_CACHE_MAX_ENTRIES:
+        _OWNED.popitem(last=False)
+        OWNERSHIP_STATS['evictions'] += 1
+
+
+def forget(table=None):
+    """Drop every entry for `table` — rows of it were deleted — or all of them."""
+    if table is None:
+        _OWNED.clear()
+        return
+    for key in [key for key in _OWNED if key[0] == table]:
+        del _OWNED[key]
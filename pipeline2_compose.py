@@ -40,6 +40,7 @@ from decimal import Decimal
 import pymysql
 
 import pipeline2_derive
+from structured_log import log
 
 # ---------------------------------------------------------------------------
 # The budget ladder (req #3345 deliverable 4 / #3367 deliverable 3) — ported
@@ -141,7 +142,7 @@ def _derive(model, *, epic_scoped=False):
     try:
         return pipeline2_derive.derive_plan2(model, epic_scoped=epic_scoped)
     except Exception as e:                                 # noqa: BLE001
-        print(f"pipeline2_derive.derive_plan2 failed: {e}")
+        log.warning(f"pipeline2_derive.derive_plan2 failed: {e}")
         return withheld(
             WITHHELD_DERIVATION_FAILED, rows_complete=True,
             message=(f"the 2.0 derivation raised {e!r}. The rows above are "
@@ -0,0 +1,146 @@
+"""Negotiated response compression (`Accept-Encoding` -> `Content-Encoding`).
+
+Bodies are JSON text, which gzip shrinks five- to tenfold, and the big ones are
+big: a `pipeline_compose` payload may run up to pipeline2_compose's 3,000,000-
+byte PAYLOAD_BUDGET_BYTES, and a bulk map-coordinate read is not far behind.
+`compress_response` re-encodes a composed Lambda proxy response when the client
+accepts a coding we can produce and the body is at least COMPRESS_MIN_BYTES;
+the compressed bytes go out base64 with `isBase64Encoded: True`.
+
+API Gateway REST APIs only decode that base64 for media types listed in the
+API's `binaryMediaTypes` — the stage must list `*/*` (or `application/json`)
+or the client receives the base64 text itself. That is deployment config, so
+compression stays off until `compress_min_bytes` is set.
+
+brotli is optional: with the `brotli` package in the deployment bundle `br` is
+offered ahead of `gzip`; without it only `gzip` is ever chosen.
+"""
+import base64
+import gzip
+import os
+
+import timing
+from structured_log import log
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smallest body worth compressing. Below ~1 KB the gzip header and the base64
+# expansion (4/3) eat most of the saving. Negative disables compression.
+COMPRESS_MIN_BYTES = int(os.environ.get('compress_min_bytes', '-1'))
+# zlib level 1-9. 6 is zlib's own default: most of level 9's ratio at a
+# fraction of its CPU, which on Lambda is billed by the millisecond.
+GZIP_LEVEL = int(os.environ.get('compress_gzip_level', '6'))
+# brotli quality 0-11. Above ~5 it costs far more CPU than it saves bytes for
+# on-the-fly responses.
+BROTLI_QUALITY = int(os.environ.get('compress_brotli_quality', '4'))
+
+# Server preference, used to break a tie between equally-weighted codings.
+_ENCODERS = {
+    'gzip': lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0),
+}
+if brotli is not None:
+    _ENCODERS = {'br': lambda data: brotli.compress(data, quality=BROTLI_QUALITY),
+                 **_ENCODERS}
+
+# Bytes saved per route since the container started:
+#   {route: {'responses': n, 'compressed': n, 'bytes_in': n, 'bytes_out': n}}
+# `bytes_in`/`bytes_out` count only the compressed responses, before base64, so
+# bytes_in - bytes_out is what the coding saved on the wire.
+COMPRESSION_STATS = {}
+
+
+def choose_encoding(accept_encoding):
+    """The coding to use for an `Accept-Encoding` header, or None for identity.
+
+    Honors q-values (RFC 9110 12.5.3): `q=0` refuses a coding, `*` stands for
+    every coding not named, and among the acceptable ones the highest weight
+    wins, ties going to server preference (br, then gzip).
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+
+    best, best_q = None, 0.0
+    for coding in _ENCODERS:
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress_response(response, accept_encoding, route=None):
+    """Compress `response`'s body in place when negotiated; return `response`.
+
+    Untouched when compression is disabled, no acceptable coding is offered,
+    the body is under COMPRESS_MIN_BYTES (304s and most errors), or the
+    response is already binary or encoded — so applying it twice is harmless.
+
+    A strong ETag is weakened (`W/"..."`): it was computed over the identity
+    body, and RFC 9110 reserves strong tags for byte-identical
+    representations. If-None-Match compares weakly, so the client's re-poll
+    still matches and still earns its 304.
+    """
+    headers = response.setdefault('headers', {})
+    body = response.get('body')
+    if (COMPRESS_MIN_BYTES < 0 or not body or response.get('isBase64Encoded')
+            or 'Content-Encoding' in headers):
+        return response
+
+    stats = None
+    if route is not None:
+        stats = COMPRESSION_STATS.setdefault(
+            route, {'responses': 0, 'compressed': 0, 'bytes_in': 0, 'bytes_out': 0})
+        stats['responses'] += 1
+
+    # Vary whenever the body is large enough that the answer depends on the
+    # header, so a shared cache never hands gzip to a client that did not ask.
+    data = body.encode()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    headers['Vary'] = 'Accept-Encoding'
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    with timing.span('compress'):
+        compressed = _ENCODERS[encoding](data)
+    if len(compressed) >= len(data):
+        return response
+
+    response['body'] = base64.b64encode(compressed).decode('ascii')
+    response['isBase64Encoded'] = True
+    headers['Content-Encoding'] = encoding
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        headers['ETag'] = 'W/' + etag
+
+    if stats is not None:
+        stats['compressed'] += 1
+        stats['bytes_in'] += len(data)
+        stats['bytes_out'] += len(compressed)
+    log.debug('Compression', encoding=encoding, bytes_in=len(data),
+              bytes_out=len(compressed))
+    return response
+
+
+def compression_stats():
+    """COMPRESSION_STATS with each route's running `saved` byte count."""
+    return {route: {**stats, 'saved': stats['bytes_in'] - stats['bytes_out']}
+            for route, stats in COMPRESSION_STATS.items()}
@@ -1,54 +1,154 @@
+import hashlib
 import json
 import re
 
 import pymysql
+from pymysql.constants import SERVER_STATUS
+
+from auth_utils import (plan_parent_lookups, resolve_parent_lookups,
+                        table_policy)
+import timing
+from structured_log import log
+
+class EncodedJSON(str):
+    """A response body that is ALREADY JSON text.
+
+    `compose_rest_response` sends it as is instead of `json.dumps`-ing it a
+    second time — the `stream` GET engine (`row_stream.py`) encodes rows
+    straight into one of these.
+    """
+
+
+# Conditional GET. `compose_rest_response(..., etag=ETAG_FROM_BODY)` hashes the
+# encoded body into a strong ETag; a string `etag` is a validator the caller
+# derived without reading the rows (rest_get_table's COUNT/MAX(update_ts)).
+# Either way, a matching `If-None-Match` turns the 200 into a bodiless 304.
+ETAG_FROM_BODY = object()
+
+
+def request_header(event, name):
+    """The value of request header `name`, or None. API Gateway forwards
+    headers with whatever case the client sent (HTTP/2 clients send them all
+    lower-case), so the lookup ignores case."""
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+
+def body_etag(text):
+    """A strong ETag for a response body: the same bytes, the same tag."""
+    return '"' + hashlib.sha256(text.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """True when an If-None-Match header names `etag`.
+
+    RFC 9110 compares If-None-Match weakly, so a `W/` prefix a proxy added is
+    ignored; `*` matches any current representation.
+    """
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
 
-from classifier import varDump
-from auth_utils import (plan_parent_lookups, referenced_parent_columns,
-                        resolve_parent_lookups)
 
 #
 # json response utility function
 #
-def compose_rest_response(status_code, body='', http_message=''):
+def compose_rest_response(status_code, body='', http_message='', headers=None,
+                          etag=None, if_none_match=None):
 
     #
     # Compose AWS Lambda proxy response format
     # https://docs.aws.amazon.com/apigateway/latest/developerguide/set-up-lambda-proxy-integrations.html#api-gateway-simple-proxy-for-lambda-output-format
     #
-    print(f"HTTP Status Code: {status_code}")
+    log.debug('HTTP Status Code', status=status_code)
 
     lambda_rest_api_response = {
         'isBase64Encoded': False,
         'statusCode': status_code,
         'headers': {'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'body, Content-Type, Access-Control-Allow-Headers, Access-Control-Allow-Origin, Access-Control-Allow-Methods',
+                    'Access-Control-Allow-Headers': 'body, Content-Type, If-None-Match, Prefer, Idempotency-Key, Access-Control-Allow-Headers, Access-Control-Allow-Origin, Access-Control-Allow-Methods',
                     'Access-Control-Allow-Methods': 'PUT, GET, POST, DELETE, OPTIONS',
         }
     }
 
+    # Route-specific headers (`X-Next-Cursor` on a paged GET, ...). Browsers
+    # only let script read a non-safelisted response header that the response
+    # names in Access-Control-Expose-Headers, so each one is listed there too.
+    if headers:
+        lambda_rest_api_response['headers'].update(headers)
+        lambda_rest_api_response['headers']['Access-Control-Expose-Headers'] = \
+            ', '.join(headers)
+
+    # 304 Not Modified carries no body at all — not even the JSON `""` an
+    # empty http_message would encode to.
+    if status_code == 304:
+        lambda_rest_api_response['body'] = ''
+        return lambda_rest_api_response
+
     # On an error status the body IS http_message — whatever the caller passed as
     # `body` is discarded. http_message is usually a string; the 409 path
     # (req #3059) passes a dict, which json.dumps renders as a JSON OBJECT so the
     # client reads errno and constraint instead of parsing prose.
     if status_code not in (200, 201, 204):
-        print(f"Error message inserted into body.  {body} : {http_message}")
+        # The message, never the discarded body: that can be a whole payload.
+        log.info('Error message inserted into body', status=status_code,
+                 message=http_message)
         body = http_message
 
     #
     # json encode body, insert into response
     #
-    if body is not None:
-        lambda_rest_api_response['body'] = json.dumps(body)
+    if isinstance(body, EncodedJSON):
+        lambda_rest_api_response['body'] = str(body)
+    elif body is not None:
+        if isinstance(body, list):
+            timing.count('rows', len(body))
+        with timing.span('encode'):
+            lambda_rest_api_response['body'] = json.dumps(body)
     else:
-        print('body is empty')
+        log.debug('body is empty')
+
+    # Only a 200 is a representation worth validating; errors never get a tag.
+    if status_code == 200 and etag is not None:
+        if etag is ETAG_FROM_BODY:
+            etag = body_etag(lambda_rest_api_response.get('body') or '')
+        if etag_matches(if_none_match, etag):
+            log.debug('ETag matched If-None-Match: 304', etag=etag)
+            return not_modified_response(etag, headers)
+        _add_exposed_header(lambda_rest_api_response, 'ETag', etag)
 
-    #varDump(lambda_rest_api_response, 'Lambda proxy response')
+    #log.dump(lambda_rest_api_response, 'Lambda proxy response')
 
     return lambda_rest_api_response
 
 
+def _add_exposed_header(response, name, value):
+    response_headers = response['headers']
+    response_headers[name] = value
+    exposed = response_headers.get('Access-Control-Expose-Headers')
+    response_headers['Access-Control-Expose-Headers'] = \
+        f"{exposed}, {name}" if exposed else name
+
+
+def not_modified_response(etag, headers=None):
+    """304 for a client whose cached copy is current. The ETag is repeated, as
+    RFC 9110 requires; route headers (a page cursor) ride along unchanged."""
+    response = compose_rest_response(304, '', '', headers=headers)
+    _add_exposed_header(response, 'ETag', etag)
+    return response
+
+
 # ---------------------------------------------------------------------------
 # Parent-reference write authorization (req #3122 junctions, req #3125 creator
 # tables)
@@ -99,7 +199,7 @@ def parent_reference_guard(conn, table, bodies, authenticated_user, method,
     write, so refusing costs nothing; treating an unreadable parent table as
     "probably fine" would turn one broken query into an authorization bypass.
     """
-    if authenticated_user is None or not referenced_parent_columns(table):
+    if authenticated_user is None or not table_policy(table).references:
         return None
 
     # Planning is pure — it decides WHAT to ask without asking, so a malformed
@@ -113,14 +213,14 @@ def parent_reference_guard(conn, table, bodies, authenticated_user, method,
         return None
 
     try:
-        with conn.cursor() as cursor:
+        with timing.span('guard'), conn.cursor() as cursor:
             verdict = resolve_parent_lookups(cursor, table, lookups,
                                              authenticated_user)
     except pymysql.Error as e:
         errno, detail = error_detail(e)
         errorMsg = (f"HTTP {method} parent ownership check failed: "
                     f"{errno} {detail}")
-        print(errorMsg)
+        log.error(errorMsg)
         return compose_rest_response(500, '', errorMsg)
 
     if verdict is None:
@@ -159,6 +259,14 @@ _DUP_KEY_RE = re.compile(r"for key '([^']+)'\s*$")
 _FK_CONSTRAINT_RE = re.compile(r"CONSTRAINT `([^`]+)`")
 
 
+def in_transaction(conn):
+    """True when a transaction is already open on `conn` (a transactional
+    `_batch`, a `_tx`) — `BEGIN` would silently commit it, so a caller that
+    wants one joins it instead."""
+    return bool(getattr(conn, 'server_status', 0)
+                & SERVER_STATUS.SERVER_STATUS_IN_TRANS)
+
+
 def error_detail(exc):
     """(errno, message) from a pymysql.Error, tolerant of a short args tuple.
 
@@ -0,0 +1,156 @@
+import json
+import re
+
+from rest_api_utils import compose_rest_response, EncodedJSON
+from structured_log import log
+
+# Reserved route name: `POST /{database}/_batch`. Never a table — a leading
+# underscore names none of ours — and dispatched before the generic gateway.
+BATCH_ROUTE = '_batch'
+
+# One invocation runs every item back to back, inside Lambda's timeout and 6 MB
+# response cap; past a few dozen a caller is better served by bulk POST/PUT.
+MAX_BATCH_ITEMS = 50
+
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+
+# Route headers a sub-response carries that the caller needs per item.
+ITEM_HEADERS = ('ETag', 'X-Next-Cursor', 'X-Upsert-Result', 'X-Rows-Matched',
+                'X-Rows-Changed')
+
+# An item that never ran because an earlier one failed inside a transaction.
+FAILED_DEPENDENCY = 424
+
+TABLE_NAME_RE = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_]*$')
+
+
+def _plan_items(body):
+    """(items, transaction, None) for a well-formed batch, else (None, None, message).
+
+    The body is either the item list itself or `{"requests": [...],
+    "transaction": true}`. Every item is checked before any runs, so a typo in
+    item 7 cannot leave items 1-6 written.
+    """
+    transaction = False
+    if isinstance(body, dict):
+        transaction = body.get('transaction', False)
+        if not isinstance(transaction, bool):
+            return None, None, "_batch: 'transaction' must be true or false"
+        body = body.get('requests')
+    if not isinstance(body, list) or not body:
+        return None, None, "_batch: body must be a non-empty list of requests"
+    if len(body) > MAX_BATCH_ITEMS:
+        return None, None, f"_batch: at most {MAX_BATCH_ITEMS} requests per batch"
+
+    for index, item in enumerate(body):
+        if not isinstance(item, dict):
+            return None, None, f"_batch: item {index} is not an object"
+        method = item.get('method')
+        table = item.get('table')
+        if method not in BATCH_METHODS:
+            return None, None, (f"_batch: item {index} method must be one of "
+                                f"{', '.join(BATCH_METHODS)}")
+        # A leading underscore is a reserved route (`_batch`, `_tx`), never a
+        # table — and either would open or commit a transaction of its own.
+        if not isinstance(table, str) or not TABLE_NAME_RE.match(table) \
+                or table.startswith('_'):
+            return None, None, f"_batch: item {index} names no valid table"
+        query = item.get('query')
+        if query is not None and not (isinstance(query, dict) and all(
+                isinstance(k, str) and isinstance(v, str) for k, v in query.items())):
+            return None, None, (f"_batch: item {index} query must map parameter "
+                                "names to strings")
+        headers = item.get('headers')
+        if headers is not None and not isinstance(headers, dict):
+            return None, None, f"_batch: item {index} headers must be an object"
+    return body, transaction, None
+
+
+def sub_event(event, database, item):
+    """The API Gateway event this item would have arrived as on its own.
+
+    `requestContext` is the batch's own, so every item is scoped to the same
+    Cognito identity by exactly the code that scopes a single request.
+    """
+    body = item.get('body')
+    return {
+        'httpMethod': item['method'],
+        'path': f"/{database}/{item['table']}",
+        'queryStringParameters': item.get('query') or None,
+        'headers': item.get('headers') or {},
+        'body': json.dumps(body) if body is not None else None,
+        'requestContext': event.get('requestContext'),
+    }
+
+
+def item_json(response):
+    """One item of the batch response, as JSON text.
+
+    The sub-response body is already encoded JSON, so it is spliced in as is
+    rather than decoded and encoded again — a batch of list reads would
+    otherwise hold every payload twice over. A 304 has no body: `null`.
+    """
+    status = response.get('statusCode')
+    headers = {name: response['headers'][name] for name in ITEM_HEADERS
+               if name in response.get('headers', {})}
+    prefix = json.dumps({'status': status, 'headers': headers})[:-1]
+    return f"{prefix}, \"body\": {response.get('body') or 'null'}}}"
+
+
+def rest_batch(post_method, conn, database, event, body, dispatch):
+    """Run an ordered list of sub-requests over ONE connection.
+
+    Each item is `{"method", "table", "query", "body"[, "headers"]}` and is
+    dispatched through `dispatch(sub_event, table)` — handler.rest_api_from_table
+    on the batch's connection — exactly as if it had been its own invocation:
+    same authentication gate, same creator_fk scoping, same parent-reference
+    guard, same composed routes. What it saves is everything around that: the
+    invocation, and the connect or pool validation.
+
+    Returns 200 with `[{"status", "headers", "body"}, ...]` in request order.
+    Each item's status is its own; the batch's 200 means only that it ran.
+
+    With `"transaction": true` the items run inside one transaction. The first
+    item answering >= 400 rolls all of it back, and the items after it are
+    answered 424 without running. Otherwise every item runs under autocommit
+    and a failed item does not stop the ones after it.
+
+    A driver failure the CRUD modules do not answer themselves (a lost
+    connection, a failed deferred connect) ends the batch and reaches
+    `lambda_handler` as it would a single request. In a transaction the
+    unhealthy connection is closed, never committed.
+    """
+    if post_method != 'POST':
+        return compose_rest_response(
+            400, '', f"{BATCH_ROUTE} accepts POST only; {post_method} not allowed")
+
+    items, transaction, refusal = _plan_items(body)
+    if refusal is not None:
+        return compose_rest_response(400, '', refusal)
+
+    if transaction:
+        conn.begin()
+
+    results = []
+    failed_at = None
+    for index, item in enumerate(items):
+        if failed_at is not None:
+            results.append(json.dumps({
+                'status': FAILED_DEPENDENCY, 'headers': {},
+                'body': f"not run: item {failed_at} failed and the transaction "
+                        "was rolled back"}))
+            continue
+
+        response = dispatch(sub_event(event, database, item), item['table'])
+        log.debug('_batch item', index=index, method=item['method'],
+                  table=item['table'], status=response.get('statusCode'))
+        results.append(item_json(response))
+
+        if transaction and response.get('statusCode', 500) >= 400:
+            conn.rollback()
+            failed_at = index
+
+    if transaction and failed_at is None:
+        conn.commit()
+
+    return compose_rest_response(200, EncodedJSON('[' + ', '.join(results) + ']'))
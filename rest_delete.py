@@ -1,26 +1,28 @@
 import pymysql
-import json
 from rest_api_utils import (compose_rest_response, compose_conflict_response,
-                            error_detail, integrity_errno)
-from classifier import varDump, pretty_print_sql
-from auth_utils import CREATOR_FK_TABLES, PROFILE_TABLE, junction_scope_clause
+                            error_detail, in_transaction, integrity_errno)
+from structured_log import log, log_sql
+from auth_utils import table_policy
+from schema_cache import table_schema, invalidate_on_error
+import ownership_cache
 
-def _unknown_columns(conn, table, keys):
+def _unknown_columns(conn, database, table, keys):
     """The body keys that are not real columns on `table`.
 
     A DELETE body's key becomes a SQL identifier, so this is the boundary between
     a filter and an injection — see the call site for the payload it stops.
 
+    Read from the per-container schema cache (`schema_cache.py`), which replaced
+    a `DESC {table}` per request.
+
     Raises `pymysql.Error` rather than swallowing it, and is called from INSIDE
-    the statement's own try block for that reason: a failed `DESC` means the
+    the statement's own try block for that reason: a failed schema read means the
     database is unreachable, not that the caller sent a bad key, and answering
     400 there would tell the client to fix a request that was fine
     (`tests/test_unit_error_detail_wiring.py` holds this to a 500).
     """
-    with conn.cursor() as cursor:
-        cursor.execute(f""" DESC {table}; """)
-        columns = {row[0] for row in cursor.fetchall()}
-    return [key for key in keys if key not in columns]
+    schema = table_schema(conn, database, table)
+    return [key for key in keys if not schema.has(key)]
 
 
 def rest_delete(delete_method, conn, database, table, body, authenticated_user=None):
@@ -30,7 +32,8 @@ def rest_delete(delete_method, conn, database, table, body, authenticated_user=N
 
     # Bulk DELETE: if body is a list, delete by id IN (...) — mirror rest_post bulk path
     if isinstance(body, list):
-        return _rest_delete_bulk(delete_method, conn, table, body, authenticated_user)
+        return _rest_delete_bulk(delete_method, conn, database, table, body,
+                                 authenticated_user)
 
     # if multple key/value are provided in body default is to AND them together
     keys = list(body.keys())
@@ -47,58 +50,54 @@ def rest_delete(delete_method, conn, database, table, body, authenticated_user=N
         # pre-existing `creator_fk` scoping alike, on every table.
         # `rest_get_table` has validated its keys this way since it was written;
         # this one never did.
-        unknown = _unknown_columns(conn, table, keys)
+        unknown = _unknown_columns(conn, database, table, keys)
         if unknown:
-            print(f"HTTP {delete_method} invalid body key(s) for {table}: {unknown}")
+            log.info(f"HTTP {delete_method} invalid body key(s) for {table}: {unknown}")
             return compose_rest_response(400, '', 'BAD REQUEST')
 
         where_clause = ' AND '.join(f"{key} = %s" for key in keys)
 
-        # Add creator_fk scoping for user-owned tables
-        if authenticated_user is not None:
-            if table in CREATOR_FK_TABLES:
-                where_clause += ' AND creator_fk = %s'
-                values.append(authenticated_user)
-            elif table == PROFILE_TABLE:
-                where_clause += ' AND id = %s'
-                values.append(authenticated_user)
-            else:
-                # req #3122 — join-through scoping for tables with no creator_fk.
-                # This is the branch that used to let `DELETE /darwin/
-                # pipeline_step_deps {"id": <theirs>}` remove another user's gate,
-                # and `{"step_fk": <theirs>}` strip a whole step's dependencies.
-                junction_clause = junction_scope_clause(table)
-                if junction_clause:
-                    where_clause += f' AND {junction_clause}'
-                    values.append(authenticated_user)
+        # Add creator_fk scoping for user-owned tables — and, req #3122, the
+        # join-through scoping for tables with no creator_fk. Without the latter
+        # `DELETE /darwin/pipeline_step_deps {"id": <theirs>}` removed another
+        # user's gate, and `{"step_fk": <theirs>}` stripped a whole step's
+        # dependencies.
+        scope = table_policy(table).scope(authenticated_user, conn)
+        if scope is not None:
+            where_clause += f' AND {scope[0]}'
+            values.extend(scope[1])
 
         sql_statement = f"""
             DELETE FROM {table}
             WHERE
                 {where_clause};
         """
-        pretty_print_sql(sql_statement, delete_method)
+        log_sql(delete_method, sql_statement, values)
 
         with conn.cursor() as cursor:
             affected_rows = cursor.execute(sql_statement, tuple(values))
 
         if affected_rows == 0:
             errorMsg = f"Affected_rows = 0, 404 time"
-            print(errorMsg)
+            log.info(errorMsg)
             return compose_rest_response(404, '', 'NOT FOUND')
         else:
+            # A deleted row may be some other write's parent.
+            ownership_cache.forget(table)
             return compose_rest_response(200, '', 'OK')
 
     except pymysql.Error as e:
+        invalidate_on_error(database, e)
         errno, detail = error_detail(e)
         errorMsg = f"HTTP {delete_method} SQL FAILED: {errno} {detail}"
-        print(errorMsg)
+        log.error(errorMsg)
         if integrity_errno(e):
             return compose_conflict_response(table, e, errorMsg)
         return compose_rest_response(500, '', errorMsg)
 
 
-def _rest_delete_bulk(delete_method, conn, table, body_list, authenticated_user):
+def _rest_delete_bulk(delete_method, conn, database, table, body_list,
+                      authenticated_user):
     """Delete multiple rows via single DELETE ... WHERE id IN (...). Returns 200 / 404.
 
     Each item in body_list must carry an 'id'. Mirrors the array-body bulk path in
@@ -120,41 +119,40 @@ def _rest_delete_bulk(delete_method, conn, table, body_list, authenticated_user)
     values = list(ids)
 
     # Add creator_fk scoping for user-owned tables (same policy as single-object delete)
-    if authenticated_user is not None:
-        if table in CREATOR_FK_TABLES:
-            where_clause += ' AND creator_fk = %s'
-            values.append(authenticated_user)
-        elif table == PROFILE_TABLE:
-            where_clause += ' AND id = %s'
-            values.append(authenticated_user)
-        else:
-            junction_clause = junction_scope_clause(table)
-            if junction_clause:
-                where_clause += f' AND {junction_clause}'
-                values.append(authenticated_user)
-
+    scope = table_policy(table).scope(authenticated_user, conn)
+    if scope is not None:
+        where_clause += f' AND {scope[0]}'
+        values.extend(scope[1])
+
+    # One statement, atomic under autocommit. Inside the caller's transaction
+    # (a transactional `_batch`, a `_tx`) the rollback is the caller's to make.
+    own_transaction = not in_transaction(conn)
     try:
         sql_statement = f"""
             DELETE FROM {table}
             WHERE
                 {where_clause};
         """
-        pretty_print_sql(sql_statement, delete_method)
+        log_sql(delete_method, sql_statement, values, rows=len(ids))
 
         with conn.cursor() as cursor:
             affected_rows = cursor.execute(sql_statement, tuple(values))
 
         if affected_rows == 0:
-            print(f"Bulk DELETE affected_rows = 0, 404 time")
+            log.info("Bulk DELETE affected_rows = 0, 404 time")
             return compose_rest_response(404, '', 'NOT FOUND')
         else:
+            # A deleted row may be some other write's parent.
+            ownership_cache.forget(table)
             return compose_rest_response(200, '', 'OK')
 
     except pymysql.Error as e:
-        conn.rollback()
+        if own_transaction:
+            conn.rollback()
+        invalidate_on_error(database, e)
         errno, detail = error_detail(e)
         errorMsg = f"HTTP {delete_method} bulk SQL FAILED: {errno} {detail}"
-        print(errorMsg)
+        log.error(errorMsg)
         if integrity_errno(e):
             return compose_conflict_response(table, e, errorMsg)
         return compose_rest_response(500, '', errorMsg)
@@ -0,0 +1,325 @@
+"""Filtered PUT and DELETE: the rows to write are chosen by the GET filter
+grammar in the query string instead of an id list in the body.
+
+    PUT    /darwin/tasks?area_fk=12&done=0&confirm=true      {"done": 1}
+    DELETE /darwin/map_coordinates?map_run_fk=7&confirm=true&limit=2000
+
+Closing every task in an area used to be a GET to list the ids and then a
+PUT carrying all of them; purging a run's coordinates, a DELETE body of
+thousands of ids. Here the WHERE clause is built from the same parameters
+`rest_get_table` reads (`col=v`, `col=(a,b,c)`, `filter_ts`), through the
+same `filter_predicate`, so a filter selects exactly the rows the matching
+GET lists.
+
+Three things are not optional:
+
+  * Ownership scoping. Only a table its `TablePolicy` can confine to the
+    caller — creator_fk, the profile, a junction's parent — is writable this
+    way, and only with an identity. One predicate reaching every row in a
+    shared table is not something this route offers.
+  * `confirm=true`. A typo'd filter is a valid filter over fewer columns,
+    and without a guard a mistyped query string is a mass write.
+  * At least one filter. "Everything I own" is a filter nobody types by
+    accident, so it is not reachable by forgetting one.
+
+`limit=N` runs the write in chunks of at most N rows, keyset-walked by id:
+a non-locking `SELECT id ... ORDER BY id LIMIT N` picks the next chunk, and
+the write names those ids AND re-applies the filter and scope, so a row
+that changed in between is judged as it now stands. Each chunk commits on
+its own (autocommit, or the caller's transaction when one is open), so no
+statement holds row locks on more than N rows. Past
+`filtered_write_max_chunks` the response says `"more": true` and carries
+`X-Next-Cursor`; repeating the request with `&next=<token>` carries on past
+the last id written. Without it, a PUT whose rows still match the filter
+after the write would rewrite the same first ids on every retry and never
+reach the rest. The token is bound to the table, filters and body it was cut
+for, and its id is only ever bound as a parameter beside the caller's scope.
+
+A PUT or DELETE takes this route only when it says so — `confirm` is present,
+or a parameter names a real column of the table (or `filter_ts`). Any other
+parameter (a cache-buster, a stray `?debug=1`) leaves an id-list body on the
+path it always took.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import os
+
+import pymysql
+
+from rest_api_utils import (compose_rest_response, compose_conflict_response,
+                            error_detail, integrity_errno, parent_reference_guard)
+from structured_log import log, log_sql
+from auth_utils import (body_column, check_body_keys, check_enum_blanks,
+                        force_column, table_policy)
+from schema_cache import table_schema, invalidate_on_error
+from rest_get_table import PAGE_CURSOR_HEADER, filter_predicate
+from rest_put import CHANGED_HEADER, MATCHED_HEADER
+import ownership_cache
+
+CONFIRM_PARAM = 'confirm'
+LIMIT_PARAM = 'limit'
+NEXT_PARAM = 'next'
+
+# Query-string parameters that shape the write rather than select rows.
+# `return` is the PUT/POST preference and selects nothing.
+_CONTROL_PARAMS = (CONFIRM_PARAM, LIMIT_PARAM, NEXT_PARAM, 'return')
+
+FILTERED_WRITE_MAX_CHUNK = int(os.environ.get('filtered_write_max_chunk', '5000'))
+FILTERED_WRITE_MAX_CHUNKS = int(os.environ.get('filtered_write_max_chunks', '50'))
+
+
+def is_filtered_write(event, conn, database, table):
+    """True when a PUT or DELETE selects its rows by query string: it names
+    `confirm`, or a parameter that is a filter on `table`.
+
+    A schema read that fails answers False; the id-list path then meets the
+    same failure and answers it the way it always has.
+    """
+    qsp = event.get('queryStringParameters') or {}
+    if CONFIRM_PARAM in qsp:
+        return True
+    keys = [key for key in qsp if key not in _CONTROL_PARAMS]
+    if not keys:
+        return False
+    if 'filter_ts' in keys:
+        return True
+    try:
+        columns = table_schema(conn, database, table).name_set
+    except pymysql.Error:
+        return False
+    return any(key in columns for key in keys)
+
+
+def _fingerprint(method, table, qsp, body):
+    """What a resume token is bound to: the verb, table, selecting
+    parameters and the body every row receives."""
+    selecting = sorted((key, value) for key, value in qsp.items()
+                       if key not in (LIMIT_PARAM, NEXT_PARAM, 'return'))
+    digest = hashlib.sha256(json.dumps([method, table, selecting, body],
+                                       sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:16]
+
+
+def _encode_seek(fingerprint, seek):
+    payload = json.dumps({'f': fingerprint, 's': seek}, default=str,
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_seek(token, fingerprint):
+    """The last id a token says was written, or None for a token that is not
+    ours for THIS request."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(payload, dict) or payload.get('f') != fingerprint:
+        return None
+    seek = payload.get('s')
+    if not isinstance(seek, (int, str)) or isinstance(seek, bool):
+        return None
+    return seek
+
+
+def _where(conn, qsp, table, columns, authenticated_user):
+    """(sql, params, limit, None), or (None, None, None, (status, message))."""
+    policy = table_policy(table)
+    if authenticated_user is None or not policy.requires_identity:
+        return None, None, None, (403, 'FORBIDDEN')
+    if qsp.get(CONFIRM_PARAM) != 'true':
+        return None, None, None, (400, f"filtered write needs ?{CONFIRM_PARAM}=true")
+
+    limit = qsp.get(LIMIT_PARAM)
+    if limit is not None:
+        if not limit.isdigit() or not 0 < int(limit) <= FILTERED_WRITE_MAX_CHUNK:
+            return None, None, None, (
+                400, f"invalid limit: {limit} (1-{FILTERED_WRITE_MAX_CHUNK})")
+        if 'id' not in columns:
+            return None, None, None, (400, f"limit needs an id column on {table}")
+        limit = int(limit)
+    elif NEXT_PARAM in qsp:
+        return None, None, None, (400, f"{NEXT_PARAM} needs a {LIMIT_PARAM}")
+
+    predicates, params = [], []
+    for key, value in qsp.items():
+        if key in _CONTROL_PARAMS:
+            continue
+        # The scope below is the caller's creator_fk; a second one is noise.
+        if key == 'creator_fk' and policy.creator_fk:
+            continue
+        try:
+            predicate = filter_predicate(key, value, columns)
+        except ValueError:
+            predicate = None
+        if predicate is None:
+            return None, None, None, (400, f"invalid filter {key}={value}")
+        predicates.append(predicate[0])
+        params.extend(predicate[1])
+
+    if not predicates:
+        return None, None, None, (400, "filtered write needs at least one filter")
+
+    # Last, once the request is known to be well formed: for an 'ids' table
+    # this is a read of the caller's parent ids.
+    scope = policy.scope(authenticated_user, conn)
+    predicates.append(scope[0])
+    params.extend(scope[1])
+    return ' AND '.join(predicates), params, limit, None
+
+
+def _set_clause(method, conn, table, body, authenticated_user):
+    """(sql, params, None) for a filtered PUT's body, or (None, None, refusal).
+
+    The same checks an id-list PUT runs on each item, on the one body every
+    matched row receives.
+    """
+    if not isinstance(body, dict) or not body:
+        return None, None, compose_rest_response(400, '', 'BAD REQUEST')
+    if body_column(body, 'id')[0]:
+        # Every matched row would be given the same id.
+        log.info(f"HTTP {method} filtered: id cannot be SET on many rows")
+        return None, None, compose_rest_response(400, '', 'BAD REQUEST')
+
+    for check in (check_body_keys, check_enum_blanks):
+        refusal = check(table, [body])
+        if refusal is not None:
+            return None, None, compose_rest_response(refusal[0], '', refusal[1])
+
+    if table_policy(table).creator_fk and body_column(body, 'creator_fk')[0]:
+        force_column(body, 'creator_fk', authenticated_user)
+    refusal = parent_reference_guard(conn, table, [body], authenticated_user,
+                                     method, require_scope=False)
+    if refusal is not None:
+        return None, None, refusal
+
+    set_clause = ', '.join(f"{key} = %s" for key in body)
+    values = [None if value == "NULL" else value for value in body.values()]
+    return set_clause, values, None
+
+
+def rest_filtered_write(method, conn, database, table, event, body,
+                        authenticated_user=None):
+    """UPDATE or DELETE every row of the caller's that the query string
+    selects — see the module docstring for the grammar and the guards.
+
+    PUT answers 200 `{"matched", "changed"}` with `X-Rows-Matched` and
+    `X-Rows-Changed`, 204 when nothing changed. `matched` is only reported
+    when `changed` proves it — every chunk changed every id it selected; an
+    unchunked PUT, or a chunk some of whose rows already held the values, has
+    no id list to count under a filter the write itself may have moved, and
+    answers `changed` alone. DELETE answers 200
+    `{"deleted"}`, 404 when nothing was. Chunked, both add `"chunks"`, and
+    `"more": true` when the chunk ceiling stopped the walk early.
+    """
+    qsp = event.get('queryStringParameters') or {}
+    # Before `_set_clause` forces creator_fk into it: the body as sent.
+    fingerprint = _fingerprint(method, table, qsp, body)
+    try:
+        columns = table_schema(conn, database, table).name_set
+    except pymysql.Error as e:
+        errno, detail = error_detail(e)
+        errorMsg = f"HTTP {method} filtered write schema read failed: {errno} {detail}"
+        log.error(errorMsg)
+        return compose_rest_response(500, '', errorMsg)
+
+    where, where_params, limit, refusal = _where(conn, qsp, table, columns,
+                                                 authenticated_user)
+    if refusal is not None:
+        log.info(f"HTTP {method} filtered write refused: {refusal[1]}")
+        return compose_rest_response(refusal[0], '', refusal[1])
+
+    resumed = None
+    if NEXT_PARAM in qsp:
+        resumed = _decode_seek(qsp[NEXT_PARAM], fingerprint)
+        if resumed is None:
+            log.info(f"HTTP {method} filtered write: invalid or mismatched next cursor")
+            return compose_rest_response(400, '', 'BAD REQUEST')
+
+    if method == 'DELETE':
+        if body:
+            log.info(f"HTTP {method} filtered: a body and a filter both select rows")
+            return compose_rest_response(400, '', 'BAD REQUEST')
+        write, write_params = f"DELETE FROM {table}", []
+    else:
+        set_clause, write_params, refusal = _set_clause(method, conn, table, body,
+                                                        authenticated_user)
+        if refusal is not None:
+            return refusal
+        write = f"UPDATE {table} SET {set_clause}"
+
+    matched = changed = chunks = 0
+    more = False
+    try:
+        with conn.cursor() as cursor:
+            if limit is None:
+                sql_statement = f"{write} WHERE {where}"
+                log_sql(method, sql_statement, write_params + where_params)
+                changed = cursor.execute(sql_statement,
+                                         tuple(write_params + where_params))
+                matched = None
+            else:
+                seek = resumed
+                while True:
+                    if chunks == FILTERED_WRITE_MAX_CHUNKS:
+                        more = True
+                        break
+                    seek_sql = ' AND id > %s' if seek is not None else ''
+                    seek_params = [seek] if seek is not None else []
+                    cursor.execute(f"SELECT id FROM {table} WHERE {where}{seek_sql} "
+                                   f"ORDER BY id LIMIT {limit}",
+                                   tuple(where_params + seek_params))
+                    ids = [row[0] for row in cursor.fetchall()]
+                    if not ids:
+                        break
+                    sql_statement = (f"{write} WHERE id IN "
+                                     f"({', '.join(['%s'] * len(ids))}) AND {where}")
+                    log_sql(method, sql_statement, write_params + ids + where_params,
+                            rows=len(ids))
+                    affected = cursor.execute(
+                        sql_statement, tuple(write_params + ids + where_params))
+                    changed += affected
+                    if matched is not None and affected == len(ids):
+                        matched += affected
+                    else:
+                        matched = None
+                    chunks += 1
+                    log.info('Filtered write chunk', table=table, method=method,
+                             chunk=chunks, rows=len(ids), affected=affected)
+                    if len(ids) < limit:
+                        break
+                    seek = ids[-1]
+    except pymysql.Error as e:
+        invalidate_on_error(database, e)
+        errno, detail = error_detail(e)
+        done = f", after {chunks} committed chunk(s) ({changed} rows)" if chunks else ''
+        errorMsg = f"HTTP {method} filtered write failed{done}: {errno} {detail}"
+        log.error(errorMsg)
+        if integrity_errno(e):
+            return compose_conflict_response(table, e, errorMsg)
+        return compose_rest_response(500, '', errorMsg)
+
+    result = {"deleted": changed} if method == 'DELETE' else \
+        {"matched": matched, "changed": changed} if matched is not None else \
+        {"changed": changed}
+    if limit is not None:
+        result["chunks"] = chunks
+        if more:
+            result["more"] = True
+
+    cursor_header = {PAGE_CURSOR_HEADER: _encode_seek(fingerprint, seek)} if more else {}
+
+    if method == 'DELETE':
+        if not changed:
+            return compose_rest_response(404, '', 'NOT FOUND')
+        ownership_cache.forget(table)
+        return compose_rest_response(200, result, 'OK', headers=cursor_header or None)
+
+    headers = {CHANGED_HEADER: str(changed), **cursor_header}
+    if matched is not None:
+        headers[MATCHED_HEADER] = str(matched)
+    if not changed:
+        return compose_rest_response(204, 'NO DATA CHANGED', 'NO DATA CHANGED',
+                                     headers=headers)
+    return compose_rest_response(200, result, 'OK', headers=headers)
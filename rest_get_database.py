@@ -1,7 +1,6 @@
-import json
 import pymysql
 from rest_api_utils import compose_rest_response, error_detail
-from classifier import varDump
+from structured_log import log
 
 def rest_get_database(get_method, conn, database):
 
@@ -21,11 +20,11 @@ def rest_get_database(get_method, conn, database):
         if columns_array:
             return compose_rest_response(200, columns_array, 'OK')
         else:
-            print(f'HTTP {get_method}: show tables command failed')
+            log.info(f'HTTP {get_method}: show tables command failed')
             return compose_rest_response(404,  '', 'NOT FOUND')
 
     except pymysql.Error as e:
         errno, detail = error_detail(e)
         errorMsg = f"HTTP {get_method}: show tables command failed: {errno} {detail}"
-        print(errorMsg)
+        log.error(errorMsg)
         return compose_rest_response(500, '', errorMsg)
@@ -1,31 +1,203 @@
+import base64
+import binascii
+import hashlib
+import os
 import pymysql
 import json
-from rest_api_utils import compose_rest_response, error_detail
-from classifier import varDump, pretty_print_sql
-from auth_utils import CREATOR_FK_TABLES, PROFILE_TABLE, junction_scope_clause
+from rest_api_utils import (compose_rest_response, error_detail, EncodedJSON,
+                            ETAG_FROM_BODY, etag_matches, not_modified_response,
+                            request_header)
+from structured_log import log, log_sql
+from auth_utils import table_policy
+from schema_cache import table_schema, invalidate_on_error
+from row_stream import encode_rows
+import timing
 
-def rest_get_table(get_method, conn, database, table, event, authenticated_user=None):
+# Keyset pagination (`?limit=N[&next=<token>]`). The ceiling keeps one page well
+# inside Lambda's 6 MB response cap for the widest rows we serve.
+MAX_PAGE_LIMIT = 5000
+PAGE_CURSOR_HEADER = 'X-Next-Cursor'
 
-    # STEP 1: Execute helper SQL commands: build list of columns for the SQL
-    #         command and allow for larger group concat. Build a list of columns
-    #         to verify correct QSP
+# How an unpaged list read is serialized:
+#   group_concat  MySQL builds the JSON array (GROUP_CONCAT(JSON_OBJECT(...)))
+#   stream        plain rows through an unbuffered cursor, encoded in Python by
+#                 row_stream.encode_rows — same bytes, one copy of the payload,
+#                 and no group_concat_max_len ceiling
+GET_READ_ENGINES = ('group_concat', 'stream')
+GET_READ_ENGINE = os.environ.get('get_read_engine', 'group_concat')
+
+# Conditional GET (`If-None-Match`). Every 200 carries a strong ETag. For an
+# unpaged GROUP_CONCAT list of a table whose `update_ts` MySQL maintains (ON
+# UPDATE CURRENT_TIMESTAMP) the tag is derived from COUNT(*) and
+# MAX(update_ts) over the scoped WHERE clause rather than from the body, so a
+# conditional re-poll runs only that aggregate and skips the list query when
+# nothing changed. An insert raises the count or the max, a delete lowers the
+# count, an update raises the max — no change to the row set escapes both.
+# Rows stamped within the last VALIDATOR_SETTLE_SECONDS could still be joined
+# by another write in the same timestamp tick, so a set that recent falls back
+# to hashing the body. Everything else (pages, count(*), the stream engine)
+# hashes the body and saves only the bytes on the wire.
+VALIDATOR_COLUMN = 'update_ts'
+VALIDATOR_SETTLE_SECONDS = 1
+
+
+def _encode_page_cursor(keys, values):
+    """Opaque continuation token: the sort keys it was cut for, and the last
+    row's values for them. `default=str` renders DATETIME/DECIMAL the way MySQL
+    parses them back when the token is bound into the next page's seek."""
+    payload = json.dumps({'k': [f"{column}:{direction}" for column, direction in keys],
+                          'v': list(values)}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_page_cursor(token, keys):
+    """The values a token carries, or None when it is not one of ours for THIS sort.
+
+    A token cut under a different `sort` would seek on the wrong columns and
+    silently skip or repeat rows, so a mismatch is refused rather than reused.
+    Every value is bound as a parameter, never interpolated — a forged token can
+    only ever move the seek point within the caller's own scoped rows.
+    """
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(f""" DESC {table}; """)
-            rows = cursor.fetchall()
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(payload, dict):
+        return None
+    values = payload.get('v')
+    if payload.get('k') != [f"{column}:{direction}" for column, direction in keys]:
+        return None
+    if not isinstance(values, list) or len(values) != len(keys):
+        return None
+    if not all(value is None or isinstance(value, (str, int, float))
+               and not isinstance(value, bool) for value in values):
+        return None
+    return values
+
+
+def _seek_predicate(keys, values, schema):
+    """`(sql, params)` selecting the rows strictly AFTER `values` in `keys` order.
+
+    The common case — one direction, no NULLable key — is the row comparison
+    `(sort_col, id) > (%s, %s)`, which MySQL answers as an index range seek.
+    Anything else expands to the equivalent OR-of-prefixes, with NULL placed
+    where MySQL sorts it (first ascending, last descending); a plain `>` against
+    a NULL is never true, so the row form would silently drop those rows.
+    """
+    directions = {direction for _, direction in keys}
+    nullable = any(schema.by_name[column].nullable for column, _ in keys)
+    if len(directions) == 1 and not nullable and None not in values:
+        operator = '>' if directions == {'asc'} else '<'
+        columns = ', '.join(column for column, _ in keys)
+        placeholders = ', '.join(['%s'] * len(keys))
+        return f"({columns}) {operator} ({placeholders})", list(values)
+
+    disjuncts, params = [], []
+    for index, (column, direction) in enumerate(keys):
+        parts, part_params = [], []
+        for (prefix, _), value in zip(keys[:index], values[:index]):
+            if value is None:
+                parts.append(f"{prefix} IS NULL")
+            else:
+                parts.append(f"{prefix} = %s")
+                part_params.append(value)
+        value = values[index]
+        if direction == 'asc':
+            if value is None:
+                parts.append(f"{column} IS NOT NULL")
+            else:
+                parts.append(f"{column} > %s")
+                part_params.append(value)
+        else:
+            if value is None:
+                continue        # NULL sorts last descending: nothing follows it
+            parts.append(f"({column} < %s OR {column} IS NULL)")
+            part_params.append(value)
+        disjuncts.append('(' + ' AND '.join(parts) + ')')
+        params.extend(part_params)
+    if not disjuncts:
+        return 'FALSE', []
+    return '(' + ' OR '.join(disjuncts) + ')', params
+
+
+def _has_validator(schema):
+    column = schema.by_name.get(VALIDATOR_COLUMN)
+    return bool(column and column.on_update)
+
+
+def _validator_select():
+    """The aggregate columns that make up the cheap validator."""
+    return (f"COUNT(*), MAX({VALIDATOR_COLUMN}), "
+            f"MAX({VALIDATOR_COLUMN}) >= NOW() - INTERVAL {VALIDATOR_SETTLE_SECONDS} SECOND")
+
+
+def _validator_etag(shape, row_count, max_update_ts, settling):
+    """The strong ETag for `shape`'s rows, or None when it cannot be trusted.
+
+    `shape` pins the query — table, columns, scoped WHERE clause and its
+    parameters (so the caller's identity), and order — so two URLs or two
+    users never share a tag. An empty set is a 404, which carries no tag.
+    """
+    if not row_count or settling or max_update_ts is None:
+        return None
+    digest = hashlib.sha256(f"{shape}|{row_count}|{max_update_ts}".encode())
+    return '"ts-' + digest.hexdigest()[:32] + '"'
+
+
+def filter_predicate(key, value, columns):
+    """`(sql, params)` for one filter parameter of the GET grammar, or None
+    when `key` is not a filter at all (`sort`, `fields`, `limit`, ...).
+
+        ?area_fk=5                                   area_fk = %s
+        ?area_fk=(1,2,4)                             area_fk in (%s, %s, %s)
+        ?filter_ts=(done_ts,2022-08-06T07:00:00,2022-08-07T07:00:00)
+                                                     done_ts BETWEEN %s AND %s
+
+    Column names are checked against `columns` before they are interpolated;
+    every value is a parameter. Raises ValueError for a `filter_ts` that does
+    not name a column and two bounds. Shared by the GET list read and the
+    filtered PUT/DELETE (`rest_filtered.py`), so one grammar selects rows for
+    both.
+    """
+    if key in columns:
+        if value.startswith('(') and value.endswith(')'):
+            in_values = [v.strip() for v in value[1:-1].split(',')]
+            in_placeholders = ', '.join(['%s'] * len(in_values))
+            return f"{key} in ({in_placeholders})", in_values
+        return f"{key} = %s", [value]
+
+    if key == 'filter_ts':
+        sql_vals = value.replace('(', '').replace(')', '').split(',')
+        # Validate the timestamp column name against known columns
+        if len(sql_vals) != 3 or sql_vals[0] not in columns:
+            raise ValueError(value)
+        log.debug("filter_ts predicate", column=sql_vals[0])
+        return f"{sql_vals[0]} BETWEEN %s AND %s", sql_vals[1:]
+
+    return None
+
+
+def rest_get_table(get_method, conn, database, table, event, authenticated_user=None,
+                   read_engine=None):
+
+    # STEP 1: build list of columns for the SQL command and to verify correct
+    #         QSP. Read from the per-container schema cache, so a warm GET runs
+    #         the SELECT below and nothing else.
+    try:
+        schema = table_schema(conn, database, table)
 
         # default value used in queries to retrieve all fields, overwritten below with
         # more specific values as needed.
-        columns_select = ', '.join(f"'{row[0]}', {row[0]}" for row in rows)
+        columns_select = ', '.join(f"'{name}', {name}" for name in schema.names)
+        select_columns = list(schema.names)
 
-        sql_columns = []
-        for row in rows:
-            sql_columns.append(row[0])
+        sql_columns = schema.name_set
 
     except pymysql.Error as e:
         errno, detail = error_detail(e)
         errorMsg = f"HTTP {get_method} helper SQL command failed: {errno} {detail}"
-        print(errorMsg)
+        log.error(errorMsg)
         return compose_rest_response(500, '', errorMsg)
 
     # STEP 2: iterate over query string parameters
@@ -36,44 +208,28 @@ def rest_get_table(get_method, conn, database, table, event, authenticated_user=
     order_by = ""
     count_syntax = 0
     group_by = ""
+    sort_dict = {}
+    page_limit = None
+    page_token = None
+    policy = table_policy(table)
     qsp = event.get('queryStringParameters')
 
     if qsp:
         for key, value in qsp.items():
 
             # Skip client-supplied creator_fk — backend injects from JWT
-            if key == 'creator_fk' and (table in CREATOR_FK_TABLES):
+            if key == 'creator_fk' and policy.creator_fk:
                 continue
 
-            if key in sql_columns:
-                # if key is valid SQL column, it is a filter or part of the where clause
-                # ?area_fk=(1,2,4) translates to "area_fk IN (1,2,4)"
-                if (value.startswith('(') and value.endswith(')')):
-                    in_values = [v.strip() for v in value[1:-1].split(',')]
-                    in_placeholders = ', '.join(['%s'] * len(in_values))
-                    where_clause = f"{where_clause}{where_connector} {key} in ({in_placeholders})"
-                    where_params.extend(in_values)
-                else:
-                    where_clause = f"{where_clause}{where_connector} {key} = %s"
-                    where_params.append(value)
-                where_count = where_count + 1
-                where_connector = " AND"
-
-            elif key == 'filter_ts':
-                # filter_ts=(done_ts,2022-08-06T07:00:00,2022-08-07T07:00:00)
-                # SQL => WHERE done_ts BETWEEN '2022-08-06T07:00:00' AND '2022-08-07T07:00:00'
-                remove_txt = ('(', ')')
-                for rem_txt in remove_txt:
-                    value = value.replace(rem_txt, '')
-                sql_vals = value.split(',')
-                # Validate the timestamp column name against known columns
-                if sql_vals[0] not in sql_columns:
-                    errorMsg = f"HTTP {get_method} invalid filter_ts column: {sql_vals[0]}"
-                    print(errorMsg)
+            if key in sql_columns or key == 'filter_ts':
+                try:
+                    predicate, params = filter_predicate(key, value, sql_columns)
+                except ValueError:
+                    errorMsg = f"HTTP {get_method} invalid filter_ts: {value}"
+                    log.info(errorMsg)
                     return compose_rest_response(400, '', "BAD REQUEST")
-                where_clause = f"{where_clause}{where_connector} {sql_vals[0]} BETWEEN %s AND %s"
-                where_params.extend([sql_vals[1], sql_vals[2]])
-                varDump(where_clause, "where clause after ts_filter insertion")
+                where_clause = f"{where_clause}{where_connector} {predicate}"
+                where_params.extend(params)
                 where_count = where_count + 1
                 where_connector = " AND"
 
@@ -86,11 +242,25 @@ def rest_get_table(get_method, conn, database, table, event, authenticated_user=
                 for sort_key, sort_value in sort_dict.items():
                     if sort_key not in sql_columns or sort_value.lower() not in valid_directions:
                         errorMsg = f"HTTP {get_method} invalid sort parameter: {sort_key}:{sort_value}"
-                        print(errorMsg)
+                        log.info(errorMsg)
                         return compose_rest_response(400, '', "BAD REQUEST")
+                sort_dict = {sort_key: sort_value.lower() for sort_key, sort_value in sort_dict.items()}
                 order_by = ', '.join(f"{sort_key} {sort_value}" for sort_key, sort_value in sort_dict.items())
                 order_by = f" ORDER BY {order_by}"
 
+            elif key == 'limit':
+                # keyset pagination: ?limit=N returns at most N rows and, when
+                # more remain, an opaque cursor in the X-Next-Cursor header.
+                if not value.isdigit() or not 0 < int(value) <= MAX_PAGE_LIMIT:
+                    errorMsg = f"HTTP {get_method} invalid limit: {value} (1-{MAX_PAGE_LIMIT})"
+                    log.info(errorMsg)
+                    return compose_rest_response(400, '', "BAD REQUEST")
+                page_limit = int(value)
+
+            elif key == 'next':
+                # the continuation token from the previous page's X-Next-Cursor
+                page_token = value
+
             elif key == 'fields':
                 # sparse fields support - return only the fields/columns required
                 # format is ?fields=field1,field2,field3
@@ -107,7 +277,7 @@ def rest_get_table(get_method, conn, database, table, event, authenticated_user=
                     if field not in sql_columns:
                         # if field is not an SQL column, this is an improperly formed request, fail 400
                         errorMsg = f"HTTP {get_method} invalid query string parameter FIELDS: {key} {value}"
-                        print(errorMsg)
+                        log.info(errorMsg)
                         return compose_rest_response(400, '', "BAD REQUEST")
 
                     else:
@@ -119,46 +289,117 @@ def rest_get_table(get_method, conn, database, table, event, authenticated_user=
                         elif count_syntax > 1:
                             # error condition count(*) requires only two fields params: count(*) and column
                             errorMsg = f"HTTP {get_method} invalid fields: count(*) allows only one additional field"
-                            print(errorMsg)
+                            log.info(errorMsg)
                             return compose_rest_response(400, '', "BAD REQUEST")
 
                 columns_select = ', '.join(f"'{field}', {field}" for field in value.split(","))
+                select_columns = value.split(",")
 
             else:
                 # JSON API document allows api implementation to ignore an improperly formed request
                 errorMsg = f"HTTP {get_method} invalid query string parameter {key} {value}"
-                print(errorMsg)
+                log.info(errorMsg)
                 return compose_rest_response(400, '', "BAD REQUEST")
 
-    # Inject authenticated user filter from JWT
-    if authenticated_user is not None:
-        if table in CREATOR_FK_TABLES:
-            where_clause = f"{where_clause}{where_connector} creator_fk = %s"
-            where_params.append(authenticated_user)
-            where_count += 1
-        elif table == PROFILE_TABLE:
-            where_clause = f"{where_clause}{where_connector} id = %s"
-            where_params.append(authenticated_user)
+    # Inject authenticated user filter from JWT: creator_fk, the profile's own
+    # id, or — req #3122 — a table with no creator_fk scoped by JOINING THROUGH
+    # to the parent that owns it. That last is the read half of the fix, and
+    # the bigger half — an unscoped LIST returned every user's rows long before
+    # any junction had a surrogate id to address them by.
+    scope = policy.scope(authenticated_user, conn)
+    if scope is not None:
+        where_clause = f"{where_clause}{where_connector} {scope[0]}"
+        where_params.extend(scope[1])
+        where_count += 1
+
+    # Keyset pagination. The seek predicate is ANDed onto the WHERE clause AFTER
+    # the creator_fk / junction scoping above, so every page is scoped exactly
+    # as an unpaged read is — a cursor moves the starting point, never the scope.
+    page_keys = None
+    if page_limit is not None or page_token is not None:
+        if page_limit is None or count_syntax or 'id' not in sql_columns:
+            # A cursor needs a limit to be a page, a grouped count has no rows
+            # to seek past, and `id` is the tie-break that makes the order total.
+            errorMsg = (f"HTTP {get_method} pagination needs ?limit, an id column "
+                        f"and no count(*)")
+            log.info(errorMsg)
+            return compose_rest_response(400, '', "BAD REQUEST")
+
+        page_keys = list(sort_dict.items())
+        if 'id' not in sort_dict:
+            page_keys.append(('id', page_keys[-1][1] if page_keys else 'asc'))
+        order_by = " ORDER BY " + ', '.join(f"{column} {direction}"
+                                            for column, direction in page_keys)
+
+        if page_token is not None:
+            seek_values = _decode_page_cursor(page_token, page_keys)
+            if seek_values is None:
+                errorMsg = f"HTTP {get_method} invalid or mismatched next cursor"
+                log.info(errorMsg)
+                return compose_rest_response(400, '', "BAD REQUEST")
+            seek_sql, seek_params = _seek_predicate(page_keys, seek_values, schema)
+            # The scoping injection above does not advance `where_connector`.
+            connector = " AND" if where_count else ""
+            where_clause = f"{where_clause}{connector} {seek_sql}"
+            where_params.extend(seek_params)
             where_count += 1
-        else:
-            # req #3122: a table with no creator_fk is scoped by JOINING THROUGH
-            # to the parent that owns it. This is the read half of the fix, and
-            # it is the bigger half — an unscoped LIST returned every user's rows
-            # long before any junction had a surrogate id to address them by.
-            junction_clause = junction_scope_clause(table)
-            if junction_clause:
-                where_clause = f"{where_clause}{where_connector} {junction_clause}"
-                where_params.append(authenticated_user)
-                where_count += 1
 
     # zero out where clause if there were no QSPs
     if where_count == 0:
         where_clause = ""
 
+    read_engine = read_engine or GET_READ_ENGINE
+    if read_engine not in GET_READ_ENGINES:
+        log.warning(f"HTTP {get_method}: unknown get_read_engine {read_engine!r}, "
+                    "using group_concat")
+        read_engine = 'group_concat'
+    streaming = (read_engine == 'stream' and page_keys is None and count_syntax == 0)
+
+    if_none_match = request_header(event, 'If-None-Match')
+    validated = (not streaming and page_keys is None and count_syntax == 0
+                 and _has_validator(schema))
+    shape = json.dumps([table, columns_select, where_clause, where_params, order_by],
+                       default=str)
+
     # STEP 3: execute API read and process all return values
     try:
+        if streaming:
+            return _rest_get_stream(get_method, conn, schema, table, select_columns,
+                                    where_clause, where_params, order_by,
+                                    if_none_match)
+
+        if validated and if_none_match:
+            # The re-poll: one aggregate over the same scoped rows. When its
+            # tag is the one the client holds, the list query never runs.
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT {_validator_select()} FROM {table} {where_clause}",
+                               tuple(where_params) if where_params else None)
+                probe = cursor.fetchall()
+            etag = _validator_etag(shape, *probe[0]) if probe else None
+            if etag_matches(if_none_match, etag):
+                log.debug(f"HTTP {get_method}: {table} unchanged, list query skipped")
+                return not_modified_response(etag)
+
         # read row(s) and format as JSON
-        if count_syntax == 0:
+        if page_keys is not None:
+            # One JSON_OBJECT per row rather than one GROUP_CONCAT, so a page is
+            # bounded by LIMIT and never by group_concat_max_len. The sort keys
+            # ride along as plain columns for the next cursor. One extra row is
+            # read to learn whether another page exists without a COUNT.
+            key_select = ', '.join(column for column, _ in page_keys)
+            sql_statement = f"""
+                                SELECT
+                                    JSON_OBJECT({columns_select}), {key_select}
+                                FROM
+                                    {table}
+                                {where_clause}
+                                {order_by}
+                                LIMIT {page_limit + 1}
+            """
+        elif count_syntax == 0:
+            # The validator's aggregates ride along on the same statement, so
+            # an unconditional GET still costs exactly one.
+            validator_select = f", {_validator_select()}" if validated else ""
             sql_statement = f"""
                                 SELECT
                                     CONCAT('[',
@@ -166,7 +407,7 @@ def rest_get_table(get_method, conn, database, table, event, authenticated_user=
                                             JSON_OBJECT({columns_select})
                                             {order_by}
                                             SEPARATOR ', ')
-                                    ,']')
+                                    ,']'){validator_select}
                                 FROM
                                     {table}
                                 {where_clause}
@@ -182,7 +423,7 @@ def rest_get_table(get_method, conn, database, table, event, authenticated_user=
                                 {group_by}
             """
 
-        pretty_print_sql(sql_statement, get_method)
+        log_sql(get_method, sql_statement, where_params)
 
         with conn.cursor() as cursor:
             if where_params:
@@ -197,26 +438,76 @@ def rest_get_table(get_method, conn, database, table, event, authenticated_user=
         # creator's junction rows can now legitimately match none. `row[0][0]`
         # would raise IndexError, which is not a pymysql.Error, so it escaped to
         # the handler's blanket except as a 503 instead of this 404.
-        if row and row[0][0]:
+        if page_keys is not None and row:
+            page_rows = row[:page_limit]
+            headers = None
+            if len(row) > page_limit:
+                headers = {PAGE_CURSOR_HEADER:
+                           _encode_page_cursor(page_keys, page_rows[-1][1:])}
+            with timing.span('decode'):
+                page = [json.loads(page_row[0]) for page_row in page_rows]
+            return compose_rest_response(
+                200, page, 'OK',
+                headers=headers, etag=ETAG_FROM_BODY, if_none_match=if_none_match)
+
+        if row and row[0][0] and page_keys is None:
             if count_syntax == 0:
-                return compose_rest_response(200, json.loads(row[0][0]), 'OK')
+                etag = (_validator_etag(shape, *row[0][1:4]) if validated else None)
+                with timing.span('decode'):
+                    rows = json.loads(row[0][0])
+                return compose_rest_response(200, rows, 'OK',
+                                             etag=etag or ETAG_FROM_BODY,
+                                             if_none_match=if_none_match)
             else:
                 # count(*) data has to be massaged into an array of dict
                 # it comes back as a tuple of tuples, each having a dict in json format
                 return_value = []
-                for tuple_dict in row:
-                    return_value.append(json.loads(tuple_dict[0]))
-                varDump(json.dumps(return_value), 'json dump tuple_dict')
-                return compose_rest_response(200, return_value, 'OK')
+                with timing.span('decode'):
+                    for tuple_dict in row:
+                        return_value.append(json.loads(tuple_dict[0]))
+                log.dump(return_value, 'count(*) rows')
+                return compose_rest_response(200, return_value, 'OK',
+                                             etag=ETAG_FROM_BODY,
+                                             if_none_match=if_none_match)
 
         else:
-            print('get: 404')
-            errorMsg = f"No data"
-            print(errorMsg)
+            log.info('get: 404, no data', table=table)
             return compose_rest_response(404, '', 'NOT FOUND')
 
     except pymysql.Error as e:
+        invalidate_on_error(database, e)
         errno, detail = error_detail(e)
         errorMsg = f"HTTP {get_method} actual SQL select statement failed: {errno} {detail}"
-        print(errorMsg)
+        log.error(errorMsg)
         return compose_rest_response(500, '', errorMsg)
+
+
+def _rest_get_stream(get_method, conn, schema, table, select_columns, where_clause,
+                     where_params, order_by, if_none_match=None):
+    """The `stream` engine's list read. Raises pymysql.Error to the caller's
+    handler, which answers it exactly as it answers the GROUP_CONCAT SELECT."""
+    sql_statement = f"""
+                        SELECT
+                            {', '.join(select_columns)}
+                        FROM
+                            {table}
+                        {where_clause}
+                        {order_by}
+    """
+    log_sql(get_method, sql_statement, where_params)
+
+    column_types = {name: schema.by_name[name].type
+                    for name in select_columns if name in schema.by_name}
+    with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+        cursor.execute(sql_statement, tuple(where_params) if where_params else None)
+        # Unbuffered: the rows arrive while they are encoded, so this span
+        # holds the transfer that `sql` holds for a buffered read.
+        with timing.span('encode'):
+            body, row_count = encode_rows(cursor, select_columns, column_types)
+    timing.count('rows', row_count)
+
+    if row_count == 0:
+        log.info('get: 404, no data', table=table)
+        return compose_rest_response(404, '', 'NOT FOUND')
+    return compose_rest_response(200, EncodedJSON(body), 'OK',
+                                 etag=ETAG_FROM_BODY, if_none_match=if_none_match)
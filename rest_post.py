@@ -1,19 +1,64 @@
+import os
 import pymysql
 import json
 from rest_api_utils import (compose_rest_response, compose_conflict_response,
-                            error_detail, integrity_errno, parent_reference_guard)
-from classifier import varDump, pretty_print_sql
-from auth_utils import (CREATOR_FK_TABLES, PROFILE_TABLE, check_body_keys,
-                        check_enum_blanks, force_column)
-
-def rest_post(post_method, conn, database, table, body, authenticated_user=None):
+                            error_detail, in_transaction, integrity_errno,
+                            parent_reference_guard)
+from structured_log import log, log_sql
+from auth_utils import (check_body_keys, check_enum_blanks, force_column,
+                        table_policy)
+from schema_cache import (table_schema, invalidate_on_error, autoinc_allocation,
+                          max_allowed_packet, snapshot_reads)
+import timing
+
+# The most VALUES, in estimated bytes, one statement of a bulk INSERT carries.
+# A larger array is sent as several statements in one transaction — see
+# `_rest_post_bulk`. Lowered further to half the server's max_allowed_packet.
+BULK_CHUNK_MAX_BYTES = int(os.environ.get('bulk_chunk_max_bytes', str(1024 * 1024)))
+
+# `?on_conflict=update`: what a single-row upsert did, as a response header.
+UPSERT_RESULT_HEADER = 'X-Upsert-Result'
+
+# A single-row INSERT ... ON DUPLICATE KEY UPDATE reports 1 affected row for
+# an insert, 2 for an update that changed the row, and 0 for one that left it
+# as it was — including a conflicting row the caller does not own, which
+# `_upsert_clause` leaves untouched.
+_UPSERT_OUTCOMES = {1: 'inserted', 2: 'updated'}
+
+
+def rest_post(post_method, conn, database, table, body, authenticated_user=None,
+              return_minimal=False, return_rows=False, on_conflict=None,
+              update_columns=None):
+    """INSERT one row (or, for a list body, many) and answer with what was written.
+
+    A single row is read back and returned 200 `[{row}]`: the INSERT and one
+    SELECT, the columns from the schema cache and the id from the INSERT's own
+    OK packet (`cursor.lastrowid`). `return_minimal` (`?return=minimal` or
+    `Prefer: return=minimal`) skips the read-back and answers 201 `{"id": ...}`
+    — the INSERT alone.
+
+    A list body answers 201 `{"inserted": n, "first_id": x}`; `return_rows`
+    (`?return=rows`) adds `"rows"`, every inserted row in request order — see
+    `_plan_bulk_read_back`.
+
+    `on_conflict='update'` (`?on_conflict=update`) makes either an upsert:
+    `INSERT ... ON DUPLICATE KEY UPDATE` of `update_columns` (default: every
+    column the body names but `id` and `creator_fk`), applied only to a
+    conflicting row the caller owns — see `_upsert_clause`.
+    """
 
     if not body:
         return compose_rest_response(400, '', 'BAD REQUEST')
 
+    if on_conflict not in (None, 'update'):
+        log.info(f"HTTP {post_method}: unknown on_conflict {on_conflict!r}")
+        return compose_rest_response(400, '', 'BAD REQUEST')
+
     # Bulk POST: if body is a list, insert each item and return count
     if isinstance(body, list):
-        return _rest_post_bulk(post_method, conn, table, body, authenticated_user)
+        return _rest_post_bulk(post_method, conn, database, table, body,
+                               authenticated_user, return_rows, on_conflict,
+                               update_columns)
 
     # req #3125 — the keys become SQL identifiers a few lines down, and every
     # authorization check below reads them back as exact Python strings. MySQL
@@ -38,11 +83,9 @@ def rest_post(post_method, conn, database, table, body, authenticated_user=None)
     # `force_column`, not plain assignment: it replaces any spelling the body
     # already used, so `{"CREATOR_FK": "<their sub>"}` cannot survive alongside
     # the injected `creator_fk` and reach MySQL as the same column twice.
-    if authenticated_user is not None:
-        if table in CREATOR_FK_TABLES:
-            force_column(body, 'creator_fk', authenticated_user)
-        elif table == PROFILE_TABLE:
-            force_column(body, 'id', authenticated_user)
+    owner_column = table_policy(table).owner_column
+    if authenticated_user is not None and owner_column is not None:
+        force_column(body, owner_column, authenticated_user)
 
     # Authorize what the row POINTS AT, not just who owns it.
     #
@@ -62,7 +105,12 @@ def rest_post(post_method, conn, database, table, body, authenticated_user=None)
     if refusal is not None:
         return refusal
 
-    varDump(body, 'body inside rest_post')
+    if on_conflict is not None:
+        return _rest_post_upsert(post_method, conn, database, table, body,
+                                 authenticated_user, update_columns,
+                                 return_minimal)
+
+    log.dump(body, 'body inside rest_post')
     # Assemble list of keys and values for use in SQL
     keys = list(body.keys())
     values = [None if v == "NULL" else v for v in body.values()]
@@ -76,52 +124,63 @@ def rest_post(post_method, conn, database, table, body, authenticated_user=None)
                     INSERT INTO {table} ({sql_key_list})
                     VALUES ({placeholders});
         """
-        pretty_print_sql(sql_statement, post_method)
+        log_sql(post_method, sql_statement, values)
 
         with conn.cursor() as cursor:
             affected_post_rows = cursor.execute(sql_statement, tuple(values))
+            # The id MySQL generated, from the INSERT's OK packet — the same
+            # value `SELECT LAST_INSERT_ID()` would return, without the round
+            # trip. 0 when it generated none.
+            generated_id = cursor.lastrowid
 
         if affected_post_rows > 0:
             pass
         else:
             errorMsg = f"HTTP {post_method} failed no rows affected"
-            print(errorMsg)
+            log.error(errorMsg)
             return compose_rest_response(500, '', "NO DATA SAVED")
 
     except pymysql.Error as e:
+        invalidate_on_error(database, e)
         errno, detail = error_detail(e)
         errorMsg = f"HTTP {post_method} failed: {errno} {detail}"
-        print(errorMsg)
+        log.error(errorMsg)
         if integrity_errno(e):
             return compose_conflict_response(table, e, errorMsg)
         return compose_rest_response(500, '', errorMsg)
 
     # The INSERT has committed (autocommit). Everything below is the read-back,
     # which is a convenience for the caller — never a reason to report failure.
+    supplied_id = body.get('id')
+    if not supplied_id or supplied_id == "NULL":
+        supplied_id = None
+
+    if return_minimal:
+        # The id the body supplied, else the one MySQL generated — the same
+        # precedence the read-back uses below. Neither needs the schema.
+        created_id = supplied_id if supplied_id is not None else generated_id
+        if created_id:
+            return compose_rest_response(201, {'id': created_id}, 'CREATED')
+        return compose_rest_response(201, '', 'CREATED')
+
     try:
-        # retrieve table description and create json object and sql columns
-        with conn.cursor() as cursor:
-            cursor.execute(f""" DESC {table}; """)
-            rows = cursor.fetchall()
+        # table description from the per-container schema cache — on a warm
+        # container no statement at all, where this used to be a DESC after
+        # every INSERT.
+        schema = table_schema(conn, database, table)
 
-        json_object_columns = ', '.join(f"'{row[0]}', {row[0]}" for row in rows)
+        json_object_columns = ', '.join(f"'{name}', {name}" for name in schema.names)
 
-        sql_columns = []
-        for row in rows:
-            sql_columns.append(row[0])
+        sql_columns = schema.names
 
-        # DESC column 6 (`Extra`) reads `auto_increment` exactly when MySQL
-        # GENERATES the id. That — not the mere presence of an `id` column — is
-        # what makes LAST_INSERT_ID() meaningful below (req #3094). Taken off
-        # the DESC rows already in hand, so no extra round trip.
-        id_is_auto_increment = any(
-            row[0] == 'id' and len(row) > 5 and str(row[5]).lower() == 'auto_increment'
-            for row in rows
-        )
+        # `Extra` reads `auto_increment` exactly when MySQL GENERATES the id.
+        # That — not the mere presence of an `id` column — is what makes
+        # LAST_INSERT_ID() meaningful below (req #3094).
+        id_is_auto_increment = schema.id_is_auto_increment
 
     except pymysql.Error as e:
         # `{e}` not `{e.args[0]} {e.args[1]}` — see the read-back handler below.
-        print(f"HTTP {post_method} helper DESC SQL command failed: {e}")
+        log.warning(f"HTTP {post_method} helper schema read failed: {e}")
         return compose_rest_response(201, '', 'CREATED')
 
     # No `id` column means the read-back below (`WHERE id=...`) cannot be built.
@@ -130,16 +189,18 @@ def rest_post(post_method, conn, database, table, body, authenticated_user=None)
     # missing column as a 500 told callers a successful write had failed
     # (req #3057). Callers that need the row read it back by its composite key.
     if 'id' not in sql_columns:
-        print(f"HTTP {post_method}: {table} has no id column, skipping read-back.")
+        log.info(f"HTTP {post_method}: {table} has no id column, skipping read-back.")
         return compose_rest_response(201, '', 'CREATED')
 
     # Which id identifies the row that was just written?
     #
-    # The id the BODY supplied wins over LAST_INSERT_ID(). It is the only correct
+    # The id the BODY supplied wins over the generated one. It is the only correct
     # answer when MySQL did not generate the id — `profiles.id` is a varchar(64)
     # Cognito sub with no AUTO_INCREMENT — and it is also right when a caller
     # writes an explicit id into an AUTO_INCREMENT column, because MySQL only
-    # sets LAST_INSERT_ID() for a value it generated itself.
+    # sets LAST_INSERT_ID() for a value it generated itself. (The generated id
+    # is now `cursor.lastrowid` off the INSERT, not a `SELECT LAST_INSERT_ID()`
+    # — the same value, one statement fewer.)
     #
     # req #3094: before this, the read-back ran LAST_INSERT_ID() for any table
     # with an `id` column. On `profiles` that returned 0 (the connection is new
@@ -160,39 +221,21 @@ def rest_post(post_method, conn, database, table, body, authenticated_user=None)
     # by invalidating a query (losing the new id, the pending-mutation replay,
     # and the post-create navigate). `"NULL"` is the caller's explicit-NULL
     # sentinel and is truthy, so it needs its own check.
-    newId = body.get('id')
-    if not newId or newId == "NULL":
-        newId = None
+    newId = supplied_id
 
     if newId is None:
         if not id_is_auto_increment:
             # Nothing identifies the new row. Same call as the `id`-less
             # junction path above: the row is committed, so 201 without a body.
-            print(f"HTTP {post_method}: {table}.id is not auto_increment and the "
-                  f"body supplied no id, skipping read-back.")
-            return compose_rest_response(201, '', 'CREATED')
-
-        try:
-            # retrieve ID of newly created row
-            sql_statement= f"""SELECT LAST_INSERT_ID()"""
-            with conn.cursor() as cursor:
-                affected_rows = cursor.execute(sql_statement)
-
-                if affected_rows > 0:
-                    id_row = cursor.fetchone()
-                    newId = id_row[0] if id_row else None
-                else:
-                    print(f"HTTP {post_method} FAILED to read last_insert_id.")
-                    return compose_rest_response(201, '', 'CREATED')
-
-        except pymysql.Error as e:
-            print(f"HTTP {post_method} FAILED to read last_insert_id: {e}")
+            log.info(f"HTTP {post_method}: {table}.id is not auto_increment and the "
+                     f"body supplied no id, skipping read-back.")
             return compose_rest_response(201, '', 'CREATED')
 
+        newId = generated_id
         if not newId:
-            # 0 means MySQL generated nothing on this connection. Never let that
+            # 0 means the INSERT generated no id. Never let that
             # reach the read-back as `WHERE id=0` — that is the req #3094 bug.
-            print(f"HTTP {post_method}: last_insert_id is 0, skipping read-back.")
+            log.info(f"HTTP {post_method}: lastrowid is 0, skipping read-back.")
             return compose_rest_response(201, '', 'CREATED')
 
     # Bind it, never interpolate it: the id can be a Cognito sub. A non-generated
@@ -212,18 +255,20 @@ def rest_post(post_method, conn, database, table, body, authenticated_user=None)
                                 {table}
                             WHERE id=%s
         """
-        pretty_print_sql(sql_statement, post_method)
+        log_sql(post_method, sql_statement, (lookup_id,))
 
         with conn.cursor() as cursor:
             cursor.execute(sql_statement, (lookup_id,))
             row = cursor.fetchall()
 
-        #varDump(row, 'row data from read table AFTER post')
+        #log.dump(row, 'row data from read table AFTER post')
 
         if row[0][0]:
-            return compose_rest_response(200, json.loads(row[0][0]), 'CREATED')
+            with timing.span('decode'):
+                created = json.loads(row[0][0])
+            return compose_rest_response(200, created, 'CREATED')
         else:
-            print(f"HTTP {post_method} helper SELECT after WRITE SQL command failed")
+            log.warning(f"HTTP {post_method} helper SELECT after WRITE SQL command failed")
             return compose_rest_response(201, '', 'CREATED')
 
     except (pymysql.Error, ValueError, TypeError, IndexError, KeyError) as e:
@@ -241,7 +286,7 @@ def rest_post(post_method, conn, database, table, body, authenticated_user=None)
         #
         # Wider than `pymysql.Error` (req #3094): passing args to execute() puts
         # pymysql on its `query % escaped_args` path, so the SQL text is now a
-        # FORMAT STRING. `json_object_columns` is built from live DESC output, and
+        # FORMAT STRING. `json_object_columns` is built from schema metadata, and
         # a column name containing `%` raises ValueError out of a block whose
         # entire thesis is that nothing after the INSERT reports failure — verified
         # by POSTing to a scratch table with a `pct%` column, which returned 503 on
@@ -252,15 +297,26 @@ def rest_post(post_method, conn, database, table, body, authenticated_user=None)
         #
         # Deliberately NOT bare `Exception`: a NameError or AttributeError here is
         # a coding mistake, and silently answering 201 forever would hide it.
-        print(f"HTTP {post_method} helper SELECT after WRITE SQL command failed: "
-              f"{type(e).__name__}: {e}")
+        log.warning(f"HTTP {post_method} helper SELECT after WRITE SQL command failed: "
+                    f"{type(e).__name__}: {e}")
         return compose_rest_response(201, '', 'CREATED')
 
     return compose_rest_response(500, '', 'INVALID PATH')
 
 
-def _rest_post_bulk(post_method, conn, table, body_list, authenticated_user):
-    """Insert multiple rows via single multi-value INSERT. Returns 201 with inserted count and first_id."""
+def _rest_post_bulk(post_method, conn, database, table, body_list, authenticated_user,
+                    return_rows=False, on_conflict=None, update_columns=None):
+    """Insert multiple rows via multi-value INSERTs. Returns 201 with inserted count and first_id.
+
+    Items are grouped by the columns they name, one statement per group —
+    more when a group's estimated size exceeds `_chunk_budget` — and several
+    statements run in one transaction, with a progress line per chunk and
+    `"chunks"` in the response. Ids and rows come back in request order.
+
+    An upsert answers `{"inserted", "updated", "unchanged"}` instead of
+    `inserted`/`first_id` when the affected-row counts prove the split, and
+    `{"submitted", "affected"}` when they do not — see `_upsert_counts`.
+    """
 
     if not body_list:
         return compose_rest_response(400, '', 'BAD REQUEST')
@@ -270,21 +326,23 @@ def _rest_post_bulk(post_method, conn, table, body_list, authenticated_user):
     if refusal is not None:
         return compose_rest_response(refusal[0], '', refusal[1])
 
-    # req #3432 — every item, not a sample. The statement below is ONE
-    # multi-value INSERT that lands or rolls back as a unit, so one blank enum
-    # anywhere in the batch has to refuse the whole batch.
+    # req #3432 — every item, not a sample. The statements below land or roll
+    # back as a unit, so one blank enum anywhere in the batch has to refuse the
+    # whole batch.
     refusal = check_enum_blanks(table, body_list)
     if refusal is not None:
         return compose_rest_response(refusal[0], '', refusal[1])
 
     # Override creator_fk on each item before building SQL
-    if authenticated_user is not None and table in CREATOR_FK_TABLES:
+    if authenticated_user is not None and table_policy(table).creator_fk:
         for item in body_list:
             force_column(item, 'creator_fk', authenticated_user)
 
-    # EVERY item must name the same columns, because the statement below builds
-    # ONE column list from item 0 and then indexes every item by it. Two failures
-    # came out of that assumption going unchecked (req #3125 review):
+    # Items may name different columns: they are grouped by column set and
+    # each group gets its own multi-row INSERT, its column list built from its
+    # own items. This used to be a 400, because the statement built ONE column
+    # list from item 0 and indexed every item by it, and two failures came out
+    # of that (req #3125 review):
     #
     #   * a column in item 0 but missing from item 5 raised KeyError from OUTSIDE
     #     the try block, which `lambda_handler`'s blanket `except Exception`
@@ -292,69 +350,532 @@ def _rest_post_bulk(post_method, conn, table, body_list, authenticated_user):
     #     retries idempotent calls on 503, so it went out twice;
     #   * a column missing from item 0 but PRESENT later was silently DROPPED
     #     from the INSERT. The ownership guard still inspected its value, so the
-    #     set of references checked and the set written had drifted apart. In
-    #     that direction it only over-refuses — but that divergence is the shape
-    #     of the bypass above, and it should not be left to luck which way it
-    #     leans.
+    #     set of references checked and the set written had drifted apart.
     #
-    # Answered as a 400 naming the difference rather than either of those.
-    expected = set(body_list[0])
-    for index, item in enumerate(body_list[1:], start=1):
-        if set(item) != expected:
-            differing = sorted(set(item) ^ expected)
-            print(f"HTTP {post_method} bulk: item {index} names different "
-                  f"columns than item 0 ({differing}) — a bulk INSERT builds one "
-                  "column list for the whole batch")
-            return compose_rest_response(400, '', 'BAD REQUEST')
-
-    # req #3122 / #3125 — EVERY row is checked, not a sample. The statement is one
-    # multi-value INSERT that lands or rolls back as a unit, so a single foreign
+    # Grouping answers both without the refusal: every item is written with
+    # exactly the keys it names, which are exactly the keys the guard below
+    # inspects — the set checked IS the set written, item by item.
+    groups = _group_by_columns(body_list)
+
+    # req #3122 / #3125 — EVERY row is checked, not a sample. The statements land
+    # or roll back as a unit, so a single foreign
     # reference anywhere in the batch must refuse the whole batch. `map_coordinates`
     # imports arrive here thousands of rows at a time; the check still costs one
-    # SELECT per distinct PARENT TABLE, because it groups the distinct parent ids
-    # across all of them.
+    # statement, because it groups the distinct parent ids across all of them and
+    # asks every parent table at once.
     refusal = parent_reference_guard(conn, table, body_list, authenticated_user,
                                      post_method)
     if refusal is not None:
         return refusal
 
-    # All items must have the same keys (same columns)
-    keys = list(body_list[0].keys())
-    sql_key_list = ', '.join(keys)
-    row_placeholder = '(' + ', '.join(['%s'] * len(keys)) + ')'
-
-    # Flatten all values into a single tuple for one execute call
-    all_values = []
-    for item in body_list:
-        all_values.extend(None if v == "NULL" else v for v in (item[k] for k in keys))
-
-    placeholders = ', '.join([row_placeholder] * len(body_list))
-    sql_statement = f"INSERT INTO {table} ({sql_key_list}) VALUES {placeholders}"
-    pretty_print_sql(sql_statement, post_method)
-
+    # [(keys, item indices, estimated bytes, upsert clause, its params)] — one
+    # per statement: every group, cut into chunks by `_chunk_budget`.
+    budget = _chunk_budget(conn)
+    chunks = []
+    scope = None
+    if on_conflict is not None:
+        scope = table_policy(table).scope(authenticated_user)
+    for keys, indices in groups:
+        upsert_clause, upsert_params = '', ()
+        if on_conflict is not None:
+            # The allowlist applies to every group, so each must supply it.
+            columns, refusal = _upsert_columns(post_method, table, keys,
+                                               update_columns)
+            if refusal is not None:
+                return compose_rest_response(refusal[0], '', refusal[1])
+            upsert_clause, upsert_params = _upsert_clause(table, columns,
+                                                          authenticated_user)
+        items = [body_list[index] for index in indices]
+        for start, stop, size in _plan_chunks(items, keys, budget):
+            chunks.append((keys, indices[start:stop], size, upsert_clause,
+                           upsert_params))
+
+    plan = None
+    if return_rows:
+        plan = _plan_bulk_read_back(conn, database, table, body_list,
+                                    upsert=on_conflict is not None)
+    window = plan is not None and plan[0] == 'window'
+
+    # One chunk is one statement, atomic on its own. Several — chunks of one
+    # group, or several groups — run in one transaction so the batch still
+    # lands or rolls back as a unit, joining the caller's when one is open (a
+    # transactional `_batch`). The 'window' read-back needs one even for a
+    # single chunk: its lookups must read the snapshot the transaction took.
+    joined = in_transaction(conn)
+    own_transaction = (len(chunks) > 1 or window) and not joined
+    current = None
     try:
+        if own_transaction:
+            conn.begin()
+        first_ids = []
+        window_ids = []
+        done = 0
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        affected_rows = 0
         with conn.cursor() as cursor:
-            cursor.execute(sql_statement, tuple(all_values))
+            if window:
+                # Takes the snapshot (a plain read is what fixes it, in the
+                # caller's transaction as in ours) BEFORE any id is generated.
+                # Whatever another session inserts from here on is invisible
+                # to this transaction — see `_window_ids`.
+                sql_statement = f"SELECT 1 FROM {table} LIMIT 1"
+                log_sql(post_method, sql_statement, ())
+                cursor.execute(sql_statement)
+                cursor.fetchall()
+            for current, (keys, indices, size, upsert_clause,
+                          upsert_params) in enumerate(chunks, start=1):
+                sql_statement, values = _bulk_insert_statement(
+                    table, keys, [body_list[index] for index in indices],
+                    upsert_clause)
+                values += upsert_params
+                # Shape and row count only: the expanded VALUES list of a
+                # multi-thousand row import is never built into a log line.
+                log_sql(post_method, sql_statement, values, rows=len(indices))
+                affected = cursor.execute(sql_statement, values)
+                affected_rows += affected
+                if on_conflict is not None and counts is not None:
+                    chunk_counts = _upsert_counts(len(indices), affected)
+                    counts = None if chunk_counts is None else {
+                        key: n + chunk_counts[key] for key, n in counts.items()}
+                # The FIRST id this statement generated (0 if it generated
+                # none). Only `_plan_bulk_read_back`'s 'range' plan may
+                # extrapolate the rest of the chunk from it — see there for
+                # when that is safe. The 'window' plan looks the rest up.
+                first_ids.append(cursor.lastrowid)
+                if window:
+                    window_ids.append(_window_ids(post_method, cursor, table,
+                                                  cursor.lastrowid, len(indices)))
+                if len(chunks) > 1:
+                    done += len(indices)
+                    log.info("Bulk INSERT chunk", table=table, chunk=current,
+                             chunks=len(chunks), rows=len(indices), bytes=size,
+                             columns=len(keys), inserted=done)
+        if own_transaction:
+            conn.commit()
+    except pymysql.Error as e:
+        # Inside the caller's transaction the rollback is the caller's to make.
+        if not joined:
+            conn.rollback()
+        invalidate_on_error(database, e)
+        errno, detail = error_detail(e)
+        where = ''
+        if len(chunks) > 1 and current is not None:
+            # Nothing of the batch is left behind — every chunk rolled back
+            # with it — but the caller is told WHICH items to look at.
+            where = (f" in chunk {current} of {len(chunks)} "
+                     f"(items {_index_ranges(chunks[current - 1][1])}), "
+                     "all chunks rolled back")
+        errorMsg = f"HTTP {post_method} bulk failed{where}: {errno} {detail}"
+        log.error(errorMsg)
+        if integrity_errno(e):
+            return compose_conflict_response(table, e, errorMsg)
+        return compose_rest_response(500, '', errorMsg)
 
-        # Retrieve first auto-increment ID from the multi-row INSERT.
-        # MySQL guarantees consecutive IDs for a single multi-value INSERT statement.
+    if on_conflict is not None:
+        # A multi-row upsert's first generated id may belong to any of its
+        # rows, so there is no `first_id` to report.
+        result = counts if counts is not None else {
+            "submitted": len(body_list), "affected": affected_rows}
+    else:
         result = {"inserted": len(body_list)}
-        try:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT LAST_INSERT_ID()")
-                row = cursor.fetchone()
-                if row and row[0]:
-                    result["first_id"] = row[0]
-        except pymysql.Error:
-            pass  # Non-fatal: callers can fall back to individual inserts
+        if first_ids[0]:
+            result["first_id"] = first_ids[0]
+    if len(chunks) > 1:
+        result["chunks"] = len(chunks)
+
+    if plan is not None:
+        kind, detail = plan
+        column, lookup = 'id', None
+        chunk_ids = None
+        if kind == 'range' and all(first_ids):
+            # Contiguous within each statement, not across them: another
+            # session's INSERT can take ids between two chunks.
+            chunk_ids = [[first_id + offset * detail for offset in range(len(chunk[1]))]
+                         for first_id, chunk in zip(first_ids, chunks)]
+        elif kind == 'window' and None not in window_ids:
+            chunk_ids = window_ids
+        elif kind in ('id', 'marker'):
+            column = detail
+            lookup = [item[column] for item in body_list]
+        if chunk_ids is not None:
+            # Placed back in request order across groups.
+            lookup = [None] * len(body_list)
+            for ids, chunk in zip(chunk_ids, chunks):
+                for row_id, index in zip(ids, chunk[1]):
+                    lookup[index] = row_id
+        rows = read_back_rows(post_method, conn, database, table, column,
+                               lookup, scope) if lookup else None
+        if rows is not None:
+            result["rows"] = rows
+
+    return compose_rest_response(201, result, 'CREATED')
+
+
+def _rest_post_upsert(post_method, conn, database, table, body, authenticated_user,
+                      update_columns, return_minimal):
+    """Single-row `?on_conflict=update`, after every check the INSERT path runs.
+
+    Answers 201 when the row was inserted and 200 when it already existed,
+    with `X-Upsert-Result: inserted | updated | unchanged`, and the row read
+    back under the caller's ownership — a conflicting row that is somebody
+    else's was left alone and is not shown either.
+    """
+    keys = list(body.keys())
+    columns, refusal = _upsert_columns(post_method, table, keys, update_columns)
+    if refusal is not None:
+        return compose_rest_response(refusal[0], '', refusal[1])
+    values = [None if v == "NULL" else v for v in body.values()]
 
-        return compose_rest_response(201, result, 'CREATED')
+    try:
+        schema = table_schema(conn, database, table)
+        clause, clause_params = _upsert_clause(
+            table, columns, authenticated_user,
+            read_back_id=schema.id_is_auto_increment)
+        sql_statement = (f"INSERT INTO {table} ({', '.join(keys)}) "
+                         f"VALUES ({', '.join(['%s'] * len(values))}) {clause}")
+        log_sql(post_method, sql_statement, values)
+
+        with conn.cursor() as cursor:
+            affected = cursor.execute(sql_statement, tuple(values) + clause_params)
+            # The new id on an insert; the existing row's on an update, by way
+            # of `_upsert_clause`'s `LAST_INSERT_ID(id)`.
+            generated_id = cursor.lastrowid
 
     except pymysql.Error as e:
-        conn.rollback()
+        invalidate_on_error(database, e)
         errno, detail = error_detail(e)
-        errorMsg = f"HTTP {post_method} bulk failed: {errno} {detail}"
-        print(errorMsg)
+        errorMsg = f"HTTP {post_method} upsert failed: {errno} {detail}"
+        log.error(errorMsg)
         if integrity_errno(e):
             return compose_conflict_response(table, e, errorMsg)
-        return compose_rest_response(500, '', errorMsg)
\ No newline at end of file
+        return compose_rest_response(500, '', errorMsg)
+
+    outcome = _UPSERT_OUTCOMES.get(affected, 'unchanged')
+    status = 201 if outcome == 'inserted' else 200
+    headers = {UPSERT_RESULT_HEADER: outcome}
+
+    # Same precedence as the plain read-back: a supplied id, else a generated one.
+    row_id = None
+    if 'id' in schema.name_set:
+        row_id = body.get('id')
+        if not row_id or row_id == "NULL":
+            row_id = generated_id if schema.id_is_auto_increment else None
+    if not row_id:
+        return compose_rest_response(status, '', 'OK', headers=headers)
+
+    if return_minimal:
+        return compose_rest_response(status, {'id': row_id}, 'OK', headers=headers)
+
+    rows = read_back_rows(post_method, conn, database, table, 'id', [row_id],
+                           table_policy(table).scope(authenticated_user))
+    return compose_rest_response(200 if rows else status, rows or '', 'OK',
+                                 headers=headers)
+
+
+def _upsert_columns(post_method, table, keys, update_columns):
+    """(columns an upsert's UPDATE assigns, None), or (None, refusal).
+
+    `update_columns` is the caller's allowlist; every name must be one the body
+    supplies. Either way `id` and `creator_fk` are never reassigned on a
+    conflict — the row keeps its identity and its owner — and the scope column
+    of a `JUNCTION_OWNERSHIP` table goes LAST, because MySQL applies the
+    assignments left to right and every ownership test before it must see the
+    row's parent as it was.
+    """
+    policy = table_policy(table)
+    protected = policy.protected
+    by_folded = {key.lower(): key for key in keys}
+
+    if update_columns:
+        wanted = [name.lower() for name in update_columns]
+        unknown = [name for name in wanted if name not in by_folded]
+        if unknown or protected & set(wanted):
+            log.info(f"HTTP {post_method} upsert: update_columns {list(update_columns)} "
+                     f"must name body columns other than {sorted(protected)}")
+            return None, (400, 'BAD REQUEST')
+        columns = [by_folded[name] for name in dict.fromkeys(wanted)]
+    else:
+        columns = [key for key in keys if key.lower() not in protected]
+
+    if not columns:
+        log.info(f"HTTP {post_method} upsert: nothing to update on {table}")
+        return None, (400, 'BAD REQUEST')
+
+    columns.sort(key=lambda column: column.lower() == policy.scope_column)
+    return columns, None
+
+
+def _upsert_clause(table, columns, authenticated_user, read_back_id=False):
+    """`ON DUPLICATE KEY UPDATE ...` and its parameters.
+
+    An INSERT that conflicts with an existing row would otherwise UPDATE it no
+    matter whose it is — a unique key is shared by every tenant, so
+    `POST /darwin/instructions?on_conflict=update {"name": <theirs>}` would
+    rewrite somebody else's instruction. Each assignment is therefore
+    `IF(<the existing row is the caller's>, <new value>, <old value>)`: a row
+    that is not theirs is left exactly as it was, which MySQL reports as
+    "unchanged". `parent_reference_guard` has already vetted the new values;
+    this covers the row they would land on.
+
+    `read_back_id` adds `id = LAST_INSERT_ID(id)` so an update reports the
+    existing row's id as `lastrowid`, the way an insert reports the new one.
+
+    `VALUES(col)` is deprecated from MySQL 8.0.20 in favour of a row alias,
+    but is the spelling every server this gateway runs on accepts.
+    """
+    owned = table_policy(table).scope(authenticated_user)
+    assignments, params = [], []
+
+    def assign(column, value):
+        if owned is None:
+            assignments.append(f"{column} = {value}")
+        else:
+            assignments.append(f"{column} = IF({owned[0]}, {value}, {column})")
+            params.extend(owned[1])
+
+    if read_back_id:
+        assign('id', 'LAST_INSERT_ID(id)')
+    for column in columns:
+        assign(column, f"VALUES({column})")
+    return f"ON DUPLICATE KEY UPDATE {', '.join(assignments)}", tuple(params)
+
+
+def _upsert_counts(rows, affected):
+    """{"inserted", "updated", "unchanged"} for one upsert statement of `rows`
+    rows, or None when its affected count does not prove the split.
+
+    Each row adds 1 when inserted, 2 when updated and 0 when left as it was —
+    which includes a conflicting row of another caller's that `_upsert_clause`
+    leaves untouched — so one row, no rows changed, or every row updated can
+    be read straight off `affected`, and any other total fits several splits
+    (3 of 3 is three inserts, or an insert, an update and an unchanged row).
+    The statement's `Records: / Duplicates:` info string does not settle it
+    either: without CLIENT_FOUND_ROWS, `Duplicates` counts only the conflicts
+    that CHANGED a row, so an unchanged conflict reads as an insert.
+    """
+    if rows == 1:
+        outcome = _UPSERT_OUTCOMES.get(affected, 'unchanged')
+    elif affected == 0:
+        outcome = 'unchanged'
+    elif affected == 2 * rows:
+        outcome = 'updated'
+    else:
+        return None
+    return {key: rows * (key == outcome) for key in ('inserted', 'updated', 'unchanged')}
+
+
+def _chunk_budget(conn):
+    """Bytes of VALUES one bulk INSERT statement may carry.
+
+    Half of `max_allowed_packet`, because the estimate below counts a string's
+    bytes once and escaping can at most double them; and never more than
+    `BULK_CHUNK_MAX_BYTES`, which also bounds the SQL string and parameter
+    tuple held in memory at once.
+    """
+    return min(BULK_CHUNK_MAX_BYTES, max_allowed_packet(conn) // 2)
+
+
+def _encoded_size(value):
+    """Estimated bytes `value` adds to the expanded statement."""
+    if value is None or value == "NULL":
+        return 4
+    if isinstance(value, (bytes, bytearray)):
+        return 2 * len(value) + 10
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 2
+    return len(str(value)) + 2
+
+
+def _plan_chunks(body_list, keys, budget):
+    """[(start, stop, bytes)] — `body_list` cut into runs of whole items whose
+    VALUES tuples fit in `budget` bytes. An item larger than the budget on its
+    own still gets a chunk; the server is the judge of whether it fits."""
+    chunks = []
+    start, size = 0, 0
+    for index, item in enumerate(body_list):
+        # `(`, `)`, `, ` between values and `,` between tuples
+        row_size = sum(_encoded_size(item[k]) for k in keys) + 2 * len(keys) + 2
+        if index > start and size + row_size > budget:
+            chunks.append((start, index, size))
+            start, size = index, 0
+        size += row_size
+    chunks.append((start, len(body_list), size))
+    return chunks
+
+
+def _group_by_columns(body_list):
+    """[(keys, item indices)] — the items grouped by the set of columns they
+    name, groups in order of first appearance, each group's column list in its
+    first item's key order."""
+    groups = {}
+    for index, item in enumerate(body_list):
+        groups.setdefault(frozenset(item), (list(item), []))[1].append(index)
+    return list(groups.values())
+
+
+def _index_ranges(indices):
+    """`[2, 3, 4, 7]` as `'2-4, 7'`, for naming the items of a failed chunk."""
+    runs = []
+    for index in indices:
+        if runs and index == runs[-1][1] + 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return ', '.join(str(a) if a == b else f"{a}-{b}" for a, b in runs)
+
+
+def _bulk_insert_statement(table, keys, items, upsert_clause=''):
+    """One multi-row INSERT for `items` and its flat parameter tuple."""
+    row_placeholder = '(' + ', '.join(['%s'] * len(keys)) + ')'
+    values = []
+    for item in items:
+        values.extend(None if item[k] == "NULL" else item[k] for k in keys)
+    placeholders = ', '.join([row_placeholder] * len(items))
+    return (f"INSERT INTO {table} ({', '.join(keys)}) VALUES {placeholders}"
+            f"{' ' + upsert_clause if upsert_clause else ''}", tuple(values))
+
+
+def _plan_bulk_read_back(conn, database, table, body_list, upsert=False):
+    """How `?return=rows` finds the rows a bulk INSERT wrote, or None if it cannot.
+
+    One of, in order of preference:
+
+      ('id', 'id')        every item supplies a distinct id — read back on those.
+      ('range', step)     MySQL generates the ids and the server reserves them
+                          contiguously (`schema_cache.autoinc_allocation`): the
+                          INSERT's first id plus `step` per row.
+      ('marker', column)  a single-column UNIQUE key every item supplies distinct
+                          values for — the rows are the ones now holding them.
+      ('window', None)    generated ids that may interleave with a concurrent
+                          INSERT's (`innodb_autoinc_lock_mode=2`, MySQL 8's
+                          default) and no marker, under a snapshot isolation
+                          level (`schema_cache.snapshot_reads`): the chunked
+                          INSERTs run as usual, each followed by one lookup of
+                          the ids its own transaction can see from its first
+                          id up — `_window_ids`.
+
+    `first_id + n` is NEVER assumed on its own: under lock mode 2 another
+    session's rows can land inside the range, and reading it back would hand
+    the caller somebody else's rows under ids it believes are its own.
+
+    An upsert's rows are found by id or marker only: an updated row consumes
+    no new id, so neither the range nor `lastrowid` identifies it.
+
+    Metadata failures return None — the INSERT still runs, without rows.
+    """
+    try:
+        schema = table_schema(conn, database, table)
+    except pymysql.Error as e:
+        log.warning(f"HTTP POST bulk read-back plan: schema read failed: {e}")
+        return None
+
+    generated = False
+    if 'id' in schema.name_set:
+        supplied = [item.get('id') for item in body_list]
+        present = [bool(v) and v != "NULL" for v in supplied]
+        if all(present):
+            if len({str(v) for v in supplied}) == len(supplied):
+                return ('id', 'id')
+        elif schema.id_is_auto_increment and not any(present) and not upsert:
+            contiguous, increment = autoinc_allocation(conn)
+            if contiguous:
+                return ('range', increment)
+            generated = True
+
+    for column in schema.columns:
+        if column.key != 'UNI' or any(column.name not in item for item in body_list):
+            continue
+        values = [item[column.name] for item in body_list]
+        if (None not in values and "NULL" not in values
+                and len({str(v) for v in values}) == len(values)):
+            return ('marker', column.name)
+
+    if generated and snapshot_reads(conn):
+        return ('window', None)
+    log.warning(f"HTTP POST bulk: nothing identifies {table}'s new rows, "
+                "returning the count only")
+    return None
+
+
+def read_back_rows(post_method, conn, database, table, column, lookup, scope=None,
+                   partial=False):
+    """The rows whose `column` is in `lookup`, in `lookup`'s order, or None.
+
+    `scope` — `TablePolicy.scope`'s (sql, params) — restricts the read to
+    the caller's rows, for an upsert whose conflicting row may be somebody
+    else's.
+
+    `partial=True` is for a write that may not have matched every key it was
+    given (a PUT naming somebody else's id): the rows that WERE found, in
+    `lookup`'s order, each key once.
+
+    One SELECT, one JSON_OBJECT per row rather than one GROUP_CONCAT, so
+    thousands of rows are never cut off at group_concat_max_len. None — and
+    the caller answers with the count alone — when the read fails or does not
+    find exactly the rows asked for: the write has committed either way.
+    """
+    if partial:
+        lookup = list({str(value): value for value in lookup}.values())
+    try:
+        schema = table_schema(conn, database, table)
+        json_object_columns = ', '.join(f"'{name}', {name}" for name in schema.names)
+        placeholders = ', '.join(['%s'] * len(lookup))
+        # Same binding rule as the single-row read-back (req #3094): a
+        # non-generated key goes down as a string, compared varchar to varchar.
+        generated = column == 'id' and schema.id_is_auto_increment
+        params = [value if generated else str(value) for value in lookup]
+        scope_sql = ''
+        if scope is not None:
+            scope_sql = f" AND {scope[0]}"
+            params += list(scope[1])
+        sql_statement = f"""SELECT {column}, JSON_OBJECT({json_object_columns})
+                            FROM {table}
+                            WHERE {column} IN ({placeholders}){scope_sql}"""
+        log_sql(post_method, sql_statement, params, rows=len(lookup))
+
+        with conn.cursor() as cursor:
+            cursor.execute(sql_statement, tuple(params))
+            fetched = cursor.fetchall()
+
+        with timing.span('decode'):
+            by_key = {str(key): json.loads(row) for key, row in fetched}
+        rows = [by_key.get(str(value)) for value in lookup]
+    except (pymysql.Error, ValueError, TypeError) as e:
+        log.warning(f"HTTP {post_method} read-back failed: {type(e).__name__}: {e}")
+        return None
+
+    if partial:
+        return [row for row in rows if row is not None]
+
+    if len(fetched) != len(lookup) or None in rows:
+        log.warning(f"HTTP {post_method} read-back found {len(fetched)} of "
+                    f"{len(lookup)} rows, returning the count only")
+        return None
+    return rows
+
+
+def _window_ids(post_method, cursor, table, first_id, count):
+    """The ids a chunk's INSERT generated, in order, or None when the lookup
+    does not find exactly `count` of them.
+
+    Runs inside the bulk transaction, whose snapshot predates every id the
+    batch generated. Any id at or above `first_id` was handed out after that
+    snapshot: another session's row there is invisible to this transaction
+    whether or not it has committed, and earlier chunks' ids are all below.
+    What remains is this statement's rows, numbered in the order they were
+    written. One statement per chunk however many rows the chunk holds.
+    """
+    sql_statement = f"SELECT id FROM {table} WHERE id >= %s ORDER BY id LIMIT %s"
+    params = (first_id, count + 1)
+    log_sql(post_method, sql_statement, params)
+    try:
+        cursor.execute(sql_statement, params)
+        ids = [row[0] for row in cursor.fetchall()]
+    except pymysql.Error as e:
+        log.warning(f"HTTP {post_method} bulk id lookup failed: {e}")
+        return None
+    if len(ids) != count:
+        log.warning(f"HTTP {post_method} bulk id lookup found {len(ids)} of "
+                    f"{count} rows, returning the count only")
+        return None
+    return ids
@@ -0,0 +1,247 @@
+"""`DELETE /{database}/_purge?table=...` — prune an append-only telemetry
+table in bounded chunks, resumably, inside the Lambda deadline.
+
+    DELETE /darwin/_purge?table=agent_telemetry_rows&older_than_days=30
+    DELETE /darwin/_purge?table=map_coordinates&map_run_fk=7&limit=2000
+    DELETE /darwin/_purge?table=agent_telemetry_rows&older_than_days=30&next=<token>
+
+The tables in PURGE_TABLES only ever grow, and one `DELETE ... WHERE
+create_ts < ...` over them holds its locks for as long as it runs and can
+outlive the 15 s read_timeout `get_connection` sets — the driver gives up,
+the server keeps going, and the client learns nothing. Here each statement is
+
+    DELETE FROM t WHERE <age> AND <filters> AND <scope> AND id <= %s
+    ORDER BY id LIMIT n
+
+committed on its own, so no statement holds more than n rows' locks, and
+the loop stops while there is still time to answer: before the Lambda
+deadline (`timing.remaining_ms()`) less PURGE_DEADLINE_RESERVE_MS and the
+longest chunk so far, and within PURGE_TIME_BUDGET_MS, which keeps the
+answer inside API Gateway's 29 s integration timeout.
+
+A purge that stopped early answers with `X-Next-Cursor`; repeating the
+request with `&next=<token>` carries on. The token pins what the first call
+resolved — the age cutoff as an absolute timestamp, and the highest id that
+existed then — so a resumed purge deletes exactly the rows the first call
+set out to, never the rows written since. It is bound to the table and
+filters it was cut for, and its values are only ever bound as parameters
+beside the caller's scope, so a forged token can move the cutoff within the
+caller's own rows and nowhere else.
+
+Filters are the GET grammar (`filter_predicate`). Scoping is mandatory: a
+purge removes the caller's rows only.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import os
+import time
+
+import pymysql
+
+from rest_api_utils import compose_rest_response, error_detail
+from structured_log import log, log_sql
+from auth_utils import table_policy
+from schema_cache import table_schema, invalidate_on_error
+from rest_get_table import PAGE_CURSOR_HEADER, filter_predicate
+import ownership_cache
+import timing
+
+# Reserved route name, like `_batch` and `_tx`: never a table.
+PURGE_ROUTE = '_purge'
+
+PURGE_TABLES = frozenset(
+    name.strip() for name in os.environ.get(
+        'purge_tables',
+        'agent_telemetry_rows,agent_telemetry_row_docs,map_coordinates,swarm_sessions'
+    ).split(',') if name.strip())
+
+# `older_than_days` compares this column.
+PURGE_AGE_COLUMN = os.environ.get('purge_age_column', 'create_ts')
+
+PURGE_DEFAULT_CHUNK = int(os.environ.get('purge_chunk_rows', '1000'))
+PURGE_MAX_CHUNK = int(os.environ.get('purge_max_chunk_rows', '5000'))
+
+# Time kept back from the Lambda deadline to answer in.
+PURGE_DEADLINE_RESERVE_MS = int(os.environ.get('purge_deadline_reserve_ms', '3000'))
+
+# Longest one call deletes for, deadline or not: API Gateway answers 504 at
+# 29 s no matter how long the function itself may run.
+PURGE_TIME_BUDGET_MS = int(os.environ.get('purge_time_budget_ms', '20000'))
+
+# Query-string parameters that are not filters.
+_CONTROL_PARAMS = ('table', 'older_than_days', 'limit', 'next')
+
+
+def _fingerprint(table, qsp):
+    """What a token is bound to: the table and every selecting parameter."""
+    selecting = sorted((key, value) for key, value in qsp.items()
+                       if key not in ('limit', 'next'))
+    digest = hashlib.sha256(json.dumps([table, selecting]).encode())
+    return digest.hexdigest()[:16]
+
+
+def _encode_token(fingerprint, cutoff, ceiling, deleted):
+    payload = json.dumps({'f': fingerprint, 'c': cutoff, 'm': ceiling, 'n': deleted},
+                         default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_token(token, fingerprint):
+    """(cutoff, ceiling, deleted so far), or None for a token that is not
+    ours for THIS table and filter set."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(payload, dict) or payload.get('f') != fingerprint:
+        return None
+    cutoff, ceiling, deleted = payload.get('c'), payload.get('m'), payload.get('n')
+    if not (cutoff is None or isinstance(cutoff, str)) \
+            or not isinstance(ceiling, int) or isinstance(ceiling, bool) \
+            or not isinstance(deleted, int) or isinstance(deleted, bool):
+        return None
+    return cutoff, ceiling, deleted
+
+
+def _plan(conn, qsp, table, columns, authenticated_user):
+    """((predicates, params, days, limit), None), or (None, (status, message))."""
+    policy = table_policy(table)
+    if authenticated_user is None or not policy.requires_identity:
+        return None, (403, 'FORBIDDEN')
+
+    days = qsp.get('older_than_days')
+    if days is not None:
+        if not days.isdigit() or PURGE_AGE_COLUMN not in columns:
+            return None, (400, f"invalid older_than_days: {days}")
+        days = int(days)
+
+    limit = qsp.get('limit', str(PURGE_DEFAULT_CHUNK))
+    if not limit.isdigit() or not 0 < int(limit) <= PURGE_MAX_CHUNK:
+        return None, (400, f"invalid limit: {limit} (1-{PURGE_MAX_CHUNK})")
+
+    predicates, params = [], []
+    for key, value in qsp.items():
+        if key in _CONTROL_PARAMS:
+            continue
+        if key == 'creator_fk' and policy.creator_fk:
+            continue
+        try:
+            predicate = filter_predicate(key, value, columns)
+        except ValueError:
+            predicate = None
+        if predicate is None:
+            return None, (400, f"invalid filter {key}={value}")
+        predicates.append(predicate[0])
+        params.extend(predicate[1])
+
+    if days is None and not predicates:
+        return None, (400, "purge needs older_than_days or a filter")
+
+    # Resolved per call, never carried in the token: for an 'ids' table a
+    # resumed purge re-reads the caller's parent ids.
+    scope = policy.scope(authenticated_user, conn)
+    predicates.append(scope[0])
+    params.extend(scope[1])
+    return (predicates, params, days, int(limit)), None
+
+
+def _time_left_ms(began, slowest_ms):
+    """How long another chunk may still take, or <= 0 to stop now."""
+    left = PURGE_TIME_BUDGET_MS - (time.perf_counter() - began) * 1000
+    remaining = timing.remaining_ms()
+    if remaining is not None:
+        left = min(left, remaining - PURGE_DEADLINE_RESERVE_MS)
+    return left - slowest_ms
+
+
+def rest_purge(method, conn, database, event, authenticated_user=None):
+    """Delete the caller's matching rows of one PURGE_TABLES table, chunk by
+    chunk, until none are left or time runs short.
+
+    200 with `{"table", "deleted", "deleted_total", "chunks": [{"deleted",
+    "ms"}], "elapsed_ms", "done"}`; while `done` is false, `X-Next-Cursor`
+    carries the token that resumes it.
+    """
+    if method != 'DELETE':
+        return compose_rest_response(
+            400, '', f"{PURGE_ROUTE} accepts DELETE only; {method} not allowed")
+
+    began = time.perf_counter()
+    qsp = event.get('queryStringParameters') or {}
+    table = qsp.get('table', '')
+    if authenticated_user is None or table not in PURGE_TABLES:
+        log.info(f"HTTP {method} {PURGE_ROUTE}: {table!r} is not purgeable here")
+        return compose_rest_response(403, '', 'FORBIDDEN')
+
+    fingerprint = _fingerprint(table, qsp)
+    resumed = None
+    if 'next' in qsp:
+        resumed = _decode_token(qsp['next'], fingerprint)
+        if resumed is None:
+            log.info(f"HTTP {method} {PURGE_ROUTE} invalid or mismatched next cursor")
+            return compose_rest_response(400, '', "BAD REQUEST")
+
+    chunks = []
+    try:
+        columns = table_schema(conn, database, table).name_set
+        plan, refusal = _plan(conn, qsp, table, columns, authenticated_user)
+        if refusal is not None:
+            log.info(f"HTTP {method} {PURGE_ROUTE} refused: {refusal[1]}")
+            return compose_rest_response(refusal[0], '', refusal[1])
+        predicates, params, days, limit = plan
+
+        with conn.cursor() as cursor:
+            if resumed is not None:
+                cutoff, ceiling, deleted_before = resumed
+            else:
+                # Resolved once, by the server's clock, and carried in the token.
+                cursor.execute(f"SELECT NOW() - INTERVAL %s DAY, MAX(id) FROM {table}",
+                               (days or 0,))
+                cutoff, ceiling = cursor.fetchall()[0]
+                cutoff = str(cutoff) if days is not None else None
+                deleted_before = 0
+
+            if days is not None:
+                predicates = [f"{PURGE_AGE_COLUMN} < %s"] + predicates
+                params = [cutoff] + params
+            sql_statement = (f"DELETE FROM {table} WHERE {' AND '.join(predicates)} "
+                             f"AND id <= %s ORDER BY id LIMIT {limit}")
+            statement_params = tuple(params) + (ceiling,)
+
+            done = ceiling is None
+            slowest = 0.0
+            while not done and _time_left_ms(began, slowest) > 0:
+                started = time.perf_counter()
+                log_sql(method, sql_statement, statement_params, rows=limit)
+                deleted = cursor.execute(sql_statement, statement_params)
+                elapsed = (time.perf_counter() - started) * 1000
+                slowest = max(slowest, elapsed)
+                chunks.append({'deleted': deleted, 'ms': round(elapsed, 1)})
+                log.info('Purge chunk', table=table, chunk=len(chunks),
+                         deleted=deleted, ms=round(elapsed, 1))
+                done = deleted < limit
+
+    except pymysql.Error as e:
+        invalidate_on_error(database, e)
+        errno, detail = error_detail(e)
+        removed = sum(chunk['deleted'] for chunk in chunks)
+        errorMsg = (f"HTTP {method} {PURGE_ROUTE} failed after {len(chunks)} "
+                    f"committed chunk(s) ({removed} rows): {errno} {detail}")
+        log.error(errorMsg)
+        return compose_rest_response(500, '', errorMsg)
+
+    deleted = sum(chunk['deleted'] for chunk in chunks)
+    if deleted:
+        # `swarm_sessions` is the parent of `dev_servers` and `swarm_undos`.
+        ownership_cache.forget(table)
+    result = {'table': table, 'deleted': deleted,
+              'deleted_total': deleted_before + deleted, 'chunks': chunks,
+              'elapsed_ms': round((time.perf_counter() - began) * 1000, 1),
+              'done': done}
+    headers = None
+    if not done:
+        headers = {PAGE_CURSOR_HEADER: _encode_token(
+            fingerprint, cutoff, ceiling, deleted_before + deleted)}
+    return compose_rest_response(200, result, 'OK', headers=headers)
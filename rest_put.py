@@ -1,16 +1,33 @@
+import os
 import pymysql
-import json
 from rest_api_utils import (compose_rest_response, compose_conflict_response,
-                            error_detail, integrity_errno, parent_reference_guard)
-from classifier import varDump, pretty_print_sql
-from auth_utils import (CREATOR_FK_TABLES, PROFILE_TABLE, body_column,
-                        check_body_keys, check_enum_blanks, force_column,
-                        junction_scope_clause)
+                            error_detail, in_transaction, integrity_errno,
+                            parent_reference_guard)
+from structured_log import log, log_sql
+from auth_utils import (body_column, check_body_keys, check_enum_blanks,
+                        force_column, table_policy)
+from schema_cache import invalidate_on_error, supports_values_rows
+from rest_post import read_back_rows
 
-def rest_put(put_method, conn, database, table, body_list, authenticated_user=None):
+# How a multi-row PUT is sent:
+#   join  UPDATE t JOIN (<one derived row per item>) v ON t.id = v.id SET ...,
+#         one statement per column set, chunked (default)
+#   case  the original single statement of per-column CASE id WHEN ... chains
+BULK_PUT_ENGINE = os.environ.get('bulk_put_engine', 'join')
+
+# Items per JOIN statement. Several statements run in one transaction.
+BULK_PUT_CHUNK_ROWS = int(os.environ.get('bulk_put_chunk_rows', '1000'))
+
+# Rows the UPDATE's WHERE found, and how many of those it actually changed.
+MATCHED_HEADER = 'X-Rows-Matched'
+CHANGED_HEADER = 'X-Rows-Changed'
+
+
+def rest_put(put_method, conn, database, table, body_list, authenticated_user=None,
+             return_rows=False):
 
     if not body_list:
-        print('HTTP PUT with error 400: body not included')
+        log.info(f'HTTP {put_method} with error 400: body not included')
         return compose_rest_response(400, '', 'BAD REQUEST')
 
     # req #3125 — the keys become the SET clause, and every check below reads
@@ -23,6 +40,8 @@ def rest_put(put_method, conn, database, table, body_list, authenticated_user=No
     if refusal is not None:
         return compose_rest_response(refusal[0], '', refusal[1])
 
+    policy = table_policy(table)
+
     # req #3432 — a NOT NULL column with a bounded value domain, named by the body
     # but supplied blank. PUT needs this as much as POST and arguably more: an
     # UPDATE has no "column default" to fall back on, so a blank here does not
@@ -39,7 +58,7 @@ def rest_put(put_method, conn, database, table, body_list, authenticated_user=No
         # `PUT [{"id": <my row>, "<scope column>": <their parent>}]` passes the
         # predicate and then reassigns the row — verified against darwin_dev,
         # which is how it defeated the equivalent POST guard by the other door.
-        if table in CREATOR_FK_TABLES:
+        if policy.creator_fk:
             # Mirror rest_post: creator_fk is forced from the token, never taken
             # from the body. Writing it to its current value is a harmless no-op
             # for every legitimate caller (none send it), and it stops
@@ -90,13 +109,13 @@ def rest_put(put_method, conn, database, table, body_list, authenticated_user=No
         id = body.get('id')
 
         if id == None:
-            print('HTTP PUT with error 400: id not included in request')
+            log.info(f'HTTP {put_method} with error 400: id not included in request')
             return compose_rest_response(400, '', 'BAD REQUEST')
 
         body.pop('id')
 
         if len(body) == 0:
-            print('HTTP PUT with error 400: only id included in request')
+            log.info(f'HTTP {put_method} with error 400: only id included in request')
             return compose_rest_response(400, '', 'BAD REQUEST')
 
         keys = list(body.keys())
@@ -104,154 +123,268 @@ def rest_put(put_method, conn, database, table, body_list, authenticated_user=No
 
         set_clause = ', '.join(f"{key} = %s" for key in keys)
 
-        # Add creator_fk scoping for user-owned tables
-        if authenticated_user is not None and table in CREATOR_FK_TABLES:
-            sql_statement = f"""
-                UPDATE {table}
-                SET
-                    {set_clause}
-                WHERE
-                    id = %s AND creator_fk = %s;
-            """
-            put_params = tuple(values) + (id, authenticated_user)
-        elif authenticated_user is not None and table == PROFILE_TABLE:
-            sql_statement = f"""
-                UPDATE {table}
-                SET
-                    {set_clause}
-                WHERE
-                    id = %s AND id = %s;
-            """
-            put_params = tuple(values) + (id, authenticated_user)
-        elif authenticated_user is not None and junction_scope_clause(table):
-            # req #3122 — a table with no creator_fk is scoped through its
-            # parent. Without this branch a junction PUT fell into the unscoped
-            # `else` below, and `PUT /darwin/pipeline_step_deps [{"id":<theirs>}]`
-            # rewrote another user's dependency gate. The subquery names the
-            # PARENT table, never the one being updated, so MySQL 1093 (self-
-            # reference in an UPDATE subquery) does not apply.
-            sql_statement = f"""
+        # Scope the UPDATE to the caller's rows: creator_fk, the profile's own
+        # id, or — req #3122 — a table with no creator_fk scoped through its
+        # parent. Without that last, a junction PUT fell through unscoped, and
+        # `PUT /darwin/pipeline_step_deps [{"id":<theirs>}]` rewrote another
+        # user's dependency gate. The junction subquery names the PARENT table,
+        # never the one being updated, so MySQL 1093 (self-reference in an
+        # UPDATE subquery) does not apply.
+        where_clause, put_params = "id = %s", tuple(values) + (id,)
+        scope = policy.scope(authenticated_user, conn)
+        if scope is not None:
+            where_clause += f" AND {scope[0]}"
+            put_params += tuple(scope[1])
+        sql_statement = f"""
                 UPDATE {table}
                 SET
                     {set_clause}
                 WHERE
-                    id = %s AND {junction_scope_clause(table)};
+                    {where_clause};
             """
-            put_params = tuple(values) + (id, authenticated_user)
-        else:
-            sql_statement = f"""
-                UPDATE {table}
-                SET
-                    {set_clause}
-                WHERE
-                    id = %s;
-            """
-            put_params = tuple(values) + (id,)
     else:
-        # when PUT receives multiple records, use case syntax. Here's an example:
-        # UPDATE areas SET
-        #    sort_order = CASE id
-        #       WHEN 1 THEN 0
-        #       WHEN 2 THEN 1
-        #       ELSE sort_order
-        #       END,
-        #    area_name = CASE id
-        #      WHEN 9 THEN 'React'
-        #      WHEN 10 THEN 'Lambda'
-        #      ELSE area_name
-        #      END
-        #   WHERE id in (1,2,9,10);
-
-        id_list = list()
-        column_dict = dict()
-
+        rows = []
+        seen = set()
         for body in body_list:
             # id used to identify the record, is not part of the columns updated
             id = body.get('id')
 
             if id == None:
-                print('HTTP PUT with error 400: id not included in request')
+                log.info(f'HTTP {put_method} with error 400: id not included in request')
+                return compose_rest_response(400, '', 'BAD REQUEST')
+
+            # One row, one item, under either engine. Two items for the same id
+            # were never one answer: the `case` engine's first matching WHEN
+            # won column by column, and `join` would send two column sets as
+            # two statements, the LAST winning. `1` and `"1"` are the same row
+            # to MySQL.
+            if str(id) in seen:
+                log.info(f"HTTP {put_method} bulk: id {id!r} appears more than once")
                 return compose_rest_response(400, '', 'BAD REQUEST')
+            seen.add(str(id))
 
             body.pop('id')
 
             if len(body) == 0:
-                print('HTTP PUT with error 400: only id included in request')
+                log.info(f'HTTP {put_method} with error 400: only id included in request')
                 return compose_rest_response(400, '', 'BAD REQUEST')
 
-            # creating list of id's, later convert to id string for the IN clause
-            id_list.append(id)
-
-            # iterate over key value pairs creating list of (id, value) tuples
-            # stored by column name
-            for key, value in body.items():
-                if key not in column_dict:
-                    column_dict[key] = []
-                column_dict[key].append((id, None if value == "NULL" else value))
-
-        # Build parameterized CASE expressions
-        put_params = []
-        case_parts = []
-        for col_name, when_list in column_dict.items():
-            when_clause = ' '.join(['WHEN %s THEN %s'] * len(when_list))
-            case_parts.append(f"{col_name} = CASE id {when_clause} ELSE {col_name} END")
-            for id_val, col_val in when_list:
-                put_params.extend([id_val, col_val])
-
-        set_clause = ', '.join(case_parts)
-        id_placeholders = ', '.join(['%s'] * len(id_list))
-        put_params.extend(id_list)
-
-        # Add creator_fk scoping for user-owned tables
-        if authenticated_user is not None and table in CREATOR_FK_TABLES:
-            sql_statement = f"""
-                UPDATE {table} SET
-                    {set_clause}
-                WHERE id in ({id_placeholders}) AND creator_fk = %s;
-            """
-            put_params.append(authenticated_user)
-        elif authenticated_user is not None and table == PROFILE_TABLE:
-            sql_statement = f"""
-                UPDATE {table} SET
-                    {set_clause}
-                WHERE id in ({id_placeholders}) AND id = %s;
-            """
-            put_params.append(authenticated_user)
-        elif authenticated_user is not None and junction_scope_clause(table):
-            # req #3122 — same join-through scoping on the bulk CASE path. The
-            # frontend's hand-sort save (PriorityCard.jsx) is a bulk PUT to
-            # `priority_card_order`, so this branch is live traffic, not just the
-            # pipeline case.
-            sql_statement = f"""
-                UPDATE {table} SET
-                    {set_clause}
-                WHERE id in ({id_placeholders}) AND {junction_scope_clause(table)};
-            """
-            put_params.append(authenticated_user)
+            rows.append((id, {key: None if value == "NULL" else value
+                              for key, value in body.items()}))
+
+        # The same scope as the single-row path. The frontend's hand-sort save
+        # (PriorityCard.jsx) is a bulk PUT to `priority_card_order`, so the
+        # junction case here is live traffic, not just the pipeline one.
+        scope = policy.scope(authenticated_user, conn)
+        if BULK_PUT_ENGINE == 'case':
+            statements = [case_update(table, rows, scope)]
         else:
-            sql_statement = f"""
-                UPDATE {table} SET
-                    {set_clause}
-                WHERE id in ({id_placeholders});
-            """
+            statements = join_updates(table, rows, scope,
+                                      values_rows=supports_values_rows(conn))
+        return _run_updates(put_method, conn, database, table, statements,
+                            len(body_list),
+                            _read_back_ids(return_rows, [id for id, _ in rows],
+                                           scope), scope)
 
-    try:
-        pretty_print_sql(sql_statement, put_method)
+    return _run_updates(put_method, conn, database, table,
+                        [(sql_statement, put_params, [id])], 1,
+                        _read_back_ids(return_rows, [id], scope), scope)
 
-        with conn.cursor() as cursor:
-            affected_rows = cursor.execute(sql_statement, tuple(put_params))
 
-        if affected_rows > 0:
-            return compose_rest_response(200, '', 'OK')
-        else:
-            errorMsg = f"HTTP {put_method}: NO DATA CHANGED"
-            print(errorMsg)
-            return compose_rest_response(204, 'NO DATA CHANGED', 'NO DATA CHANGED')
+def case_update(table, rows, scope):
+    """The `case` engine: ONE statement, a CASE chain per column.
+
+    `rows` is [(id, {column: value})]. An example:
+
+        UPDATE areas SET
+           sort_order = CASE id
+              WHEN 1 THEN 0
+              WHEN 2 THEN 1
+              ELSE sort_order
+              END,
+           area_name = CASE id
+             WHEN 9 THEN 'React'
+             WHEN 10 THEN 'Lambda'
+             ELSE area_name
+             END
+          WHERE id in (1,2,9,10);
+
+    2 x rows x columns parameters, and every CASE is evaluated for every row
+    the WHERE reaches. Returns [(sql, params, ids)].
+    """
+    column_dict = dict()
+    for id, body in rows:
+        for key, value in body.items():
+            column_dict.setdefault(key, []).append((id, value))
+
+    put_params = []
+    case_parts = []
+    for col_name, when_list in column_dict.items():
+        when_clause = ' '.join(['WHEN %s THEN %s'] * len(when_list))
+        case_parts.append(f"{col_name} = CASE id {when_clause} ELSE {col_name} END")
+        for id_val, col_val in when_list:
+            put_params.extend([id_val, col_val])
+
+    id_list = [id for id, _ in rows]
+    put_params.extend(id_list)
+    where = f"id in ({', '.join(['%s'] * len(id_list))})"
+    if scope is not None:
+        where += f" AND {scope[0]}"
+        put_params.extend(scope[1])
+
+    sql_statement = f"""
+        UPDATE {table} SET
+            {', '.join(case_parts)}
+        WHERE {where};
+    """
+    return sql_statement, put_params, id_list
+
+
+def join_updates(table, rows, scope, values_rows=True, chunk_rows=None):
+    """The `join` engine: the items as a derived table, joined on id.
+
+        UPDATE tasks JOIN (VALUES ROW(%s, %s), ROW(%s, %s)) AS v
+            ON tasks.id = v.column_0
+        SET tasks.done = v.column_1
+        WHERE creator_fk = %s
+
+    rows x (columns + 1) parameters, and MySQL looks each item up by primary
+    key instead of evaluating a CASE per scanned row. `values_rows=False`
+    builds the same derived table as `SELECT ... UNION ALL SELECT ...` for
+    servers older than 8.0.19.
 
+    Items are grouped by the columns they name — an item that omits a column
+    leaves it unchanged, as the CASE's `ELSE` did — and each group is cut into
+    `chunk_rows` items per statement. `rest_put` has refused an id named
+    twice, so each id is one item of one group. Returns [(sql, params, ids)]
+    in group order.
+    """
+    chunk_rows = chunk_rows or BULK_PUT_CHUNK_ROWS
+    groups = {}
+    for id, body in rows:
+        groups.setdefault(frozenset(body), (list(body), []))[1].append((id, body))
+
+    statements = []
+    for columns, items in groups.values():
+        names = ['column_0'] + [f"column_{n}" for n in range(1, len(columns) + 1)]
+        set_clause = ', '.join(f"{table}.{column} = v.{name}"
+                               for column, name in zip(columns, names[1:]))
+        where = f"\n        WHERE {scope[0]}" if scope is not None else ''
+        for start in range(0, len(items), chunk_rows):
+            chunk = items[start:start + chunk_rows]
+            row_placeholders = ', '.join(['%s'] * len(names))
+            if values_rows:
+                derived = 'VALUES ' + ', '.join(
+                    [f"ROW({row_placeholders})"] * len(chunk))
+            else:
+                first = ', '.join(f"%s AS {name}" for name in names)
+                derived = ' UNION ALL '.join(
+                    [f"SELECT {first}"]
+                    + [f"SELECT {row_placeholders}"] * (len(chunk) - 1))
+            params = []
+            for id, body in chunk:
+                params.append(id)
+                params.extend(body[column] for column in columns)
+            if scope is not None:
+                params.extend(scope[1])
+            sql_statement = (f"UPDATE {table} JOIN ({derived}) AS v\n"
+                             f"            ON {table}.id = v.column_0\n"
+                             f"        SET {set_clause}{where}")
+            statements.append((sql_statement, params, [id for id, _ in chunk]))
+    return statements
+
+
+def _read_back_ids(return_rows, ids, scope):
+    """(ids, scope) for `?return=rows` — read back under exactly the UPDATE's
+    scope, so a row the caller could not write is not shown either — or None."""
+    if not return_rows:
+        return None
+    return ids, scope
+
+
+def update_counts(cursor, table, ids, scope, affected):
+    """(matched, changed) for an UPDATE of `ids` under `scope` that changed
+    `affected` rows.
+
+    pymysql's connections count CHANGED rows — no CLIENT_FOUND_ROWS — so an
+    `affected` short of the ids sent cannot tell "no such row (or not yours)"
+    from "already had those values". Every id changed proves every id matched,
+    and costs nothing; only a shortfall counts the rows the UPDATE's WHERE
+    reaches — `id IN (ids)` under the same scope, on the same cursor, inside
+    the statement's transaction when it has one. Neither side of that WHERE
+    is something the PUT itself can move: the id is never SET, and the guards
+    in `rest_put` keep the scope column on the caller's own parents. Turning
+    on CLIENT_FOUND_ROWS instead would change what `affected` means for every
+    other statement on the connection (the upsert outcome, the DELETE 404).
+    """
+    ids = list({str(id): id for id in ids}.values())
+    if affected >= len(ids):
+        return len(ids), affected
+    where, params = f"id IN ({', '.join(['%s'] * len(ids))})", list(ids)
+    if scope is not None:
+        where += f" AND {scope[0]}"
+        params += scope[1]
+    cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", tuple(params))
+    return cursor.fetchall()[0][0], affected
+
+
+def _run_updates(put_method, conn, database, table, statements, items,
+                 read_back=None, scope=None):
+    """Execute a PUT's statements; several run in one transaction (or the
+    caller's, when one is open) so the PUT lands or rolls back whole.
+
+    `read_back` is `_read_back_ids`'s (ids, scope). Every answer carries
+    `X-Rows-Matched` and `X-Rows-Changed` — see `update_counts`.
+    """
+    own_transaction = len(statements) > 1 and not in_transaction(conn)
+    try:
+        if own_transaction:
+            conn.begin()
+        affected_rows = 0
+        counts = [0, 0]
+        with conn.cursor() as cursor:
+            for sql_statement, put_params, ids in statements:
+                log_sql(put_method, sql_statement, put_params,
+                        rows=len(ids) if items > 1 else None)
+                affected = cursor.execute(sql_statement, tuple(put_params))
+                affected_rows += affected
+                reported = update_counts(cursor, table, ids, scope, affected)
+                counts = [total + n for total, n in zip(counts, reported)]
+        if own_transaction:
+            conn.commit()
     except pymysql.Error as e:
+        if own_transaction:
+            conn.rollback()
+        invalidate_on_error(database, e)
         errno, detail = error_detail(e)
         errorMsg = f"HTTP {put_method} SQL FAILED: {errno} {detail}"
-        print(errorMsg)
+        log.error(errorMsg)
         if integrity_errno(e):
             return compose_conflict_response(table, e, errorMsg)
         return compose_rest_response(500, '', errorMsg)
+
+    if len(statements) > 1:
+        log.debug('Bulk PUT', table=table, items=items, statements=len(statements),
+                  affected=affected_rows, counts=counts)
+
+    matched, changed = counts
+    headers = {MATCHED_HEADER: str(matched), CHANGED_HEADER: str(changed)}
+
+    # `?return=rows`: every row the statement MATCHED, as it now stands —
+    # update_ts, trigger output and all — including a matched row whose
+    # values were already the ones sent. 204 only when nothing matched.
+    if read_back is not None and matched:
+        ids, scope = read_back
+        result = {"matched": matched, "changed": changed}
+        rows = read_back_rows(put_method, conn, database, table, 'id', ids, scope,
+                              partial=True)
+        if rows is not None:
+            result["rows"] = rows
+        return compose_rest_response(200, result, 'OK', headers=headers)
+
+    if affected_rows > 0:
+        return compose_rest_response(200, '', 'OK', headers=headers)
+    errorMsg = f"HTTP {put_method}: NO DATA CHANGED"
+    log.info(errorMsg)
+    return compose_rest_response(204, 'NO DATA CHANGED', 'NO DATA CHANGED',
+                                 headers=headers)
@@ -0,0 +1,170 @@
+import copy
+import json
+import re
+
+from rest_api_utils import compose_rest_response, EncodedJSON
+from rest_batch import MAX_BATCH_ITEMS, TABLE_NAME_RE, item_json, sub_event
+from structured_log import log
+
+# Reserved route name: `POST /{database}/_tx`. Like `_batch`, never a table.
+TX_ROUTE = '_tx'
+
+MAX_TX_ITEMS = MAX_BATCH_ITEMS
+
+# A write graph creates and updates rows; reads belong in `_batch`.
+TX_METHODS = ('POST', 'PUT')
+
+# `"$ref:2"` is the id item 2 created; `"$ref:2.name"` any column of its row.
+_REF_RE = re.compile(r'^\$ref:(\d+)(?:\.([A-Za-z0-9_]+))?$')
+
+
+def _body_rows(body):
+    """The row dicts of an item body: a POST's object, or a PUT's list."""
+    if isinstance(body, dict):
+        return [body]
+    if isinstance(body, list):
+        return [row for row in body if isinstance(row, dict)]
+    return []
+
+
+def _refs(body):
+    """[(row, column, (item, column))] for every `$ref` value in `body`'s rows.
+
+    Only a column's whole value is a reference — a `$ref:` inside a longer
+    string, or inside a JSON column's nested value, is data.
+    """
+    found = []
+    for row in _body_rows(body):
+        for column, value in row.items():
+            match = _REF_RE.match(value) if isinstance(value, str) else None
+            if match:
+                found.append((row, column, (int(match.group(1)),
+                                            match.group(2) or 'id')))
+    return found
+
+
+def _plan_items(body):
+    """(items, None) for a well-formed write graph, else (None, message).
+
+    Every item and every reference is checked before anything runs: a
+    reference must point BACKWARD, at a single-row POST, so its row exists by
+    the time the item naming it is sent.
+    """
+    if isinstance(body, dict):
+        body = body.get('requests')
+    if not isinstance(body, list) or not body:
+        return None, "_tx: body must be a non-empty list of writes"
+    if len(body) > MAX_TX_ITEMS:
+        return None, f"_tx: at most {MAX_TX_ITEMS} writes per transaction"
+
+    for index, item in enumerate(body):
+        if not isinstance(item, dict):
+            return None, f"_tx: item {index} is not an object"
+        if item.get('method') not in TX_METHODS:
+            return None, f"_tx: item {index} method must be one of {', '.join(TX_METHODS)}"
+        table = item.get('table')
+        if not isinstance(table, str) or not TABLE_NAME_RE.match(table) \
+                or table.startswith('_'):
+            return None, f"_tx: item {index} names no valid table"
+        if not _body_rows(item.get('body')):
+            return None, f"_tx: item {index} has no body to write"
+        query = item.get('query')
+        if query is not None and not (isinstance(query, dict) and all(
+                isinstance(k, str) and isinstance(v, str) for k, v in query.items())):
+            return None, (f"_tx: item {index} query must map parameter "
+                          "names to strings")
+        headers = item.get('headers')
+        if headers is not None and not isinstance(headers, dict):
+            return None, f"_tx: item {index} headers must be an object"
+        for _, column, (target, _) in _refs(item.get('body')):
+            if target >= index:
+                return None, (f"_tx: item {index} {column} references item "
+                              f"{target}, which has not run yet")
+            if body[target]['method'] != 'POST' \
+                    or not isinstance(body[target].get('body'), dict):
+                return None, (f"_tx: item {index} {column} references item "
+                              f"{target}, which is not a single-row POST")
+    return body, None
+
+
+def _created_row(response):
+    """The row a single-row POST created, from its response body, or None.
+
+    The read-back answers `[{row}]`; `?return=minimal` answers `{"id": ...}`,
+    which still resolves `$ref:N` but no other column.
+    """
+    try:
+        created = json.loads(response.get('body') or 'null')
+    except ValueError:
+        return None
+    if isinstance(created, list) and created and isinstance(created[0], dict):
+        return created[0]
+    if isinstance(created, dict) and 'id' in created:
+        return created
+    return None
+
+
+def rest_tx(post_method, conn, database, event, body, dispatch):
+    """Run an ordered write graph — POSTs and PUTs — as ONE transaction.
+
+    Each item is `{"method", "table", "body"[, "query", "headers"]}`,
+    dispatched through `dispatch(sub_event, table)` like a `_batch` item, so
+    every per-table guard runs on it unchanged. What `_batch` cannot do is
+    name a row that does not exist yet: here a column value `"$ref:N"` is
+    replaced, just before item N+k is sent, by the id item N created
+    (`"$ref:N.column"` by another column of its row).
+
+    The ownership guards need nothing special for that. A referenced parent
+    was inserted earlier in this transaction on this connection, with the
+    caller's creator_fk, so the guard's ownership SELECT sees it as the
+    caller's row — uncommitted changes are visible to the session making them.
+
+    200 with `[{"status", "headers", "body"}, ...]` in request order when every
+    item succeeded and the transaction committed. Otherwise the first failing
+    item's status, with `{"error", "item", "detail"}`, and nothing written.
+    """
+    if post_method != 'POST':
+        return compose_rest_response(
+            400, '', f"{TX_ROUTE} accepts POST only; {post_method} not allowed")
+
+    items, refusal = _plan_items(body)
+    if refusal is not None:
+        return compose_rest_response(400, '', refusal)
+
+    # The caller's items are rewritten below; the originals stay as sent.
+    items = copy.deepcopy(items)
+    created = {}
+    results = []
+
+    conn.begin()
+    for index, item in enumerate(items):
+        for row, column, (target, source) in _refs(item['body']):
+            value = (created.get(target) or {}).get(source)
+            if value is None:
+                conn.rollback()
+                return compose_rest_response(400, '', {
+                    'error': 'ROLLED BACK', 'item': index,
+                    'detail': f"{column}: item {target} created no {source} "
+                              "to reference"})
+            row[column] = value
+
+        response = dispatch(sub_event(event, database, item), item['table'])
+        status = response.get('statusCode', 500)
+        log.debug('_tx item', index=index, method=item['method'],
+                  table=item['table'], status=status)
+
+        if status >= 400:
+            conn.rollback()
+            try:
+                detail = json.loads(response.get('body') or 'null')
+            except ValueError:
+                detail = response.get('body')
+            return compose_rest_response(status, '', {
+                'error': 'ROLLED BACK', 'item': index, 'detail': detail})
+
+        if item['method'] == 'POST':
+            created[index] = _created_row(response)
+        results.append(item_json(response))
+
+    conn.commit()
+    return compose_rest_response(200, EncodedJSON('[' + ', '.join(results) + ']'))
@@ -0,0 +1,130 @@
+"""Python-side JSON encoding of GET rows — the `stream` read engine.
+
+The default GET (`get_read_engine=group_concat`) has MySQL build the whole
+response as ONE string:
+
+    SELECT CONCAT('[', GROUP_CONCAT(JSON_OBJECT(...) SEPARATOR ', '), ']')
+
+which Python then `json.loads` into objects and `compose_rest_response`
+`json.dumps` back into a string — three full copies of the payload alive at
+once, and the first one silently truncated at `group_concat_max_len`.
+
+The `stream` engine selects plain columns through an unbuffered `SSCursor` and
+encodes each row as it arrives, straight into the response body. To be a
+drop-in replacement it must emit the SAME BYTES the default engine does, which
+means reproducing what `JSON_OBJECT` does to each value and then what the
+`json.loads` -> `json.dumps` round trip does to that:
+
+  * keys in MySQL's JSON object order — shorter keys first, then by bytes —
+    not the column order;
+  * DATETIME/TIMESTAMP as `YYYY-MM-DD HH:MM:SS.ffffff`, always six fractional
+    digits; DATE as `YYYY-MM-DD`; TIME as `[-]H:MM:SS.ffffff`;
+  * DECIMAL as the number `json.loads` would have parsed: an int when it has
+    no fractional digits, else a float;
+  * a JSON column embedded as a value, not as a string;
+  * BIT/BINARY/BLOB as MySQL's `base64:type<N>:` string.
+
+One known difference: a single-precision FLOAT column. MySQL widens it to a
+double inside JSON_OBJECT (0.1 becomes 0.10000000149011612) while the text
+protocol hands Python the short form. No table served here declares FLOAT.
+"""
+
+import base64
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# Rows pulled per round trip from the unbuffered cursor.
+FETCH_BATCH_ROWS = 1000
+
+# MySQL's field-type code in the `base64:type<N>:` rendering of binary data.
+_BINARY_TYPE_CODES = (('bit', 16), ('blob', 252), ('varbinary', 15),
+                      ('binary', 254))
+
+
+def mysql_key_order(names):
+    """Column names in the order a MySQL JSON object stores its keys."""
+    return sorted(names, key=lambda name: (len(name.encode()), name.encode()))
+
+
+def _format_time(value):
+    micros = value.days * 86_400_000_000 + value.seconds * 1_000_000 + value.microseconds
+    sign = '-' if micros < 0 else ''
+    micros = abs(micros)
+    hours, rest = divmod(micros, 3_600_000_000)
+    minutes, rest = divmod(rest, 60_000_000)
+    seconds, fraction = divmod(rest, 1_000_000)
+    return f"{sign}{hours:02d}:{minutes:02d}:{seconds:02d}.{fraction:06d}"
+
+
+def _binary_code(column_type):
+    column_type = (column_type or '').lower()
+    for prefix, code in _BINARY_TYPE_CODES:
+        if column_type.startswith(prefix) or prefix in column_type:
+            return code
+    return 252
+
+
+def json_value(value, column_type=''):
+    """`value` as `json.loads(JSON_OBJECT(...))` would have produced it."""
+    if value is None or isinstance(value, (str, int, float)):
+        if isinstance(value, str) and (column_type or '').lower() == 'json':
+            return json.loads(value)
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat(' ', 'microseconds')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return _format_time(value)
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (bytes, bytearray)):
+        encoded = base64.b64encode(bytes(value)).decode()
+        return f"base64:type{_binary_code(column_type)}:{encoded}"
+    return str(value)
+
+
+def _converter(column_type):
+    """The per-value conversion for one column, or None when values pass as-is.
+
+    Picked once per column from the schema type so the common columns — ints
+    and strings — skip `json_value` entirely. Anything unexpected still goes
+    through `json_value`, which handles every type the driver returns.
+    """
+    column_type = (column_type or '').lower()
+    if column_type.startswith(('int', 'tinyint', 'smallint', 'mediumint', 'bigint',
+                               'varchar', 'char', 'text', 'tinytext', 'mediumtext',
+                               'longtext', 'enum', 'set')):
+        return None
+    return lambda value: json_value(value, column_type)
+
+
+def encode_rows(cursor, columns, column_types=None):
+    """The JSON array text of every row `cursor` yields, encoded as it arrives.
+
+    `columns` names the SELECT list in order; `column_types` maps a name to its
+    schema type (`schema_cache.Column.type`). Returns `(text, row_count)`.
+    Each batch is encoded into one string and its rows discarded before the
+    next batch is fetched, so the only full-size objects alive are the list of
+    encoded batches and the final join.
+    """
+    column_types = column_types or {}
+    ordered = mysql_key_order(columns)
+    plan = [(name, columns.index(name), _converter(column_types.get(name, '')))
+            for name in ordered]
+
+    parts = []
+    count = 0
+    while True:
+        batch = cursor.fetchmany(FETCH_BATCH_ROWS)
+        if not batch:
+            break
+        count += len(batch)
+        objects = [{name: (value if convert is None or value is None else convert(value))
+                    for name, position, convert in plan
+                    for value in (row[position],)}
+                   for row in batch]
+        # One dumps per batch; strip its brackets so batches join as one array.
+        parts.append(json.dumps(objects)[1:-1])
+    return '[' + ', '.join(parts) + ']', count
@@ -0,0 +1,265 @@
+"""Per-container table metadata — one `information_schema` read per database.
+
+`rest_get_table`, `rest_post`'s read-back and `rest_delete`'s key check each
+used to run `DESC {table}` on every request, so a warm GET cost two statements
+and a POST paid for a DESC after its INSERT had already committed. The schema
+changes on a migration, not per request, so this module reads every table of a
+database in ONE statement the first time any of them is needed and keeps the
+answer at module scope, where it survives between warm invocations exactly as
+the connection pool does.
+
+Two ways an entry stops being trusted:
+
+  * **Age.** `SCHEMA_CACHE_TTL_SECONDS` bounds how long a migration can go
+    unnoticed by a warm container that never trips over it.
+  * **Evidence.** A statement that fails with 1054 (unknown column) or 1146
+    (unknown table) is a statement built from a schema the database no longer
+    has. The failing request still fails — it was built on the stale answer —
+    but `invalidate_on_error` drops the database's entry so the next request
+    reads the schema fresh instead of failing the same way until the TTL runs
+    out.
+
+A table missing from a fresh read raises the same 1146 the `DESC` it replaces
+did, so every caller's `except pymysql.Error` answers it exactly as before.
+That 1146 is the cache's own verdict, not evidence against it, so it does not
+invalidate; and a miss reloads the database at most once per
+`SCHEMA_MISS_RELOAD_SECONDS` — a client asking for a table that does not
+exist, over and over, would otherwise re-read every table's metadata on every
+request.
+"""
+
+import os
+import time
+from collections import namedtuple
+
+import pymysql
+
+import timing
+from structured_log import log
+
+SCHEMA_CACHE_TTL_SECONDS = float(os.environ.get('schema_cache_ttl_sec', '300'))
+
+# How often a table missing from the cache may trigger a reload of its
+# database. Within the window a miss answers 1146 from what is cached; a table
+# created since becomes visible at most this long after its first request.
+SCHEMA_MISS_RELOAD_SECONDS = float(os.environ.get('schema_miss_reload_sec', '30'))
+
+# The errnos that prove the cached schema is wrong, not that the request is.
+SCHEMA_ERRNOS = frozenset({1054, 1146})
+
+# One column as `DESC` would have described it. `key` is DESC's `Key` column
+# ('PRI', 'UNI', 'MUL' or ''); `auto_increment` and `on_update` (MySQL stamps
+# it ON UPDATE CURRENT_TIMESTAMP) are read off `Extra`.
+Column = namedtuple('Column', 'name type nullable key auto_increment on_update',
+                    defaults=(False,))
+
+# {database: (loaded_at, {table: TableSchema})}
+_CACHE = {}
+
+# {database: monotonic time of the last reload a miss triggered}
+_MISS_RELOADS = {}
+
+SCHEMA_STATS = {'hits': 0, 'loads': 0, 'invalidations': 0, 'misses': 0}
+
+
+class UnknownTable(pymysql.ProgrammingError):
+    """The 1146 `table_schema` raises for a table its read did not find —
+    `pymysql.Error` to every caller, but not a reason to invalidate."""
+
+
+class TableSchema:
+    """The columns of one table, in ordinal order."""
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = tuple(columns)
+        self.names = [column.name for column in self.columns]
+        self.name_set = frozenset(self.names)
+        self.by_name = {column.name: column for column in self.columns}
+
+    def has(self, name):
+        return name in self.name_set
+
+    @property
+    def id_is_auto_increment(self):
+        """True exactly when MySQL GENERATES `id` — see rest_post's read-back."""
+        column = self.by_name.get('id')
+        return bool(column and column.auto_increment)
+
+
+_COLUMNS_SQL = """
+    SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, EXTRA
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = %s
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+
+def _load(conn, database):
+    with timing.span('schema'), conn.cursor() as cursor:
+        cursor.execute(_COLUMNS_SQL, (database,))
+        rows = cursor.fetchall()
+
+    grouped = {}
+    for table, name, column_type, nullable, key, extra in rows:
+        grouped.setdefault(table, []).append(Column(
+            name=name,
+            type=column_type,
+            nullable=str(nullable).upper() == 'YES',
+            key=key or '',
+            auto_increment='auto_increment' in str(extra or '').lower(),
+            on_update='on update' in str(extra or '').lower(),
+        ))
+    tables = {table: TableSchema(table, columns)
+              for table, columns in grouped.items()}
+    _CACHE[database] = (time.monotonic(), tables)
+    SCHEMA_STATS['loads'] += 1
+    return tables
+
+
+def table_schema(conn, database, table):
+    """`TableSchema` for `database.table`, from cache when it is fresh.
+
+    Raises `pymysql.Error` — the driver's own when the metadata read fails, or
+    a 1146 `ProgrammingError` when the table does not exist — so a caller's
+    existing `except pymysql.Error` handles both exactly as it handled DESC.
+
+    A table absent from a CACHED read earns one reload before the 1146: it may
+    have been created since — unless another miss reloaded this database
+    within `SCHEMA_MISS_RELOAD_SECONDS`. Absent from a fresh read, it does not
+    exist.
+    """
+    entry = _CACHE.get(database)
+    fresh = False
+    if entry is None or time.monotonic() - entry[0] > SCHEMA_CACHE_TTL_SECONDS:
+        tables = _load(conn, database)
+        fresh = True
+    else:
+        tables = entry[1]
+
+    schema = tables.get(table)
+    if schema is None and not fresh:
+        now = time.monotonic()
+        if now - _MISS_RELOADS.get(database, float('-inf')) > SCHEMA_MISS_RELOAD_SECONDS:
+            _MISS_RELOADS[database] = now
+            schema = _load(conn, database).get(table)
+            fresh = True
+    if schema is None:
+        SCHEMA_STATS['misses'] += 1
+        raise UnknownTable(1146, f"Table '{database}.{table}' doesn't exist")
+    if not fresh:
+        SCHEMA_STATS['hits'] += 1
+    return schema
+
+
+# The server settings bulk writes depend on, read once — the same for every
+# database the container serves, and changed only by a restart (or a SET
+# GLOBAL, which a new connection would see but this cache would not; the TTL
+# does not apply, `invalidate()` does).
+_SERVER = {}
+
+_SERVER_SQL = ("SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment, "
+               "@@max_allowed_packet, @@transaction_isolation")
+
+# `innodb_autoinc_lock_mode` 0 (traditional) and 1 (consecutive) reserve one
+# unbroken run of ids for a multi-row INSERT whose row count is known up front.
+# 2 (interleaved, MySQL 8's default) lets concurrent INSERTs take ids from
+# between each other's.
+_CONTIGUOUS_LOCK_MODES = frozenset({0, 1})
+
+# MySQL 5.7's default and the smallest any supported server ships with — the
+# answer when the real one cannot be read.
+DEFAULT_MAX_ALLOWED_PACKET = 4 * 1024 * 1024
+
+
+def _server_settings(conn):
+    """The `_SERVER_SQL` answers as a dict, or None when they cannot be read
+    (not cached, so the next caller tries again)."""
+    if not _SERVER:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(_SERVER_SQL)
+                lock_mode, increment, packet, isolation = cursor.fetchall()[0]
+            _SERVER.update(lock_mode=int(lock_mode), increment=int(increment),
+                           max_allowed_packet=int(packet), isolation=str(isolation))
+        except (pymysql.Error, IndexError, TypeError, ValueError) as e:
+            log.warning(f"Schema cache: server settings unreadable: {e}")
+            return None
+    return _SERVER
+
+
+def autoinc_allocation(conn):
+    """(contiguous, increment) for a multi-row INSERT's generated ids.
+
+    `contiguous` is True when the server guarantees the statement's ids are
+    `first, first + increment, ...` with nothing in between. `(False, 1)` when
+    the settings cannot be read, which is the answer that is never wrong.
+    """
+    settings = _server_settings(conn)
+    if settings is None:
+        return False, 1
+    return settings['lock_mode'] in _CONTIGUOUS_LOCK_MODES, settings['increment']
+
+
+def snapshot_reads(conn):
+    """True when a transaction's plain SELECTs read one snapshot, taken at its
+    first read (`REPEATABLE-READ`, the InnoDB default): rows another session
+    commits afterwards stay invisible to it. False when the level cannot be
+    read."""
+    settings = _server_settings(conn)
+    return settings is not None and settings['isolation'] == 'REPEATABLE-READ'
+
+
+def max_allowed_packet(conn):
+    """The server's `max_allowed_packet` in bytes — the largest statement it
+    will accept — or `DEFAULT_MAX_ALLOWED_PACKET` when it cannot be read."""
+    settings = _server_settings(conn)
+    if settings is None:
+        return DEFAULT_MAX_ALLOWED_PACKET
+    return settings['max_allowed_packet']
+
+
+# MySQL 8.0.19 added the `VALUES ROW(...)` table value constructor.
+VALUES_ROW_VERSION = (8, 0, 19)
+
+
+def supports_values_rows(conn):
+    """True when the server accepts `(VALUES ROW(...), ...)` as a derived
+    table. From the version string the handshake already carried — no
+    statement. MariaDB, and anything unparseable, answers False."""
+    try:
+        info = conn.get_server_info()
+        if not isinstance(info, str) or 'mariadb' in info.lower():
+            return False
+        version = tuple(int(part) for part in info.split('-')[0].split('.')[:3])
+    except (AttributeError, ValueError, pymysql.Error):
+        return False
+    return version >= VALUES_ROW_VERSION
+
+
+def invalidate(database=None):
+    """Forget one database's schema, or every database's when None."""
+    if database is None:
+        _CACHE.clear()
+        _MISS_RELOADS.clear()
+        _SERVER.clear()
+    else:
+        _CACHE.pop(database, None)
+    SCHEMA_STATS['invalidations'] += 1
+
+
+def invalidate_on_error(database, exc):
+    """Drop `database`'s schema when `exc` says it is stale. True if it did.
+
+    Total over every shape pymysql raises, including no args at all — it is
+    called from inside `except` blocks. `UnknownTable` is this module's own
+    answer and leaves the entry alone.
+    """
+    if isinstance(exc, UnknownTable):
+        return False
+    errno = exc.args[0] if exc.args else None
+    if isinstance(errno, int) and errno in SCHEMA_ERRNOS:
+        log.warning(f"Schema cache: {database} invalidated after errno {errno}")
+        invalidate(database)
+        return True
+    return False
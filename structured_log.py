@@ -0,0 +1,131 @@
+"""Leveled, sampled, structured logging for the request path.
+
+Replaces classifier.py's `varDump` / `pretty_print_sql`, which printed every
+body and re-split every SQL statement whether or not anyone would read it. On
+a bulk `map_coordinates` POST that was thousands of rows of body dump and an
+INSERT with thousands of placeholder groups, formatted and shipped to
+CloudWatch on every call.
+
+Every line is one JSON object: `{"level", "route", "msg", ...fields}`.
+
+    log_level         DEBUG | INFO | WARNING | ERROR            (default INFO)
+    log_sample_rate   fraction of invocations logged at DEBUG   (default 0)
+    log_sample_routes per-route overrides of that fraction, e.g.
+                      "POST /darwin/map_coordinates=0,GET /darwin/tasks=0.1"
+    log_sql_params    1 to log SQL parameter values             (default off)
+
+Sampling is per invocation, decided once in `begin_invocation`: a sampled
+invocation logs everything at DEBUG, so its trace is complete rather than a
+random subset of its lines.
+
+Formatting is lazy. `log.debug('x %s', value)` only %-formats when DEBUG is
+enabled, and `log_sql` does not even collapse the statement's whitespace
+otherwise. Parameter values are never logged unless `log_sql_params` is set —
+they are user content, and Cognito subs ride along in most WHERE clauses.
+"""
+import json
+import os
+import random
+import re
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+LOG_LEVEL = LEVELS.get(os.environ.get('log_level', 'INFO').upper(), LEVELS['INFO'])
+LOG_SAMPLE_RATE = float(os.environ.get('log_sample_rate', '0'))
+LOG_SQL_PARAMS = os.environ.get('log_sql_params', '0') == '1'
+
+
+def _parse_route_rates(spec):
+    rates = {}
+    for entry in (spec or '').split(','):
+        route, _, rate = entry.rpartition('=')
+        if route.strip():
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+LOG_SAMPLE_ROUTES = _parse_route_rates(os.environ.get('log_sample_routes'))
+
+# A run of identical placeholder groups — a multi-row VALUES list, the
+# `WHEN %s THEN %s` arms of a bulk PUT's CASE, a long `IN (%s, %s, ...)` —
+# collapsed to one group and a count, so a 5,000-row INSERT logs as one line of
+# fixed size.
+_REPEATED_GROUP_RE = re.compile(
+    r'(\((?:%s, )*%s\)|WHEN %s THEN %s|%s)(?:(?:, | )\1){2,}')
+
+
+def _collapse(match):
+    group = match.group(1)
+    return f"{group} x{match.group(0).count(group)}"
+
+
+class Logger:
+    """Module-scope logger; `begin_invocation` sets the route and the level."""
+
+    def __init__(self):
+        self.route = None
+        self.level = LOG_LEVEL
+
+    def begin_invocation(self, route):
+        """Tag this invocation's lines with `route` and decide whether it is
+        sampled — logged at DEBUG regardless of `log_level`."""
+        self.route = route
+        rate = LOG_SAMPLE_ROUTES.get(route, LOG_SAMPLE_RATE)
+        sampled = rate > 0 and random.random() < rate
+        self.level = LEVELS['DEBUG'] if sampled else LOG_LEVEL
+
+    def enabled(self, level):
+        return LEVELS[level] >= self.level
+
+    def _emit(self, level, msg, args, fields):
+        if LEVELS[level] < self.level:
+            return
+        if args:
+            msg = msg % args
+        record = {'level': level, 'route': self.route, 'msg': msg}
+        record.update(fields)
+        print(json.dumps(record, default=str, separators=(',', ':')))
+
+    def debug(self, msg, *args, **fields):
+        self._emit('DEBUG', msg, args, fields)
+
+    def info(self, msg, *args, **fields):
+        self._emit('INFO', msg, args, fields)
+
+    def warning(self, msg, *args, **fields):
+        self._emit('WARNING', msg, args, fields)
+
+    def error(self, msg, *args, **fields):
+        self._emit('ERROR', msg, args, fields)
+
+    def dump(self, value, description=''):
+        """DEBUG summary of a value — its type and size, never its content.
+
+        What `varDump` printed in full. A body is user data and can be
+        megabytes; its shape is what a trace needs.
+        """
+        if not self.enabled('DEBUG'):
+            return
+        size = len(value) if hasattr(value, '__len__') else None
+        self.debug(description, type=type(value).__name__, size=size)
+
+
+log = Logger()
+
+
+def sql_shape(sql_statement):
+    """The statement on one line with repeated placeholder groups collapsed."""
+    return _REPEATED_GROUP_RE.sub(_collapse, ' '.join(sql_statement.split()))
+
+
+def log_sql(method, sql_statement, params=None, rows=None):
+    """DEBUG the statement about to run. Nothing is formatted unless DEBUG is
+    on; `rows` is the item count of a bulk statement, logged beside its shape."""
+    if not log.enabled('DEBUG'):
+        return
+    fields = {'sql': sql_shape(sql_statement)}
+    if rows is not None:
+        fields['rows'] = rows
+    if params is not None:
+        fields['params'] = list(params) if LOG_SQL_PARAMS else len(params)
+    log.debug(f"{method} SQL", **fields)
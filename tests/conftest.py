@@ -11,6 +11,7 @@ import time
 import uuid
 
 import pytest
+from pymysql.constants import SERVER_STATUS
 
 # Add Lambda-Rest root to path so we can import handler, etc.
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -52,6 +53,141 @@ def db_connection():
     conn.close()
 
 
+# ---------------------------------------------------------------------------
+# Per-container caches
+# ---------------------------------------------------------------------------
+
+@pytest.fixture(autouse=True)
+def cold_container_caches():
+    """Every test starts as a cold container.
+
+    `schema_cache` and `ownership_cache` live at module scope so they survive
+    warm invocations; in a test session that would carry one test's fake schema,
+    or one test's parent rows, into the next.
+    """
+    import ownership_cache
+    import schema_cache
+    schema_cache.invalidate()
+    ownership_cache.forget()
+    yield
+
+
+# ---------------------------------------------------------------------------
+# Fake database — the unit tests' pymysql stand-in
+# ---------------------------------------------------------------------------
+
+class FakeCursor:
+    """One cursor of a `FakeConn`.
+
+    Deliberately not a mock library: the unit tests assert the exact SQL text
+    and the exact bound args, and a recorder keeps that legible. Statements
+    are recorded whitespace-collapsed; nothing is ever %-formatted.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+        self.lastrowid = 0
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, args=None):
+        sql = ' '.join(sql.split())
+        conn = self.conn
+        rows = conn.lookup(sql, args)
+        (conn.executed if rows is None else conn.lookups).append((sql, args))
+        if conn.error is not None:
+            raise conn.error
+        result = conn.answer(sql, args) if rows is None else rows
+        if isinstance(result, int):
+            self._rows, self.rowcount = [], result
+        else:
+            self._rows = list(result)
+            self.rowcount = len(self._rows)
+        self.lastrowid = conn.lastrowid
+        return self.rowcount
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+
+class FakeConn:
+    """A pymysql connection answered from Python.
+
+    A test subclasses it and overrides `answer(sql, args)`, which returns the
+    statement's rows (any sequence, for `fetchall`) or its affected count (an
+    int); raising from it is the statement failing. `error`, when set, fails
+    every statement.
+
+    Statements the code under test runs for its own bookkeeping are answered
+    by `lookup` and recorded in `lookups`, not `executed`, so a test asserts
+    on the statements it is about:
+
+        information_schema.COLUMNS   `info_rows`, the schema cache's read —
+                                     (TABLE_NAME, COLUMN_NAME, COLUMN_TYPE,
+                                     IS_NULLABLE, COLUMN_KEY, EXTRA)
+        @@innodb_autoinc_lock_mode   `settings`, (lock mode, increment,
+                                     max_allowed_packet, isolation level)
+        any prefix in `quiet`        its rows, e.g. a scope strategy's
+                                     `SELECT id FROM map_runs` prefetch
+    """
+
+    def __init__(self, info_rows=(), quiet=None, error=None, in_transaction=False,
+                 version='8.0.35', settings=(1, 1, 64 * 1024 * 1024, 'REPEATABLE-READ'),
+                 lastrowid=0):
+        self.info_rows = list(info_rows)
+        self.quiet = dict(quiet or {})
+        self.error = error
+        self.version = version
+        self.settings = settings
+        self.lastrowid = lastrowid
+        self.server_status = (SERVER_STATUS.SERVER_STATUS_IN_TRANS
+                              if in_transaction else 0)
+        self.executed = []
+        self.lookups = []
+        self.calls = []
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self)
+
+    def begin(self):
+        self.calls.append('begin')
+
+    def commit(self):
+        self.calls.append('commit')
+
+    def rollback(self):
+        self.calls.append('rollback')
+
+    def get_server_info(self):
+        return self.version
+
+    def lookup(self, sql, args):
+        if 'information_schema.COLUMNS' in sql:
+            return self.info_rows
+        if '@@innodb_autoinc_lock_mode' in sql:
+            return [self.settings]
+        for prefix, rows in self.quiet.items():
+            if sql.startswith(prefix):
+                return rows
+        return None
+
+    def answer(self, sql, args):
+        return 1
+
+    def sql(self, prefix=''):
+        """The recorded (sql, args) whose statement starts with `prefix`."""
+        return [(sql, args) for sql, args in self.executed if sql.startswith(prefix)]
+
+
 # ---------------------------------------------------------------------------
 # Test data isolation
 # ---------------------------------------------------------------------------
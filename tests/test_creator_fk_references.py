@@ -596,31 +596,36 @@ def test_the_owner_is_unaffected_by_the_key_check(invoke, victim, db_connection)
 
 
 # ---------------------------------------------------------------------------
-# Bulk POST column uniformity
+# Bulk POST with items naming different columns
 # ---------------------------------------------------------------------------
 
-def test_a_bulk_post_with_mismatched_columns_is_a_400_not_a_503(invoke, victim):
-    """A bulk INSERT builds ONE column list from item 0 and indexes every item
-    by it: a column missing from a later item raised KeyError from outside the
-    try block and surfaced as a 503 naming nothing."""
+def test_a_bulk_post_with_mismatched_columns_is_grouped_not_a_503(invoke, victim):
+    """A bulk INSERT used to build ONE column list from item 0 and index every
+    item by it: a column missing from a later item raised KeyError from outside
+    the try block and surfaced as a 503 naming nothing. Each column set now gets
+    its own statement."""
     resp = invoke('POST', '/darwin_dev/tasks', body=[
         {'description': 'a', 'priority': '0', 'done': '0',
          'area_fk': victim['area']},
         {'description': 'b', 'priority': '0', 'done': '0'},
     ])
-    assert resp['statusCode'] == 400, resp
+    assert resp['statusCode'] == 201, resp
+    assert json.loads(resp['body'])['inserted'] == 2
 
 
 def test_a_bulk_post_does_not_silently_drop_a_column_absent_from_item_zero(
         invoke, victim, db_connection):
     """The mirror case: `area_fk` was checked by the guard and then dropped from
-    the statement, so the set inspected and the set written had drifted apart."""
+    the statement, so the set inspected and the set written had drifted apart.
+    It is now written — the set checked IS the set written."""
+    before = _count(db_connection, 'tasks', 'area_fk', victim['area'])
     resp = invoke('POST', '/darwin_dev/tasks', body=[
         {'description': 'c', 'priority': '0', 'done': '0'},
         {'description': 'd', 'priority': '0', 'done': '0',
          'area_fk': victim['area']},
     ])
-    assert resp['statusCode'] == 400, resp
+    assert resp['statusCode'] == 201, resp
+    assert _count(db_connection, 'tasks', 'area_fk', victim['area']) == before + 1
 
 
 def test_a_uniform_bulk_post_still_works(invoke, victim, db_connection):
@@ -204,7 +204,8 @@ class TestProfilePostReadBack:
 # Unit — which id the read-back picks, with no database at all
 # ---------------------------------------------------------------------------
 
-# `DESC {table}` rows are (Field, Type, Null, Key, Default, Extra). Only `Extra`
+# `DESC {table}` rows are (Field, Type, Null, Key, Default, Extra) — the fake
+# below serves them to schema_cache as information_schema rows. Only `Extra`
 # distinguishes an id MySQL generates from one the caller supplies, which is
 # precisely the distinction #3057 missed.
 PROFILES_DESC = [
@@ -249,10 +250,18 @@ class FakeCursor:
         collapsed = ' '.join(statement.split()).upper()
         if collapsed.startswith('INSERT'):
             self._last = None
+            # pymysql's OK-packet insert id; rest_post reads it instead of
+            # issuing SELECT LAST_INSERT_ID().
+            self.lastrowid = self._script['last_insert_id']
             return 1
-        if collapsed.startswith('DESC'):
-            self._last = self._script['desc']
-            return len(self._script['desc'])
+        if 'INFORMATION_SCHEMA.COLUMNS' in collapsed:
+            # schema_cache's one read per database, answered from the same DESC
+            # rows: (TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE,
+            # COLUMN_KEY, EXTRA).
+            self._last = [('sometable', field, type_, null, key, extra)
+                          for field, type_, null, key, _default, extra
+                          in self._script['desc']]
+            return len(self._last)
         if 'LAST_INSERT_ID()' in collapsed:
             self._script['last_insert_id_queried'] = True
             self._last = ((self._script['last_insert_id'],),)
@@ -278,7 +287,8 @@ class FakeConn:
         pass
 
 
-def run_post(desc, body, last_insert_id=0, read_back=READ_BACK_ROW):
+def run_post(desc, body, last_insert_id=0, read_back=READ_BACK_ROW,
+             return_minimal=False):
     script = {
         'desc': desc,
         'last_insert_id': last_insert_id,
@@ -287,7 +297,8 @@ def run_post(desc, body, last_insert_id=0, read_back=READ_BACK_ROW):
         'last_insert_id_queried': False,
     }
     response = rest_post('POST', FakeConn(script), 'darwin_dev', 'sometable',
-                         dict(body), authenticated_user=None)
+                         dict(body), authenticated_user=None,
+                         return_minimal=return_minimal)
     return response, script
 
 
@@ -356,9 +367,10 @@ class TestReadBackIdSelection:
                                     last_insert_id=91)
 
         assert response['statusCode'] == 200
-        assert script['last_insert_id_queried']
         _, args = read_back_call(script)
         assert args == (91,)
+        # Taken from the INSERT's lastrowid — no second statement for it.
+        assert not script['last_insert_id_queried']
 
     def test_null_sentinel_id_counts_as_absent(self):
         """`"NULL"` is the caller's explicit-NULL sentinel; `id = NULL` matches
@@ -369,12 +381,12 @@ class TestReadBackIdSelection:
         assert read_back_call(script) is None
 
     def test_auto_increment_uses_last_insert_id(self):
-        """The ordinary path, unchanged."""
+        """The ordinary path: the generated id, from the INSERT's lastrowid."""
         response, script = run_post(DOMAINS_DESC, {'domain_name': 'd'},
                                     last_insert_id=4242)
 
         assert response['statusCode'] == 200
-        assert script['last_insert_id_queried']
+        assert not script['last_insert_id_queried']
         sql, args = read_back_call(script)
         assert args == (4242,)
         assert 'WHERE id=%s' in sql
@@ -412,3 +424,51 @@ class TestReadBackIdSelection:
         assert response['statusCode'] == 201
         assert read_back_call(script) is None
         assert not script['last_insert_id_queried']
+
+
+class TestStatementCount:
+    """A single-row POST on a warm container is the INSERT and one SELECT.
+
+    Before the schema cache and lastrowid it was four: INSERT, DESC,
+    SELECT LAST_INSERT_ID(), and the read-back.
+    """
+
+    def _statements(self, script):
+        return [sql.split()[0].upper() for sql, _ in script['executed']]
+
+    def test_warm_post_is_two_statements(self):
+        run_post(DOMAINS_DESC, {'domain_name': 'd'}, last_insert_id=5)   # cold
+        response, script = run_post(DOMAINS_DESC, {'domain_name': 'd'},
+                                    last_insert_id=6)
+        assert response['statusCode'] == 200
+        assert self._statements(script) == ['INSERT', 'SELECT']
+        assert read_back_call(script)[1] == (6,)
+
+    def test_cold_post_adds_only_the_schema_read(self):
+        _, script = run_post(DOMAINS_DESC, {'domain_name': 'd'}, last_insert_id=5)
+        assert len(script['executed']) == 3
+        assert 'information_schema' in script['executed'][1][0]
+
+
+class TestReturnMinimal:
+    """`?return=minimal` answers 201 {"id"} from the INSERT alone."""
+
+    def test_generated_id(self):
+        response, script = run_post(DOMAINS_DESC, {'domain_name': 'd'},
+                                    last_insert_id=88, return_minimal=True)
+        assert response['statusCode'] == 201
+        assert json.loads(response['body']) == {'id': 88}
+        assert len(script['executed']) == 1, 'no schema read, no read-back'
+
+    def test_supplied_id_wins(self):
+        sub = 'a1b2c3d4-0000-4000-8000-abcdefabcdef'
+        response, _ = run_post(PROFILES_DESC, {'id': sub, 'name': 'n'},
+                               last_insert_id=0, return_minimal=True)
+        assert json.loads(response['body']) == {'id': sub}
+
+    def test_no_id_at_all_is_bodyless_201(self):
+        response, script = run_post(PROFILES_DESC, {'name': 'n'},
+                                    last_insert_id=0, return_minimal=True)
+        assert response['statusCode'] == 201
+        assert json.loads(response['body']) == ''
+        assert len(script['executed']) == 1
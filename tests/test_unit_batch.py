@@ -0,0 +1,166 @@
+"""`POST /{database}/_batch` — many sub-requests, one connection — no database.
+
+Every item is dispatched back through `rest_api_from_table`, so the CRUD
+functions are patched in `handler`'s namespace and the tests assert on what
+reached them: the sub-event, the shared connection, the caller's identity.
+"""
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pymysql
+import pytest
+
+with patch.dict(os.environ, {'endpoint': 'localhost', 'username': 'test_user',
+                             'db_password': 'test_pass', 'db_name': 'darwin_dev'}):
+    import handler
+
+from conftest import FakeConn
+from rest_api_utils import compose_rest_response
+from rest_batch import FAILED_DEPENDENCY, MAX_BATCH_ITEMS
+from rest_delete import rest_delete
+
+pytestmark = pytest.mark.unit
+
+USER = 'user-1'
+
+
+def _event(body, user=USER):
+    return {
+        'httpMethod': 'POST',
+        'path': '/darwin_dev/_batch',
+        'queryStringParameters': None,
+        'body': json.dumps(body),
+        'requestContext': ({'authorizer': {'claims': {'sub': user}}}
+                           if user is not None else {}),
+    }
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = MagicMock(name='conn')
+    monkeypatch.setattr(handler, 'get_connection', lambda database: conn)
+    return conn
+
+
+def _run(body, user=USER):
+    response = handler.lambda_handler(_event(body, user), {})
+    return response, json.loads(response['body'])
+
+
+class TestBatch:
+
+    def test_items_run_in_order_over_one_connection(self, conn):
+        calls = []
+
+        def fake_get(method, c, database, table, event, user):
+            calls.append(('GET', table, event['queryStringParameters'], user))
+            return compose_rest_response(200, [{'id': 1, 'table': table}],
+                                         headers={'X-Next-Cursor': 'abc'})
+
+        def fake_post(method, c, database, table, body, user, **kwargs):
+            calls.append(('POST', table, body, user))
+            return compose_rest_response(200, [dict(body, id=9)])
+
+        with patch.object(handler, 'rest_get_table', side_effect=fake_get), \
+                patch.object(handler, 'rest_post', side_effect=fake_post):
+            response, items = _run([
+                {'method': 'GET', 'table': 'areas', 'query': {'closed': '0'}},
+                {'method': 'POST', 'table': 'tasks', 'body': {'description': 'x'}},
+            ])
+
+        assert response['statusCode'] == 200
+        assert calls == [('GET', 'areas', {'closed': '0'}, USER),
+                         ('POST', 'tasks', {'description': 'x'}, USER)]
+        assert items[0] == {'status': 200, 'headers': {'X-Next-Cursor': 'abc'},
+                            'body': [{'id': 1, 'table': 'areas'}]}
+        assert items[1]['body'] == [{'description': 'x', 'id': 9}]
+        conn.begin.assert_not_called()
+
+    def test_each_item_is_scoped_like_a_single_request(self, conn):
+        """No identity: every user-scoped item is its own 403."""
+        response, items = _run([{'method': 'GET', 'table': 'tasks'},
+                                {'method': 'DELETE', 'table': 'areas', 'body': {'id': 1}}],
+                               user=None)
+        assert response['statusCode'] == 200
+        assert [item['status'] for item in items] == [403, 403]
+        conn.cursor.assert_not_called()
+
+    def test_without_transaction_a_failure_does_not_stop_the_rest(self, conn):
+        results = iter([compose_rest_response(409, '', 'CONFLICT'),
+                        compose_rest_response(200, [{'id': 2}])])
+        with patch.object(handler, 'rest_post', side_effect=lambda *a, **kw: next(results)):
+            _, items = _run([{'method': 'POST', 'table': 'tasks', 'body': {'a': 1}},
+                             {'method': 'POST', 'table': 'tasks', 'body': {'a': 2}}])
+        assert [item['status'] for item in items] == [409, 200]
+        conn.rollback.assert_not_called()
+
+    def test_transaction_commits_when_every_item_succeeds(self, conn):
+        with patch.object(handler, 'rest_post',
+                          return_value=compose_rest_response(200, [{'id': 1}])):
+            _, items = _run({'transaction': True, 'requests': [
+                {'method': 'POST', 'table': 'tasks', 'body': {'a': 1}},
+                {'method': 'POST', 'table': 'tasks', 'body': {'a': 2}}]})
+        assert [item['status'] for item in items] == [200, 200]
+        conn.begin.assert_called_once()
+        conn.commit.assert_called_once()
+        conn.rollback.assert_not_called()
+
+    def test_transaction_rolls_back_and_skips_the_rest(self, conn):
+        post = MagicMock(side_effect=[compose_rest_response(200, [{'id': 1}]),
+                                      compose_rest_response(409, '', 'CONFLICT')])
+        with patch.object(handler, 'rest_post', post):
+            _, items = _run({'transaction': True, 'requests': [
+                {'method': 'POST', 'table': 'tasks', 'body': {'a': 1}},
+                {'method': 'POST', 'table': 'tasks', 'body': {'a': 2}},
+                {'method': 'POST', 'table': 'tasks', 'body': {'a': 3}}]})
+        assert [item['status'] for item in items] == [200, 409, FAILED_DEPENDENCY]
+        assert post.call_count == 2
+        conn.rollback.assert_called_once()
+        conn.commit.assert_not_called()
+
+    @pytest.mark.parametrize('in_transaction, calls', [(True, []), (False, ['rollback'])])
+    def test_a_failed_bulk_delete_leaves_an_open_transaction_to_its_owner(
+            self, in_transaction, calls):
+        """The coordinator decides the outer transaction, not the item."""
+        conn = FakeConn(error=pymysql.OperationalError(1205, 'Lock wait timeout'),
+                        in_transaction=in_transaction)
+        response = rest_delete('DELETE', conn, 'darwin_dev', 'areas',
+                               [{'id': 1}, {'id': 2}], USER)
+        assert response['statusCode'] == 500
+        assert conn.calls == calls
+
+    def test_304_item_has_null_body(self, conn):
+        with patch.object(handler, 'rest_get_table',
+                          return_value=compose_rest_response(304, '')):
+            _, items = _run([{'method': 'GET', 'table': 'areas',
+                              'headers': {'If-None-Match': '"x"'}}])
+        assert items == [{'status': 304, 'headers': {}, 'body': None}]
+
+
+class TestBatchRefusals:
+
+    @pytest.mark.parametrize('body', [
+        [],
+        {'requests': []},
+        {'transaction': 'yes', 'requests': [{'method': 'GET', 'table': 'areas'}]},
+        [{'method': 'PATCH', 'table': 'areas'}],
+        [{'method': 'GET', 'table': 'areas; DROP TABLE areas'}],
+        [{'method': 'POST', 'table': '_batch', 'body': []}],
+        [{'method': 'GET', 'table': 'areas', 'query': {'id': 1}}],
+        [{'method': 'GET', 'table': 'areas'}] * (MAX_BATCH_ITEMS + 1),
+        [{'method': 'GET', 'table': 'areas'}, 'not an object'],
+    ], ids=['empty', 'empty-requests', 'bad-transaction', 'bad-method',
+            'bad-table', 'nested-batch', 'non-string-query', 'too-many',
+            'non-object-item'])
+    def test_malformed_batch_is_refused_before_any_item_runs(self, conn, body):
+        with patch.object(handler, 'rest_get_table') as get:
+            response = handler.lambda_handler(_event(body), {})
+        assert response['statusCode'] == 400
+        get.assert_not_called()
+        assert response['headers']['X-Db-Connection'] == 'none'
+
+    def test_get_not_allowed(self, conn):
+        event = dict(_event([]), httpMethod='GET', body=None)
+        response = handler.lambda_handler(event, {})
+        assert response['statusCode'] == 400
@@ -0,0 +1,306 @@
+"""`POST ?return=rows` on an array body — every inserted row back, in request
+order, with ids that are never guessed — no database."""
+import json
+
+import pymysql
+import pytest
+
+import rest_post as rest_post_module
+from conftest import FakeConn
+from rest_post import rest_post
+
+pytestmark = pytest.mark.unit
+
+# (TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, EXTRA)
+INFO_ROWS = [
+    ('map_coordinates', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('map_coordinates', 'run_fk', 'int', 'NO', 'MUL', ''),
+    ('map_coordinates', 'seq', 'int', 'NO', '', ''),
+    ('instructions', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('instructions', 'name', 'varchar(128)', 'NO', 'UNI', ''),
+    ('profiles', 'id', 'varchar(64)', 'NO', 'PRI', ''),
+    ('profiles', 'name', 'varchar(256)', 'NO', '', ''),
+]
+
+
+class Conn(FakeConn):
+    def __init__(self, lock_mode=1, increment=1, next_id=100, in_transaction=False,
+                 drop=0, packet=64 * 1024 * 1024, fail_at=None,
+                 isolation='REPEATABLE-READ', interleave=0):
+        super().__init__(info_rows=INFO_ROWS, in_transaction=in_transaction,
+                         settings=(lock_mode, increment, packet, isolation))
+        self.increment = increment
+        self.next_id = next_id
+        self.drop = drop
+        self.fail_at = fail_at
+        self.interleave = interleave
+        self.inserts = []
+        self.generated = []     # the ids this session's INSERTs took
+
+    def stored(self, args):
+        """Whatever the read-back asks for exists — minus `drop` rows."""
+        rows = [{'id': a, 'name': a, 'seq': 0} for a in args]
+        return rows[self.drop:]
+
+    def answer(self, sql, args):
+        if sql.startswith('INSERT'):
+            if self.fail_at == len(self.inserts) + 1:
+                raise pymysql.IntegrityError(1062, "Duplicate entry 'x'")
+            rows = sql.count('(%s')
+            self.inserts.append(rows)
+            self.lastrowid = self.next_id
+            for _ in range(rows):
+                self.generated.append(self.next_id)
+                # Another session's INSERT takes the next `interleave` ids.
+                self.next_id += (1 + self.interleave) * self.increment
+        elif sql.startswith('SELECT 1 FROM'):
+            return [(1,)]
+        elif sql.startswith('SELECT id FROM'):
+            first_id, limit = args
+            return [(i,) for i in self.generated if i >= first_id][:limit]
+        elif sql.startswith('SELECT'):
+            column = sql.split()[1].rstrip(',')
+            stored = {str(row[column]): row for row in self.stored(args)}
+            found = [(key, json.dumps(row)) for key, row in stored.items()
+                     if key in {str(a) for a in args}]
+            return list(reversed(found))    # the server's order, not ours
+        return 1
+
+    def statements(self):
+        return [sql.split()[0] for sql, _ in self.executed]
+
+
+def _post(conn, table, body, return_rows=True):
+    response = rest_post('POST', conn, 'darwin_dev', table, body,
+                         authenticated_user=None, return_rows=return_rows)
+    return response, json.loads(response['body'])
+
+
+COORDS = [{'run_fk': 1, 'seq': n} for n in range(4)]
+
+
+class TestBulkReturnRows:
+
+    def test_contiguous_ids_read_back_in_one_select(self):
+        conn = Conn(lock_mode=1)
+        response, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS])
+        assert response['statusCode'] == 201
+        assert body['inserted'] == 4 and body['first_id'] == 100
+        assert [row['id'] for row in body['rows']] == [100, 101, 102, 103]
+        assert conn.statements() == ['INSERT', 'SELECT']
+
+    def test_increment_above_one(self):
+        conn = Conn(lock_mode=0, increment=3)
+        _, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS])
+        assert [row['id'] for row in body['rows']] == [100, 103, 106, 109]
+
+    def test_interleaved_lock_mode_uses_a_unique_marker(self):
+        conn = Conn(lock_mode=2)
+        items = [{'name': 'b'}, {'name': 'a'}, {'name': 'c'}]
+        _, body = _post(conn, 'instructions', items)
+        assert [row['name'] for row in body['rows']] == ['b', 'a', 'c']
+        select = [sql for sql, _ in conn.executed if sql.startswith('SELECT name')]
+        assert select and 'WHERE name IN' in select[0]
+        assert conn.statements() == ['INSERT', 'SELECT']
+
+    def test_interleaved_lock_mode_without_marker_looks_the_ids_up(self):
+        conn = Conn(lock_mode=2)
+        _, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS])
+        assert [row['id'] for row in body['rows']] == [100, 101, 102, 103]
+        assert [sql.split(' WHERE')[0] for sql, _ in conn.executed] == [
+            'SELECT 1 FROM map_coordinates LIMIT 1',
+            'INSERT INTO map_coordinates (run_fk, seq) VALUES (%s, %s), (%s, %s), '
+            '(%s, %s), (%s, %s)',
+            'SELECT id FROM map_coordinates',
+            'SELECT id, JSON_OBJECT(\'id\', id, \'run_fk\', run_fk, \'seq\', seq) '
+            'FROM map_coordinates']
+        assert conn.calls == ['begin', 'commit']
+
+    def test_the_lookup_skips_ids_another_session_took(self):
+        conn = Conn(lock_mode=2, interleave=1)
+        _, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS])
+        assert [row['id'] for row in body['rows']] == [100, 102, 104, 106]
+        _, args = conn.sql('SELECT id FROM map_coordinates WHERE id >=')[0]
+        assert args == (100, 5)
+
+    def test_a_lookup_that_finds_the_wrong_count_answers_the_count_only(self):
+        conn = Conn(lock_mode=2)
+        conn.generated.append(150)      # a row this snapshot should not see
+        response, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS])
+        assert response['statusCode'] == 201
+        assert body == {'inserted': 4, 'first_id': 100}
+        assert conn.calls == ['begin', 'commit']
+
+    def test_without_a_snapshot_isolation_level_the_count_only(self):
+        conn = Conn(lock_mode=2, isolation='READ-COMMITTED')
+        _, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS])
+        assert body == {'inserted': 4, 'first_id': 100}
+        assert conn.statements() == ['INSERT']
+
+    def test_the_lookup_joins_an_open_transaction(self):
+        conn = Conn(lock_mode=2, in_transaction=True)
+        _, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS])
+        assert len(body['rows']) == 4
+        assert conn.calls == []
+
+    def test_the_lookup_leaves_a_failure_to_the_open_transaction(self):
+        conn = Conn(lock_mode=2, in_transaction=True, fail_at=1)
+        response, _ = _post(conn, 'map_coordinates', [dict(c) for c in COORDS])
+        assert response['statusCode'] == 409
+        assert conn.calls == []
+
+    def test_supplied_ids_read_back_as_strings(self):
+        conn = Conn()
+        items = [{'id': 'sub-2', 'name': 'x'}, {'id': 'sub-1', 'name': 'y'}]
+        _, body = _post(conn, 'profiles', items)
+        assert [row['id'] for row in body['rows']] == ['sub-2', 'sub-1']
+        _, args = [e for e in conn.executed if e[0].startswith('SELECT id')][0]
+        assert args == ('sub-2', 'sub-1')
+
+    def test_missing_rows_answer_the_count_only(self):
+        conn = Conn(lock_mode=1, drop=1)
+        response, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS])
+        assert response['statusCode'] == 201
+        assert body == {'inserted': 4, 'first_id': 100}
+
+    def test_nothing_identifies_the_rows(self):
+        conn = Conn()
+        _, body = _post(conn, 'profiles', [{'name': 'x'}, {'name': 'y'}])
+        assert 'rows' not in body
+        assert conn.statements() == ['INSERT']
+
+
+class TestBulkDefault:
+
+    def test_first_id_from_lastrowid_without_a_second_statement(self):
+        conn = Conn()
+        response, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS],
+                               return_rows=False)
+        assert body == {'inserted': 4, 'first_id': 100}
+        assert conn.statements() == ['INSERT']
+        assert conn.calls == []
+
+
+class TestChunking:
+    """Arrays bigger than the chunk budget go out as several statements."""
+
+    # One COORDS item is 12 bytes of VALUES: a 30-byte budget fits two.
+    @pytest.fixture(autouse=True)
+    def small_chunks(self, monkeypatch):
+        monkeypatch.setattr(rest_post_module, 'BULK_CHUNK_MAX_BYTES', 30)
+
+    def test_chunks_run_in_one_transaction(self):
+        conn = Conn()
+        response, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS],
+                               return_rows=False)
+        assert response['statusCode'] == 201
+        assert body == {'inserted': 4, 'first_id': 100, 'chunks': 2}
+        assert conn.inserts == [2, 2]
+        assert conn.calls == ['begin', 'commit']
+
+    def test_budget_is_half_the_packet_when_that_is_smaller(self, monkeypatch):
+        monkeypatch.setattr(rest_post_module, 'BULK_CHUNK_MAX_BYTES', 10 ** 6)
+        conn = Conn(packet=60)
+        _post(conn, 'map_coordinates', [dict(c) for c in COORDS], return_rows=False)
+        assert conn.inserts == [2, 2]
+
+    def test_an_item_over_the_budget_still_goes(self):
+        conn = Conn()
+        _post(conn, 'instructions', [{'name': 'x' * 200}, {'name': 'y'}],
+              return_rows=False)
+        assert conn.inserts == [1, 1]
+
+    def test_a_failing_chunk_is_named_and_everything_rolls_back(self):
+        conn = Conn(fail_at=2)
+        response = rest_post('POST', conn, 'darwin_dev', 'map_coordinates',
+                             [dict(c) for c in COORDS] * 2)
+        assert response['statusCode'] == 409
+        assert conn.calls == ['begin', 'rollback']
+        message = json.dumps(response)
+        assert 'chunk 2 of 4 (items 2-3)' in message
+
+    def test_no_transaction_of_its_own_inside_one(self):
+        conn = Conn(in_transaction=True)
+        _post(conn, 'map_coordinates', [dict(c) for c in COORDS], return_rows=False)
+        assert conn.inserts == [2, 2]
+        assert conn.calls == []
+
+    @pytest.mark.parametrize('items', [COORDS, COORDS * 2], ids=['one', 'chunked'])
+    def test_a_failure_inside_a_transaction_leaves_the_rollback_to_it(self, items):
+        conn = Conn(fail_at=1, in_transaction=True)
+        response = rest_post('POST', conn, 'darwin_dev', 'map_coordinates',
+                             [dict(c) for c in items])
+        assert response['statusCode'] == 409
+        assert conn.calls == []
+
+    def test_range_read_back_is_per_chunk(self):
+        conn = Conn(lock_mode=1)
+        conn.next_id = 100
+        _, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS])
+        assert [row['id'] for row in body['rows']] == [100, 101, 102, 103]
+        _, args = [e for e in conn.executed if e[0].startswith('SELECT id')][0]
+        assert args == (100, 101, 102, 103)
+
+    def test_range_read_back_follows_a_gap_between_chunks(self):
+        conn = Conn(lock_mode=1)
+        original = conn.answer
+
+        def answer(sql, args):
+            result = original(sql, args)
+            if sql.startswith('INSERT'):
+                conn.next_id += 50          # another session's rows land between
+            return result
+
+        conn.answer = answer
+        _, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS])
+        assert [row['id'] for row in body['rows']] == [100, 101, 152, 153]
+
+    def test_interleaved_lock_mode_looks_up_once_per_chunk(self):
+        conn = Conn(lock_mode=2, interleave=1)
+        _, body = _post(conn, 'map_coordinates', [dict(c) for c in COORDS])
+        assert conn.inserts == [2, 2]
+        lookups = conn.sql('SELECT id FROM map_coordinates WHERE')
+        assert [args for _, args in lookups] == [(100, 3), (104, 3)]
+        assert [row['id'] for row in body['rows']] == [100, 102, 104, 106]
+        assert conn.calls == ['begin', 'commit']
+
+
+class TestColumnGroups:
+    """Items naming different columns: one statement per column set."""
+
+    ITEMS = [{'run_fk': 1, 'seq': 0}, {'run_fk': 1}, {'run_fk': 1, 'seq': 2},
+             {'run_fk': 1}]
+
+    def test_one_insert_per_column_set_in_one_transaction(self):
+        conn = Conn()
+        response, body = _post(conn, 'map_coordinates',
+                               [dict(item) for item in self.ITEMS],
+                               return_rows=False)
+        assert response['statusCode'] == 201
+        assert body['inserted'] == 4 and body['first_id'] == 100
+        inserts = [sql for sql, _ in conn.executed if sql.startswith('INSERT')]
+        assert inserts[0].startswith('INSERT INTO map_coordinates (run_fk, seq) ')
+        assert inserts[1].startswith('INSERT INTO map_coordinates (run_fk) ')
+        assert conn.inserts == [2, 2]
+        assert conn.calls == ['begin', 'commit']
+
+    def test_rows_come_back_in_request_order(self):
+        conn = Conn(lock_mode=1)
+        _, body = _post(conn, 'map_coordinates', [dict(item) for item in self.ITEMS])
+        # group (run_fk, seq) took 100-101, group (run_fk) 102-103
+        assert [row['id'] for row in body['rows']] == [100, 102, 101, 103]
+
+    def test_the_guard_sees_every_item_once(self, monkeypatch):
+        seen = []
+        monkeypatch.setattr('rest_post.parent_reference_guard',
+                            lambda conn, table, bodies, *a, **kw: seen.append(bodies))
+        _post(Conn(), 'map_coordinates', [dict(item) for item in self.ITEMS],
+              return_rows=False)
+        assert len(seen) == 1 and len(seen[0]) == 4
+
+    def test_a_failing_group_names_its_items(self):
+        conn = Conn(fail_at=2)
+        response = rest_post('POST', conn, 'darwin_dev', 'map_coordinates',
+                             [dict(item) for item in self.ITEMS])
+        assert conn.calls == ['begin', 'rollback']
+        assert 'chunk 2 of 2 (items 1, 3)' in json.dumps(response)
@@ -0,0 +1,209 @@
+"""Multi-row PUT engines — `join` (derived table joined on id) and `case` —
+and `?return=rows`, no database: the statements are asserted as built."""
+import json
+
+import pytest
+import pymysql
+
+import rest_put as rest_put_module
+from conftest import FakeConn
+from rest_put import case_update, join_updates, rest_put
+
+pytestmark = pytest.mark.unit
+
+USER = 'sub-alice'
+
+INFO_ROWS = [
+    ('tasks', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('tasks', 'done', 'tinyint', 'NO', '', ''),
+    ('tasks', 'creator_fk', 'varchar', 'NO', 'MUL', ''),
+]
+
+
+class Conn(FakeConn):
+    def __init__(self, version='8.0.35', affected=1, error=None, matched=0, found=()):
+        # `update_counts` telling unmatched from unchanged is answered quietly,
+        # so `executed` stays the UPDATEs and read-backs.
+        super().__init__(info_rows=INFO_ROWS, quiet={'SELECT COUNT(*)': [(matched,)]},
+                         error=error, version=version)
+        self.affected = affected
+        self.found = found
+
+    @property
+    def counted(self):
+        return [(sql, args) for sql, args in self.lookups
+                if sql.startswith('SELECT COUNT(*)')]
+
+    def answer(self, sql, args):
+        if sql.startswith('SELECT'):
+            return [(key, json.dumps({'id': key, 'done': 1})) for key in self.found]
+        return self.affected
+
+
+@pytest.fixture(autouse=True)
+def no_parent_lookups(monkeypatch):
+    monkeypatch.setattr('rest_put.parent_reference_guard', lambda *a, **kw: None)
+
+
+def _put(conn, table, body, user=USER, **kwargs):
+    return rest_put('PUT', conn, 'darwin_dev', table, body, user, **kwargs)
+
+
+class TestJoinEngine:
+
+    def test_values_rows_on_mysql_8(self):
+        conn = Conn()
+        response = _put(conn, 'tasks', [{'id': 1, 'done': 1}, {'id': 2, 'done': 0}])
+        assert response['statusCode'] == 200
+        (sql, args), = conn.executed
+        assert sql == ('UPDATE tasks JOIN (VALUES ROW(%s, %s), ROW(%s, %s)) AS v '
+                       'ON tasks.id = v.column_0 SET tasks.done = v.column_1 '
+                       'WHERE creator_fk = %s')
+        assert args == (1, 1, 2, 0, USER)
+        assert conn.calls == []
+
+    @pytest.mark.parametrize('version', ['5.7.44-log', '8.0.18', '10.6.12-MariaDB'])
+    def test_union_all_elsewhere(self, version):
+        conn = Conn(version=version)
+        _put(conn, 'tasks', [{'id': 1, 'done': 1}, {'id': 2, 'done': 0}])
+        (sql, args), = conn.executed
+        assert ('JOIN (SELECT %s AS column_0, %s AS column_1 UNION ALL '
+                'SELECT %s, %s) AS v') in sql
+        assert args == (1, 1, 2, 0, USER)
+
+    def test_one_statement_per_column_set_in_one_transaction(self):
+        conn = Conn()
+        _put(conn, 'tasks', [{'id': 1, 'done': 1}, {'id': 2, 'title': 'x'},
+                             {'id': 3, 'done': 0}])
+        assert [args for _, args in conn.executed] == [(1, 1, 3, 0, USER),
+                                                       (2, 'x', USER)]
+        assert 'SET tasks.title = v.column_1' in conn.executed[1][0]
+        assert conn.calls == ['begin', 'commit']
+
+    def test_chunks(self, monkeypatch):
+        monkeypatch.setattr(rest_put_module, 'BULK_PUT_CHUNK_ROWS', 2)
+        conn = Conn()
+        _put(conn, 'tasks', [{'id': n, 'done': 1} for n in range(5)])
+        assert [sql.count('ROW(') for sql, _ in conn.executed] == [2, 2, 1]
+        assert conn.calls == ['begin', 'commit']
+
+    def test_junction_scope(self):
+        conn = Conn()
+        _put(conn, 'priority_card_order', [{'id': 1, 'sort_order': 2},
+                                           {'id': 2, 'sort_order': 1}])
+        (sql, args), = conn.executed
+        assert sql.endswith('WHERE domain_id IN (SELECT id FROM domains '
+                            'WHERE creator_fk = %s)')
+        assert args[-1] == USER
+
+    def test_null_sentinel(self):
+        (sql, params, ids), = join_updates('tasks', [(1, {'note': None})], None)
+        assert params == [1, None] and ids == [1]
+        assert 'WHERE' not in sql
+
+    def test_nothing_changed_is_a_204(self):
+        assert _put(Conn(affected=0), 'tasks',
+                    [{'id': 1, 'done': 1}, {'id': 2, 'done': 1}])['statusCode'] == 204
+
+    @pytest.mark.parametrize('items', [
+        [{'id': 1, 'done': 1}, {'id': 2, 'done': 1}, {'id': 1, 'title': 'x'}],
+        [{'id': 1, 'done': 1}, {'id': 1, 'done': 0}],
+        [{'id': 1, 'done': 1}, {'id': '1', 'done': 0}],
+    ])
+    def test_an_id_named_twice_is_a_400(self, items):
+        conn = Conn()
+        assert _put(conn, 'tasks', items)['statusCode'] == 400
+        assert not any(sql.startswith('UPDATE') for sql, _ in conn.executed)
+
+    def test_a_failure_rolls_every_statement_back(self):
+        conn = Conn(error=pymysql.OperationalError(1205, 'Lock wait timeout'))
+        response = _put(conn, 'tasks', [{'id': 1, 'done': 1}, {'id': 2, 'title': 'x'}])
+        assert response['statusCode'] == 500
+        assert conn.calls == ['begin', 'rollback']
+
+
+class TestCaseEngine:
+
+    def test_an_id_named_twice_is_a_400_too(self, monkeypatch):
+        monkeypatch.setattr(rest_put_module, 'BULK_PUT_ENGINE', 'case')
+        conn = Conn()
+        assert _put(conn, 'tasks', [{'id': 1, 'done': 1},
+                                    {'id': 1, 'done': 0}])['statusCode'] == 400
+        assert conn.executed == []
+
+    def test_selected_by_env(self, monkeypatch):
+        monkeypatch.setattr(rest_put_module, 'BULK_PUT_ENGINE', 'case')
+        conn = Conn()
+        _put(conn, 'tasks', [{'id': 1, 'done': 1}, {'id': 2, 'done': 0}])
+        (sql, args), = conn.executed
+        assert sql == ('UPDATE tasks SET done = CASE id WHEN %s THEN %s WHEN %s '
+                       'THEN %s ELSE done END WHERE id in (%s, %s) AND creator_fk = %s;')
+        assert args == (1, 1, 2, 0, 1, 2, USER)
+
+    def test_parameter_counts(self):
+        rows = [(n, {'a': n, 'b': n}) for n in range(100)]
+        _, case_params, _ = case_update('t', rows, None)
+        (_, join_params, _), = join_updates('t', rows, None)
+        assert len(case_params) == 2 * 100 * 2 + 100
+        assert len(join_params) == 100 * 3
+
+
+class TestReturnRows:
+    """`?return=rows` reads back what the UPDATE matched, under its scope."""
+
+    def test_single_row_read_back_is_scoped_like_the_update(self):
+        conn = Conn(found=[5])
+        response = _put(conn, 'tasks', [{'id': 5, 'done': 1}], return_rows=True)
+        assert response['statusCode'] == 200
+        assert json.loads(response['body']) == {
+            'matched': 1, 'changed': 1, 'rows': [{'id': 5, 'done': 1}]}
+        sql, args = conn.executed[-1]
+        assert sql.startswith('SELECT id, JSON_OBJECT(')
+        assert sql.endswith('FROM tasks WHERE id IN (%s) AND creator_fk = %s')
+        assert args == (5, USER)
+
+    def test_bulk_reads_back_only_the_rows_found(self):
+        conn = Conn(affected=1, matched=2, found=[2, 1])
+        response = _put(conn, 'tasks', [{'id': 1, 'done': 1}, {'id': 2, 'done': 1},
+                                        {'id': 9, 'done': 1}],
+                        return_rows=True)
+        body = json.loads(response['body'])
+        assert (body['matched'], body['changed']) == (2, 1)
+        assert [row['id'] for row in body['rows']] == [1, 2]
+        assert conn.executed[-1][1] == (1, 2, 9, USER)
+
+    def test_matched_but_unchanged_still_answers_the_rows(self):
+        conn = Conn(affected=0, matched=1, found=[5])
+        response = _put(conn, 'tasks', [{'id': 5, 'done': 1}], return_rows=True)
+        assert response['statusCode'] == 200
+        assert json.loads(response['body'])['changed'] == 0
+
+    def test_nothing_matched_is_still_a_204(self):
+        conn = Conn(affected=0, matched=0)
+        response = _put(conn, 'tasks', [{'id': 5, 'done': 1}], return_rows=True)
+        assert response['statusCode'] == 204
+        assert not any(sql.startswith('SELECT') for sql, _ in conn.executed)
+
+
+class TestMatchedChanged:
+
+    def test_headers_tell_unchanged_from_unmatched(self):
+        conn = Conn(affected=0, matched=1)
+        response = _put(conn, 'tasks', [{'id': 5, 'done': 1}])
+        assert response['statusCode'] == 204
+        assert response['headers']['X-Rows-Matched'] == '1'
+        assert response['headers']['X-Rows-Changed'] == '0'
+        assert conn.counted == [
+            ('SELECT COUNT(*) FROM tasks WHERE id IN (%s) AND creator_fk = %s', (5, USER))]
+
+    def test_counts_sum_across_statements(self):
+        conn = Conn()
+        response = _put(conn, 'tasks', [{'id': 1, 'done': 1}, {'id': 2, 'title': 'x'}])
+        assert response['headers']['X-Rows-Matched'] == '2'
+
+    def test_every_id_changed_is_proof_enough(self):
+        conn = Conn()
+        response = _put(conn, 'tasks', [{'id': 5, 'done': 1}])
+        assert response['statusCode'] == 200
+        assert response['headers']['X-Rows-Matched'] == '1'
+        assert conn.counted == []
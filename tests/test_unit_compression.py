@@ -0,0 +1,169 @@
+"""Negotiated response compression — Accept-Encoding / Content-Encoding — no database.
+
+Compression is opt-in (`compress_min_bytes`); each test turns it on with
+monkeypatch. A compressed body goes out base64 with `isBase64Encoded: True`
+and decodes back to exactly the bytes an uncompressed response would carry.
+"""
+import base64
+import gzip
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import response_compression
+from response_compression import (choose_encoding, compress_response,
+                                  compression_stats)
+from rest_api_utils import ETAG_FROM_BODY, compose_rest_response, etag_matches
+
+with patch.dict(os.environ, {'endpoint': 'localhost', 'username': 'test_user',
+                             'db_password': 'test_pass', 'db_name': 'darwin_dev'}):
+    import handler
+
+pytestmark = pytest.mark.unit
+
+ROWS = [{'id': n, 'description': f'task number {n}', 'done': 0} for n in range(200)]
+
+
+@pytest.fixture(autouse=True)
+def compression_on(monkeypatch):
+    monkeypatch.setattr(response_compression, 'COMPRESS_MIN_BYTES', 1024)
+    monkeypatch.setattr(response_compression, 'COMPRESSION_STATS', {})
+    monkeypatch.setattr(response_compression, '_ENCODERS',
+                        {'gzip': response_compression._ENCODERS['gzip']})
+
+
+def _decoded(response):
+    return gzip.decompress(base64.b64decode(response['body'])).decode()
+
+
+class TestChooseEncoding:
+
+    def test_no_header_is_identity(self):
+        assert choose_encoding(None) is None
+        assert choose_encoding('') is None
+
+    def test_gzip_accepted(self):
+        assert choose_encoding('gzip, deflate') == 'gzip'
+
+    def test_case_and_whitespace_ignored(self):
+        assert choose_encoding('  GZIP ;Q=0.5') == 'gzip'
+
+    def test_q_zero_refuses(self):
+        assert choose_encoding('gzip;q=0, identity') is None
+
+    def test_wildcard(self):
+        assert choose_encoding('*') == 'gzip'
+        assert choose_encoding('*;q=1, gzip;q=0') is None
+
+    def test_unknown_codings_only(self):
+        assert choose_encoding('deflate, compress') is None
+
+    def test_malformed_q_treated_as_refusal(self):
+        assert choose_encoding('gzip;q=abc') is None
+
+    def test_brotli_preferred_on_a_tie(self, monkeypatch):
+        monkeypatch.setattr(response_compression, '_ENCODERS',
+                            {'br': lambda data: data, 'gzip': lambda data: data})
+        assert choose_encoding('gzip, br') == 'br'
+        assert choose_encoding('gzip, br;q=0.5') == 'gzip'
+
+
+class TestCompressResponse:
+    """`compress_response`, the one place a body is compressed and its ETag
+    weakened; lambda_handler applies it to every route's response."""
+
+    def test_large_body_is_gzipped_base64(self):
+        identity = compose_rest_response(200, ROWS)
+        response = compress_response(compose_rest_response(200, ROWS), 'gzip')
+        assert response['isBase64Encoded'] is True
+        assert response['headers']['Content-Encoding'] == 'gzip'
+        assert response['headers']['Vary'] == 'Accept-Encoding'
+        assert _decoded(response) == identity['body']
+
+    def test_no_accept_encoding_leaves_body(self):
+        response = compress_response(compose_rest_response(200, ROWS), '')
+        assert response['isBase64Encoded'] is False
+        assert 'Content-Encoding' not in response['headers']
+        assert json.loads(response['body']) == ROWS
+        # The body was big enough to have been compressed for another client.
+        assert response['headers']['Vary'] == 'Accept-Encoding'
+
+    def test_small_body_not_compressed(self):
+        response = compress_response(compose_rest_response(200, [{'id': 1}]), 'gzip')
+        assert response['isBase64Encoded'] is False
+        assert 'Vary' not in response['headers']
+        assert json.loads(response['body']) == [{'id': 1}]
+
+    def test_disabled_by_default_threshold(self, monkeypatch):
+        monkeypatch.setattr(response_compression, 'COMPRESS_MIN_BYTES', -1)
+        response = compress_response(compose_rest_response(200, ROWS), 'gzip')
+        assert response['isBase64Encoded'] is False
+
+    def test_304_not_compressed(self):
+        etag = compose_rest_response(200, ROWS, etag=ETAG_FROM_BODY)['headers']['ETag']
+        response = compress_response(
+            compose_rest_response(200, ROWS, etag=ETAG_FROM_BODY, if_none_match=etag),
+            'gzip')
+        assert response['statusCode'] == 304
+        assert response['body'] == ''
+        assert response['isBase64Encoded'] is False
+
+    def test_strong_etag_weakened_and_still_matches(self):
+        strong = compose_rest_response(200, ROWS, etag=ETAG_FROM_BODY)['headers']['ETag']
+        response = compress_response(
+            compose_rest_response(200, ROWS, etag=ETAG_FROM_BODY), 'gzip')
+        assert response['headers']['ETag'] == 'W/' + strong
+        assert etag_matches(response['headers']['ETag'], strong)
+
+
+    def test_applying_twice_is_harmless(self):
+        response = compose_rest_response(200, ROWS)
+        compress_response(response, 'gzip', 'GET /darwin/tasks')
+        body = response['body']
+        compress_response(response, 'gzip', 'GET /darwin/tasks')
+        assert response['body'] == body
+
+    def test_bytes_saved_per_route(self):
+        for _ in range(2):
+            compress_response(compose_rest_response(200, ROWS), 'gzip', 'GET /darwin/tasks')
+        compress_response(compose_rest_response(200, ROWS), None, 'GET /darwin/tasks')
+        compress_response(compose_rest_response(200, ROWS), 'gzip', 'GET /darwin/areas')
+
+        stats = compression_stats()
+        tasks = stats['GET /darwin/tasks']
+        assert tasks['responses'] == 3
+        assert tasks['compressed'] == 2
+        assert tasks['bytes_in'] == 2 * len(json.dumps(ROWS))
+        assert 0 < tasks['bytes_out'] < tasks['bytes_in']
+        assert tasks['saved'] == tasks['bytes_in'] - tasks['bytes_out']
+        assert stats['GET /darwin/areas']['compressed'] == 1
+
+    def test_incompressible_body_left_alone(self, monkeypatch):
+        monkeypatch.setattr(response_compression, '_ENCODERS',
+                            {'gzip': lambda data: data + b'x'})
+        response = compress_response(compose_rest_response(200, ROWS), 'gzip')
+        assert response['isBase64Encoded'] is False
+        assert json.loads(response['body']) == ROWS
+
+
+class TestLambdaHandler:
+    """lambda_handler compresses every route's response in one place."""
+
+    def test_show_tables_compressed_for_route(self, monkeypatch):
+        tables = [(f'table_{n}',) for n in range(200)]
+        conn = MagicMock(name='conn')
+        conn.cursor.return_value.__enter__.return_value.fetchall.return_value = tables
+        monkeypatch.setattr(handler, 'get_connection', lambda database: conn)
+
+        response = handler.lambda_handler({
+            'httpMethod': 'GET', 'path': '/darwin_dev', 'body': None,
+            'queryStringParameters': None,
+            'headers': {'accept-encoding': 'gzip, deflate, br'},
+        }, {})
+
+        assert response['statusCode'] == 200
+        assert response['headers']['Content-Encoding'] == 'gzip'
+        assert 'table_199' in _decoded(response)
+        assert compression_stats()['GET /darwin_dev/']['compressed'] == 1
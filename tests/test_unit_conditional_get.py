@@ -0,0 +1,148 @@
+"""Conditional GET — ETag / If-None-Match / 304 — no database.
+
+Every 200 from a GET carries a strong ETag. A table whose `update_ts` MySQL
+maintains gets the cheap validator (COUNT/MAX over the scoped WHERE clause),
+and a conditional re-poll that still matches must skip the list query
+entirely. Everything else hashes the body.
+"""
+import json
+
+import pytest
+
+from conftest import FakeConn
+from rest_api_utils import (ETAG_FROM_BODY, body_etag, compose_rest_response,
+                            etag_matches, request_header)
+from rest_get_table import rest_get_table
+
+pytestmark = pytest.mark.unit
+
+USER = 'user-1'
+
+INFO_ROWS = [
+    ('tasks', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('tasks', 'description', 'varchar(1024)', 'NO', '', ''),
+    ('tasks', 'creator_fk', 'varchar(64)', 'NO', 'MUL', ''),
+    ('tasks', 'update_ts', 'timestamp', 'YES', '',
+     'DEFAULT_GENERATED on update CURRENT_TIMESTAMP'),
+    ('areas', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('areas', 'area_name', 'varchar(256)', 'NO', '', ''),
+    ('areas', 'creator_fk', 'varchar(64)', 'NO', 'MUL', ''),
+]
+
+LIST = '[{"id": 1, "description": "a"}, {"id": 2, "description": "b"}]'
+
+
+class ValidatorConn(FakeConn):
+    def __init__(self, count=2, max_ts='2026-10-01 12:00:00', settling=0):
+        super().__init__(info_rows=INFO_ROWS)
+        self.count = count
+        self.max_ts = max_ts
+        self.settling = settling
+
+    def answer(self, sql, args):
+        aggregates = (self.count, self.max_ts, self.settling)
+        if 'GROUP_CONCAT' in sql:
+            return [(LIST,) + (aggregates if 'MAX(update_ts)' in sql else ())]
+        return [aggregates]
+
+    def list_queries(self):
+        return [q for q, _ in self.executed if 'GROUP_CONCAT' in q]
+
+
+def _get(conn, table='tasks', if_none_match=None, user=USER):
+    event = {'queryStringParameters': None,
+             'headers': {'if-none-match': if_none_match} if if_none_match else None}
+    return rest_get_table('GET', conn, 'darwin_dev', table, event, user)
+
+
+def test_an_unconditional_get_is_one_statement_and_carries_the_validator():
+    conn = ValidatorConn()
+    response = _get(conn)
+
+    assert response['statusCode'] == 200
+    assert len(conn.executed) == 1
+    assert 'COUNT(*), MAX(update_ts)' in conn.executed[0][0]
+    assert response['headers']['ETag'].startswith('"ts-')
+    assert 'ETag' in response['headers']['Access-Control-Expose-Headers']
+
+
+def test_a_matching_repoll_is_a_304_without_the_list_query():
+    etag = _get(ValidatorConn())['headers']['ETag']
+    conn = ValidatorConn()
+
+    response = _get(conn, if_none_match=etag)
+
+    assert response['statusCode'] == 304
+    assert response['body'] == ''
+    assert response['headers']['ETag'] == etag
+    assert conn.list_queries() == []
+    assert 'creator_fk = %s' in conn.executed[0][0]
+    assert conn.executed[0][1] == (USER,)
+
+
+@pytest.mark.parametrize('change', [{'count': 3}, {'count': 1},
+                                    {'max_ts': '2026-10-01 12:00:05'}],
+                         ids=['insert', 'delete', 'update'])
+def test_any_change_to_the_row_set_runs_the_list_query(change):
+    etag = _get(ValidatorConn())['headers']['ETag']
+    conn = ValidatorConn(**change)
+
+    response = _get(conn, if_none_match=etag)
+
+    assert response['statusCode'] == 200
+    assert len(conn.list_queries()) == 1
+    assert response['headers']['ETag'] != etag
+    assert json.loads(response['body'])[0]['id'] == 1
+
+
+def test_another_users_tag_never_matches():
+    etag = _get(ValidatorConn(), user='someone-else')['headers']['ETag']
+    response = _get(ValidatorConn(), if_none_match=etag)
+    assert response['statusCode'] == 200
+
+
+def test_a_freshly_stamped_set_falls_back_to_the_body_hash():
+    response = _get(ValidatorConn(settling=1))
+    assert response['headers']['ETag'] == body_etag(response['body'])
+
+    conn = ValidatorConn(settling=1)
+    assert _get(conn, if_none_match=response['headers']['ETag'])['statusCode'] == 304
+    assert len(conn.list_queries()) == 1
+
+
+def test_a_table_without_a_maintained_update_ts_hashes_the_body():
+    conn = ValidatorConn()
+    response = _get(conn, table='areas')
+    assert 'MAX(update_ts)' not in conn.executed[0][0]
+    etag = response['headers']['ETag']
+    assert etag == body_etag(response['body'])
+
+    conn = ValidatorConn()
+    assert _get(conn, table='areas', if_none_match=etag)['statusCode'] == 304
+    assert len(conn.executed) == 1
+
+
+def test_errors_carry_no_etag():
+    response = compose_rest_response(404, '', 'NOT FOUND', etag=ETAG_FROM_BODY,
+                                     if_none_match='*')
+    assert response['statusCode'] == 404
+    assert 'ETag' not in response['headers']
+
+
+def test_route_headers_and_the_etag_are_both_exposed():
+    response = compose_rest_response(200, [1], 'OK', headers={'X-Next-Cursor': 'abc'},
+                                     etag=ETAG_FROM_BODY)
+    assert response['headers']['Access-Control-Expose-Headers'] == 'X-Next-Cursor, ETag'
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('"abc"', True), ('W/"abc"', True), ('"x", "abc"', True), ('*', True),
+    ('"abd"', False), ('', False), (None, False),
+])
+def test_if_none_match_grammar(header, expected):
+    assert etag_matches(header, '"abc"') is expected
+
+
+def test_request_headers_are_looked_up_ignoring_case():
+    assert request_header({'headers': {'If-None-Match': '"a"'}}, 'if-none-match') == '"a"'
+    assert request_header({'headers': None}, 'If-None-Match') is None
@@ -374,7 +374,9 @@ def test_referenced_parent_columns_dispatches_to_both_registries():
 # ---------------------------------------------------------------------------
 
 class FakeCursor:
-    """Answers `SELECT id, creator_fk FROM parent WHERE id IN (...)` from a map.
+    """Answers the tagged lookup — `SELECT 'parent' AS parent_table, id,
+    creator_fk FROM parent WHERE id IN (...)`, UNION ALL'd across parents — from
+    a map.
 
     Rows absent from the map do not exist at all — which the check must treat
     differently from rows that exist under another creator.
@@ -388,9 +390,13 @@ class FakeCursor:
 
     def execute(self, sql, params=()):
         self.queries.append((sql, params))
-        parent = re.search(r'FROM (\w+)', sql).group(1)
-        table = self.rows.get(parent, {})
-        self._result = [(i, table[i]) for i in (str(p) for p in params) if i in table]
+        self._result = []
+        params = list(params)
+        for branch in sql.split(' UNION ALL '):
+            parent = re.search(r'FROM (\w+)', branch).group(1)
+            table = self.rows.get(parent, {})
+            ids = [str(params.pop(0)) for _ in range(branch.count('%s'))]
+            self._result += [(parent, i, table[i]) for i in ids if i in table]
 
     def fetchall(self):
         return self._result
@@ -508,19 +514,48 @@ def test_one_foreign_reference_refuses_the_whole_bulk_batch():
 
 
 def test_lookups_are_grouped_per_parent_table_not_per_row():
-    """A 3,000-row import must not become 3,000 SELECTs."""
+    """A 3,000-row import must not become 3,000 SELECTs — nor one per parent."""
     bodies = [{'area_fk': 20, 'recurring_task_fk': 30} for _ in range(500)]
     verdict, cursor = _check('tasks', bodies)
     assert verdict is None
-    assert len(cursor.queries) == 2, [q[0] for q in cursor.queries]
+    assert len(cursor.queries) == 1, [q[0] for q in cursor.queries]
+    assert cursor.queries[0][1] == ('20', '30')
 
 
-def test_a_table_with_several_parents_asks_each_one_once():
-    """`requirements` names three different parent tables in one body."""
+def test_a_table_with_several_parents_asks_them_all_in_one_round_trip():
+    """`requirements` names three different parent tables in one body: one
+    UNION ALL statement, one branch per parent, tagged by its name."""
     verdict, cursor = _check('requirements', [{'project_fk': 40, 'category_fk': 10,
                                                'machine_fk': 50}])
     assert verdict is None
-    assert len(cursor.queries) == 3
+    (sql, params), = cursor.queries
+    branches = sql.split(' UNION ALL ')
+    assert sorted(re.search(r"SELECT '(\w+)' AS parent_table", b).group(1)
+                  for b in branches) == ['categories', 'machines', 'projects']
+    assert sorted(params) == ['10', '40', '50']
+
+
+@pytest.mark.parametrize('table, body', [
+    ('customer_releases', {'customer_fk': 1, 'build_fk': 2}),
+    ('swarm_undos', {'session_fk': 1, 'swarm_start_fk_at_undo': 2,
+                     'req_id_at_undo': 3}),
+    ('dev_servers', {'session_fk': 1, 'machine_fk': 2}),
+])
+def test_every_multi_parent_write_is_one_round_trip(table, body):
+    verdict, cursor = _check(table, [body], rows={})
+    assert verdict is None
+    assert len(cursor.queries) == 1
+    assert cursor.queries[0][0].count(' UNION ALL ') == len(body) - 1
+
+
+def test_a_foreign_row_is_judged_against_its_own_parent_table():
+    """The tag, not the id, says which parent a row came from: project 7 is a
+    stranger's even though category 7 — the same number — is the victim's."""
+    rows = {'projects': {7: 'stranger'}, 'categories': {7: 'victim'}, 'machines': {}}
+    verdict, cursor = _check('requirements', [{'project_fk': 7, 'category_fk': 7}],
+                             rows=rows)
+    assert verdict == (403, 'FORBIDDEN')
+    assert len(cursor.queries) == 1
 
 
 def test_a_foreign_parent_in_any_position_is_refused():
@@ -692,7 +727,8 @@ def test_a_dict_cursor_is_read_the_same_as_a_tuple_cursor():
     """
     class DictCursor(FakeCursor):
         def fetchall(self):
-            return [{'id': i, 'creator_fk': o} for i, o in self._result]
+            return [{'parent_table': p, 'id': i, 'creator_fk': o}
+                    for p, i, o in self._result]
 
     cursor = DictCursor(ROWS)
     lookups, _ = plan_parent_lookups('test_runs', [{'test_plan_fk': 2}])
@@ -1,5 +1,5 @@
 """
-Unit tests for db_connection.py — fresh connection per invocation.
+Unit tests for db_connection.py — connection settings and the warm-container pool.
 
 Run: pytest tests/test_unit_db_connection.py -v
 """
@@ -7,6 +7,7 @@ import os
 import sys
 from unittest.mock import patch, MagicMock
 
+import pymysql
 import pytest
 
 # Add Lambda-Rest root to path
@@ -20,17 +21,28 @@ _MOCK_ENV = {
 }
 
 with patch.dict(os.environ, _MOCK_ENV):
-    from db_connection import get_connection
+    import db_connection
+    from db_connection import get_connection, release_connection, pool_stats
 
 pytestmark = pytest.mark.unit
 
 
+@pytest.fixture(autouse=True)
+def empty_pool():
+    """Every test starts cold: the pool and its counters are module state."""
+    db_connection._POOL.clear()
+    for key in db_connection.POOL_STATS:
+        db_connection.POOL_STATS[key] = 0
+    yield
+    db_connection._POOL.clear()
+
+
 class TestGetConnection:
     """Tests for get_connection() — fresh connection per invocation."""
 
     @patch('db_connection.pymysql.connect')
     def test_returns_new_connection_each_call(self, mock_connect):
-        """Each call creates a fresh connection — no caching."""
+        """Without a release in between, each call creates a fresh connection."""
         conn_a = MagicMock(name='conn_a')
         conn_b = MagicMock(name='conn_b')
         mock_connect.side_effect = [conn_a, conn_b]
@@ -87,3 +99,91 @@ class TestGetConnection:
         assert kwargs.get('host') == 'localhost'
         assert kwargs.get('user') == 'test_user'
         assert kwargs.get('password') == 'test_pass'
+
+
+class TestConnectionPool:
+    """Tests for warm-invocation reuse through release_connection()."""
+
+    @patch('db_connection.pymysql.connect')
+    def test_released_connection_is_reused(self, mock_connect):
+        conn = MagicMock(name='conn')
+        mock_connect.return_value = conn
+
+        first = get_connection('darwin_dev')
+        release_connection('darwin_dev', first)
+        second = get_connection('darwin_dev')
+
+        assert second is conn
+        assert mock_connect.call_count == 1
+        assert pool_stats()['reused'] == 1
+        assert pool_stats()['opened'] == 1
+
+    @patch('db_connection.pymysql.connect')
+    def test_reuse_validates_the_connection(self, mock_connect):
+        """ping without reconnect, transaction reset, autocommit re-asserted."""
+        conn = MagicMock(name='conn')
+        mock_connect.return_value = conn
+        release_connection('darwin_dev', get_connection('darwin_dev'))
+
+        get_connection('darwin_dev')
+
+        conn.ping.assert_called_once_with(reconnect=False)
+        conn.rollback.assert_called_once_with()
+        conn.autocommit.assert_called_once_with(True)
+
+    @patch('db_connection.pymysql.connect')
+    def test_failed_ping_falls_back_to_a_fresh_connect(self, mock_connect):
+        stale = MagicMock(name='stale')
+        stale.ping.side_effect = pymysql.OperationalError(2006, 'MySQL server has gone away')
+        fresh = MagicMock(name='fresh')
+        mock_connect.side_effect = [stale, fresh]
+        release_connection('darwin_dev', get_connection('darwin_dev'))
+
+        assert get_connection('darwin_dev') is fresh
+        stale.close.assert_called_once_with()
+        assert pool_stats()['discarded'] == 1
+        assert pool_stats()['reused'] == 0
+
+    @patch('db_connection.pymysql.connect')
+    def test_idle_past_the_cap_is_closed_not_reused(self, mock_connect):
+        old = MagicMock(name='old')
+        fresh = MagicMock(name='fresh')
+        mock_connect.side_effect = [old, fresh]
+        release_connection('darwin_dev', get_connection('darwin_dev'))
+        conn, released_at = db_connection._POOL['darwin_dev']
+        db_connection._POOL['darwin_dev'] = (
+            conn, released_at - db_connection.POOL_MAX_IDLE_SECONDS - 1)
+
+        assert get_connection('darwin_dev') is fresh
+        old.close.assert_called_once_with()
+        old.ping.assert_not_called()
+        assert pool_stats()['expired'] == 1
+
+    @patch('db_connection.pymysql.connect')
+    def test_pool_is_keyed_by_database(self, mock_connect):
+        dev = MagicMock(name='dev')
+        prod = MagicMock(name='prod')
+        mock_connect.side_effect = [dev, prod]
+        release_connection('darwin_dev', get_connection('darwin_dev'))
+
+        assert get_connection('darwin') is prod
+        assert get_connection('darwin_dev') is dev
+
+    @patch('db_connection.pymysql.connect')
+    def test_unhealthy_release_closes_instead_of_pooling(self, mock_connect):
+        conn = MagicMock(name='conn')
+        mock_connect.return_value = conn
+        release_connection('darwin_dev', get_connection('darwin_dev'), healthy=False)
+
+        conn.close.assert_called_once_with()
+        assert pool_stats()['idle'] == []
+
+    @patch('db_connection.POOL_MAX_IDLE_SECONDS', 0)
+    @patch('db_connection.pymysql.connect')
+    def test_zero_idle_cap_disables_pooling(self, mock_connect):
+        conn = MagicMock(name='conn')
+        mock_connect.return_value = conn
+        release_connection('darwin_dev', get_connection('darwin_dev'))
+
+        conn.close.assert_called_once_with()
+        assert pool_stats()['idle'] == []
@@ -0,0 +1,206 @@
+"""Filtered PUT/DELETE (`rest_filtered.py`) — rows chosen by the GET filter
+grammar, no database: the statements are asserted as built."""
+import json
+
+import pytest
+
+import rest_filtered
+from conftest import FakeConn
+from rest_filtered import is_filtered_write, rest_filtered_write
+
+pytestmark = pytest.mark.unit
+
+USER = 'sub-alice'
+
+INFO_ROWS = [
+    ('tasks', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('tasks', 'area_fk', 'int', 'NO', 'MUL', ''),
+    ('tasks', 'done', 'tinyint', 'NO', '', ''),
+    ('tasks', 'done_ts', 'datetime', 'YES', '', ''),
+    ('tasks', 'creator_fk', 'varchar', 'NO', 'MUL', ''),
+    ('widgets', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('widgets', 'name', 'varchar', 'NO', '', ''),
+]
+
+
+class Conn(FakeConn):
+    def __init__(self, affected=3, chunks=()):
+        super().__init__(info_rows=INFO_ROWS)
+        self.affected = affected
+        self.chunks = [list(chunk) for chunk in chunks]
+
+    def answer(self, sql, args):
+        if sql.startswith('SELECT id'):
+            return [(i,) for i in self.chunks.pop(0)] if self.chunks else []
+        return self.affected
+
+
+@pytest.fixture(autouse=True)
+def no_parent_lookups(monkeypatch):
+    monkeypatch.setattr('rest_filtered.parent_reference_guard', lambda *a, **kw: None)
+
+
+def _write(conn, method, qsp, body=None, table='tasks', user=USER):
+    event = {'httpMethod': method, 'queryStringParameters': qsp}
+    return rest_filtered_write(method, conn, 'darwin_dev', table, event, body, user)
+
+
+class TestRouting:
+
+    @pytest.mark.parametrize('qsp, expected', [
+        ({'area_fk': '12'}, True),
+        ({'confirm': 'true'}, True),
+        ({'filter_ts': 'done_ts,2026-01-01,2026-02-01'}, True),
+        ({'return': 'rows'}, False),
+        ({'_': '1760000000'}, False),
+        ({'debug': '1', 'return': 'rows'}, False),
+        (None, False),
+    ])
+    def test_is_filtered_write(self, qsp, expected):
+        assert is_filtered_write({'queryStringParameters': qsp}, Conn(),
+                                 'darwin_dev', 'tasks') is expected
+
+
+class TestWhere:
+
+    def test_put_uses_the_get_grammar_and_the_owner_scope(self):
+        conn = Conn()
+        response = _write(conn, 'PUT', {'area_fk': '(1,2)', 'done': '0',
+                                        'confirm': 'true'}, {'done': 1})
+        assert response['statusCode'] == 200
+        # No id list to count under the filter: only what changed is known.
+        assert json.loads(response['body']) == {'changed': 3}
+        assert response['headers']['X-Rows-Changed'] == '3'
+        assert 'X-Rows-Matched' not in response['headers']
+        (sql, args), = conn.executed
+        assert sql == ('UPDATE tasks SET done = %s WHERE area_fk in (%s, %s) '
+                       'AND done = %s AND creator_fk = %s')
+        assert args == (1, '1', '2', '0', USER)
+
+    def test_delete_with_filter_ts(self):
+        conn = Conn()
+        response = _write(conn, 'DELETE', {
+            'filter_ts': '(done_ts,2024-01-01T00:00:00,2024-02-01T00:00:00)',
+            'confirm': 'true'})
+        assert json.loads(response['body']) == {'deleted': 3}
+        (sql, args), = conn.executed
+        assert sql == ('DELETE FROM tasks WHERE done_ts BETWEEN %s AND %s '
+                       'AND creator_fk = %s')
+
+    @pytest.mark.parametrize('qsp, status', [
+        ({'area_fk': '12'}, 400),                            # no confirm
+        ({'area_fk': '12', 'confirm': 'yes'}, 400),
+        ({'confirm': 'true'}, 400),                          # no filter
+        ({'creator_fk': 'x', 'confirm': 'true'}, 400),       # scope is not a filter
+        ({'nope': '1', 'confirm': 'true'}, 400),
+        ({'filter_ts': '(nope,a,b)', 'confirm': 'true'}, 400),
+        ({'area_fk': '1', 'confirm': 'true', 'limit': '0'}, 400),
+    ])
+    def test_refusals_run_nothing(self, qsp, status):
+        conn = Conn()
+        assert _write(conn, 'DELETE', qsp)['statusCode'] == status
+        assert conn.executed == []
+
+    def test_an_unowned_table_is_refused(self):
+        conn = Conn()
+        response = _write(conn, 'DELETE', {'name': 'x', 'confirm': 'true'},
+                          table='widgets')
+        assert response['statusCode'] == 403
+        assert conn.executed == []
+
+    def test_no_identity_is_refused(self):
+        assert _write(Conn(), 'DELETE', {'area_fk': '1', 'confirm': 'true'},
+                      user=None)['statusCode'] == 403
+
+    @pytest.mark.parametrize('body', [None, {}, [{'done': 1}], {'id': 5}])
+    def test_put_body_must_be_one_object_without_id(self, body):
+        conn = Conn()
+        assert _write(conn, 'PUT', {'area_fk': '1', 'confirm': 'true'},
+                      body)['statusCode'] == 400
+        assert conn.executed == []
+
+    def test_creator_fk_in_the_body_is_forced(self):
+        conn = Conn()
+        _write(conn, 'PUT', {'area_fk': '1', 'confirm': 'true'},
+               {'done': 1, 'CREATOR_FK': 'sub-mallory'})
+        assert 'sub-mallory' not in conn.executed[0][1]
+
+    def test_nothing_deleted_is_a_404(self):
+        assert _write(Conn(affected=0), 'DELETE',
+                      {'area_fk': '1', 'confirm': 'true'})['statusCode'] == 404
+
+
+class TestChunks:
+
+    def test_keyset_walk_by_id(self):
+        conn = Conn(affected=2, chunks=[(4, 9), (11,)])
+        response = _write(conn, 'DELETE', {'area_fk': '1', 'confirm': 'true',
+                                           'limit': '2'})
+        assert json.loads(response['body']) == {'deleted': 4, 'chunks': 2}
+        statements = [sql for sql, _ in conn.executed]
+        assert statements == [
+            'SELECT id FROM tasks WHERE area_fk = %s AND creator_fk = %s '
+            'ORDER BY id LIMIT 2',
+            'DELETE FROM tasks WHERE id IN (%s, %s) AND area_fk = %s AND creator_fk = %s',
+            'SELECT id FROM tasks WHERE area_fk = %s AND creator_fk = %s AND id > %s '
+            'ORDER BY id LIMIT 2',
+            'DELETE FROM tasks WHERE id IN (%s) AND area_fk = %s AND creator_fk = %s',
+        ]
+        assert conn.executed[2][1] == ('1', USER, 9)
+
+    def test_a_full_last_chunk_looks_once_more(self):
+        conn = Conn(affected=2, chunks=[(4, 9)])
+        response = _write(conn, 'PUT', {'area_fk': '1', 'confirm': 'true',
+                                        'limit': '2'}, {'done': 1})
+        assert json.loads(response['body']) == {'matched': 2, 'changed': 2,
+                                                'chunks': 1}
+        assert len(conn.executed) == 3
+
+    def test_matched_only_when_every_selected_id_changed(self):
+        conn = Conn(affected=1, chunks=[(4, 9)])
+        response = _write(conn, 'PUT', {'area_fk': '1', 'confirm': 'true',
+                                        'limit': '2'}, {'done': 1})
+        assert json.loads(response['body']) == {'changed': 1, 'chunks': 1}
+        assert 'X-Rows-Matched' not in response['headers']
+
+    def test_the_chunk_ceiling_says_more(self, monkeypatch):
+        monkeypatch.setattr(rest_filtered, 'FILTERED_WRITE_MAX_CHUNKS', 1)
+        conn = Conn(affected=2, chunks=[(4, 9), (11, 12)])
+        response = _write(conn, 'DELETE', {'area_fk': '1', 'confirm': 'true',
+                                           'limit': '2'})
+        assert json.loads(response['body']) == {'deleted': 2, 'chunks': 1,
+                                                'more': True}
+        assert 'X-Next-Cursor' in response['headers']
+
+    def test_the_cursor_resumes_past_the_last_id(self, monkeypatch):
+        """A PUT whose rows still match after the write must not rewrite
+        the same first chunk on every retry."""
+        monkeypatch.setattr(rest_filtered, 'FILTERED_WRITE_MAX_CHUNKS', 1)
+        qsp = {'area_fk': '1', 'confirm': 'true', 'limit': '2'}
+        response = _write(Conn(affected=2, chunks=[(4, 9)]), 'PUT', qsp,
+                          {'done': 0})
+        token = response['headers']['X-Next-Cursor']
+
+        conn = Conn(affected=1, chunks=[(11,)])
+        response = _write(conn, 'PUT', dict(qsp, next=token), {'done': 0})
+        assert json.loads(response['body']) == {'matched': 1, 'changed': 1,
+                                                'chunks': 1}
+        assert 'X-Next-Cursor' not in response['headers']
+        sql, args = conn.executed[0]
+        assert sql.endswith('AND id > %s ORDER BY id LIMIT 2')
+        assert args == ('1', USER, 9)
+
+    @pytest.mark.parametrize('qsp, body', [
+        ({'area_fk': '2', 'confirm': 'true', 'limit': '2'}, {'done': 0}),
+        ({'area_fk': '1', 'confirm': 'true', 'limit': '2'}, {'done': 1}),
+        ({'area_fk': '1', 'confirm': 'true'}, {'done': 0}),
+    ])
+    def test_a_cursor_is_bound_to_its_request(self, monkeypatch, qsp, body):
+        monkeypatch.setattr(rest_filtered, 'FILTERED_WRITE_MAX_CHUNKS', 1)
+        token = _write(Conn(affected=2, chunks=[(4, 9)]), 'PUT',
+                       {'area_fk': '1', 'confirm': 'true', 'limit': '2'},
+                       {'done': 0})['headers']['X-Next-Cursor']
+        conn = Conn()
+        response = _write(conn, 'PUT', dict(qsp, next=token), body)
+        assert response['statusCode'] == 400
+        assert conn.executed == []
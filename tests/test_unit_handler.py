@@ -29,7 +29,6 @@ _MOCK_ENV = {
 with patch.dict(os.environ, _MOCK_ENV):
     import handler
     from handler import SAFE_NAME_RE, parse_path, rest_api_from_table, lambda_handler
-    from rest_api_utils import compose_rest_response
 
 
 pytestmark = pytest.mark.unit
@@ -215,3 +214,123 @@ class TestLambdaHandlerGlobalErrorHandler:
         assert response['statusCode'] == 503
         assert 'SERVICE_UNAVAILABLE' in response['body']
         assert response['headers']['Access-Control-Allow-Origin'] == '*'
+
+
+# ===========================================================================
+# Lazy connection acquisition
+# ===========================================================================
+
+class TestLazyConnection:
+    """Requests answered without SQL never connect; the response says which."""
+
+    def _event(self, method='GET', path='/darwin_dev/areas', body=None, user='test-user'):
+        return {
+            'httpMethod': method,
+            'path': path,
+            'queryStringParameters': None,
+            'body': json.dumps(body) if body is not None else None,
+            'requestContext': ({'authorizer': {'claims': {'sub': user}}}
+                               if user is not None else {}),
+        }
+
+    @pytest.mark.parametrize('event_args', [
+        {'method': 'OPTIONS'},
+        {'method': 'GET', 'user': None},
+        {'method': 'PUT', 'path': '/darwin_dev/pipeline_compose'},
+        {'method': 'POST', 'body': {'AREA_NAME': 'x', 'area_name': 'y'}},
+        {'method': 'POST', 'path': '/darwin_dev/requirements',
+         'body': {'title': 'x', 'effort': ''}},
+    ], ids=['options', 'unauthenticated', 'compose-bad-method', 'body-keys',
+            'enum-blank'])
+    @patch('handler.get_connection')
+    def test_answered_without_sql_never_connects(self, mock_connect, event_args):
+        response = lambda_handler(self._event(**event_args), {})
+
+        mock_connect.assert_not_called()
+        assert response['headers']['X-Db-Connection'] == 'none'
+        assert response['statusCode'] in (200, 400, 403)
+
+    @patch('handler.get_connection')
+    def test_a_query_connects_and_reports_it(self, mock_connect):
+        conn = MagicMock(name='conn')
+        conn.cursor.return_value.__enter__.return_value.fetchall.return_value = [('areas',)]
+        mock_connect.return_value = conn
+
+        response = lambda_handler(self._event(path='/darwin_dev'), {})
+
+        mock_connect.assert_called_once_with('darwin_dev')
+        assert response['statusCode'] == 200
+        assert response['headers']['X-Db-Connection'] == 'opened'
+
+    @patch('handler.get_connection',
+           side_effect=pymysql.OperationalError(1040, 'Too many connections'))
+    def test_a_deferred_connect_failure_is_still_a_503(self, _):
+        """The connect now fails inside a CRUD module's `except pymysql.Error`;
+        it must still reach the client as DB_CONNECTION_LIMIT, not a 500."""
+        response = lambda_handler(self._event(path='/darwin_dev'), {})
+        assert response['statusCode'] == 503
+        assert 'DB_CONNECTION_LIMIT' in response['body']
+
+    def test_rollback_before_connect_is_a_no_op(self):
+        from db_connection import LazyConnection
+        opener = MagicMock()
+        conn = LazyConnection('darwin_dev', opener)
+        conn.rollback()
+        conn.release()
+        opener.assert_not_called()
+        assert conn.state == 'none'
+
+
+class TestReturnPreference:
+    """`?return=minimal|rows` or `Prefer: return=minimal` shapes a POST's answer."""
+
+    @pytest.mark.parametrize('event, expected', [
+        ({'queryStringParameters': {'return': 'minimal'}}, 'minimal'),
+        ({'queryStringParameters': {'return': 'rows'}}, 'rows'),
+        ({'queryStringParameters': {'return': 'everything'}}, None),
+        ({'headers': {'prefer': 'respond-async, return=minimal'}}, 'minimal'),
+        ({'headers': {'Prefer': 'return=representation'}}, None),
+        ({'queryStringParameters': None}, None),
+    ])
+    def test_return_preference(self, event, expected):
+        assert handler._return_preference(event) == expected
+
+
+class TestFilteredWriteRouting:
+    """A stray query parameter leaves an id-list PUT or DELETE where it was."""
+
+    class Schema:
+        name_set = frozenset({'id', 'area_fk', 'done', 'creator_fk'})
+
+    def _dispatch(self, method, qsp):
+        event = {'httpMethod': method, 'queryStringParameters': qsp}
+        with patch('rest_filtered.table_schema', return_value=self.Schema()), \
+                patch('handler.rest_filtered_write', return_value='filtered'), \
+                patch('handler.rest_put', return_value='put'), \
+                patch('handler.rest_delete', return_value='delete'):
+            return handler._dispatch_method(event, MagicMock(), 'darwin_dev', 'tasks',
+                                            [{'id': 5, 'done': 1}], 'test-user')
+
+    @pytest.mark.parametrize('method, expected', [('PUT', 'put'),
+                                                  ('DELETE', 'delete')])
+    def test_a_stray_parameter_keeps_the_id_list_path(self, method, expected):
+        assert self._dispatch(method, {'_': '1760000000'}) == expected
+
+    @pytest.mark.parametrize('qsp', [{'area_fk': '12'}, {'confirm': 'true'}])
+    def test_a_filter_or_confirm_takes_the_filtered_path(self, qsp):
+        assert self._dispatch('PUT', qsp) == 'filtered'
+
+
+class TestConflictPreference:
+    """`?on_conflict=update&update_columns=a,b` turns a POST into an upsert."""
+
+    @pytest.mark.parametrize('event, expected', [
+        ({'queryStringParameters': {'on_conflict': 'update'}}, ('update', None)),
+        ({'queryStringParameters': {'on_conflict': 'update',
+                                    'update_columns': 'title, done,'}},
+         ('update', ['title', 'done'])),
+        ({'queryStringParameters': {'update_columns': ''}}, (None, None)),
+        ({'queryStringParameters': None}, (None, None)),
+    ])
+    def test_conflict_preference(self, event, expected):
+        assert handler._conflict_preference(event) == expected
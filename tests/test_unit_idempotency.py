@@ -0,0 +1,230 @@
+"""`Idempotency-Key` on writes — a retried write replays the first response —
+no database: the key table is a dict behind a fake cursor."""
+import json
+import os
+from unittest.mock import patch
+
+import pymysql
+import pytest
+
+with patch.dict(os.environ, {'endpoint': 'localhost', 'username': 'test_user',
+                             'db_password': 'test_pass', 'db_name': 'darwin_dev'}):
+    import handler
+
+from conftest import FakeConn
+from idempotency import REPLAYED_HEADER, idempotent_write, request_hash
+from rest_api_utils import compose_rest_response
+
+pytestmark = pytest.mark.unit
+
+USER = 'user-1'
+
+
+class KeyStore(FakeConn):
+    """The idempotency table, with just enough of InnoDB's behaviour."""
+
+    def __init__(self, expired=False, error=None, in_transaction=False,
+                 rows=None, locks=None):
+        super().__init__(error=error, in_transaction=in_transaction)
+        # Two stores passed the same `rows` and `locks` are two connections
+        # to one table.
+        self.rows = {} if rows is None else rows
+        self.locks = {} if locks is None else locks
+        self.expired = expired
+        self.pending = {}
+
+    def lock(self, key, mode):
+        """Grant S or X on a key row; X while another connection holds any
+        lock on it is the deadlock InnoDB would report."""
+        holders = self.locks.setdefault(key, {})
+        if mode == 'X' and set(holders) - {self}:
+            raise pymysql.OperationalError(1213, 'Deadlock found when trying to get lock')
+        if holders.get(self) != 'X':
+            holders[self] = mode
+
+    def release(self):
+        for holders in self.locks.values():
+            holders.pop(self, None)
+
+    def commit(self):
+        super().commit()
+        self.rows.update(self.pending)
+        self.pending = {}
+        self.release()
+
+    def rollback(self):
+        super().rollback()
+        self.pending = {}
+        self.release()
+
+    def answer(self, sql, args):
+        verb = sql.split()[0]
+        if verb == 'INSERT':
+            creator, key, digest = args
+            present = (creator, key) in self.rows or (creator, key) in self.pending
+            if 'IGNORE' in sql and present:
+                self.lock((creator, key), 'S')
+                return 0
+            self.lock((creator, key), 'X')
+            self.pending[(creator, key)] = [digest, None]
+            return 1
+        if verb == 'SELECT':
+            _, creator, key = args
+            if 'FOR UPDATE' in sql:
+                self.lock((creator, key), 'X')
+            row = self.rows.get((creator, key))
+            return [(row[0], row[1], self.expired)] if row else []
+        if verb == 'DELETE':
+            self.lock(tuple(args), 'X')
+            return 1 if self.rows.pop(tuple(args), None) else 0
+        response, creator, key = args
+        self.pending[(creator, key)][1] = response
+        return 1
+
+
+def _event(body, method='POST', key='k-1'):
+    return {'httpMethod': method, 'path': '/darwin_dev/tasks',
+            'queryStringParameters': None, 'body': json.dumps(body),
+            'headers': {'Idempotency-Key': key} if key else {}}
+
+
+class Writer:
+    def __init__(self, status=200):
+        self.runs = 0
+        self.status = status
+
+    def __call__(self):
+        self.runs += 1
+        return compose_rest_response(self.status, [{'id': self.runs}], 'CREATED')
+
+
+def _write(store, writer, event=None, key='k-1'):
+    event = event or _event({'description': 'x'}, key=key)
+    return idempotent_write(store, event, USER, key, writer)
+
+
+class TestIdempotentWrite:
+
+    def test_first_write_runs_and_is_stored_with_it(self):
+        store, writer = KeyStore(), Writer()
+        response = _write(store, writer)
+        assert writer.runs == 1 and json.loads(response['body']) == [{'id': 1}]
+        assert store.calls == ['begin', 'commit']
+        assert json.loads(store.rows[(USER, 'k-1')][1])['statusCode'] == 200
+
+    def test_a_retry_replays_without_running(self):
+        store, writer = KeyStore(), Writer()
+        _write(store, writer)
+        response = _write(store, writer)
+        assert writer.runs == 1
+        assert json.loads(response['body']) == [{'id': 1}]
+        assert response['headers'][REPLAYED_HEADER] == 'true'
+        assert REPLAYED_HEADER in response['headers']['Access-Control-Expose-Headers']
+
+    def test_the_same_key_for_another_request_is_a_422(self):
+        store, writer = KeyStore(), Writer()
+        _write(store, writer)
+        response = _write(store, writer, _event({'description': 'other'}))
+        assert response['statusCode'] == 422 and writer.runs == 1
+
+    def test_keys_are_per_caller(self):
+        store, writer = KeyStore(), Writer()
+        _write(store, writer)
+        idempotent_write(store, _event({'description': 'x'}), 'user-2', 'k-1', writer)
+        assert writer.runs == 2
+
+    def test_a_failed_write_takes_its_key_with_it(self):
+        store = KeyStore()
+        response = _write(store, Writer(status=409))
+        assert response['statusCode'] == 409
+        assert store.calls == ['begin', 'rollback'] and store.rows == {}
+        writer = Writer()
+        _write(store, writer)
+        assert writer.runs == 1
+
+    def test_an_expired_key_runs_again(self):
+        store, writer = KeyStore(), Writer()
+        _write(store, writer)
+        store.expired = True
+        _write(store, writer)
+        assert writer.runs == 2
+
+    def test_no_table_means_no_idempotency(self):
+        store = KeyStore(error=pymysql.ProgrammingError(1146, "doesn't exist"))
+        writer = Writer()
+        response = _write(store, writer)
+        assert response['statusCode'] == 200 and writer.runs == 1
+        assert store.calls == ['begin', 'rollback']
+
+    def test_two_waiting_duplicates_both_replay(self):
+        rows, locks = {}, {}
+        writer = Writer()
+        _write(KeyStore(rows=rows, locks=locks), writer)
+        first = KeyStore(rows=rows, locks=locks)
+        second = KeyStore(rows=rows, locks=locks)
+        # Both queued behind the owner; its commit granted each an S lock.
+        second.begin()
+        with second.cursor() as cursor:
+            cursor.execute("INSERT IGNORE INTO idempotency_keys", (USER, 'k-1', ''))
+        assert locks[(USER, 'k-1')] == {second: 'S'}
+        assert _write(first, writer)['headers'][REPLAYED_HEADER] == 'true'
+        assert _write(second, writer)['headers'][REPLAYED_HEADER] == 'true'
+        assert writer.runs == 1
+        assert first.calls == ['begin', 'rollback'] and locks[(USER, 'k-1')] == {}
+
+    @pytest.mark.parametrize('errno, message', [(1205, 'Lock wait timeout'),
+                                                (1213, 'Deadlock found')])
+    def test_a_duplicate_that_cannot_get_the_lock_is_a_409(self, errno, message):
+        store = KeyStore(error=pymysql.OperationalError(errno, message))
+        writer = Writer()
+        assert _write(store, writer)['statusCode'] == 409
+        assert writer.runs == 0
+
+    def test_joins_an_open_transaction(self):
+        store, writer = KeyStore(in_transaction=True), Writer()
+        _write(store, writer)
+        assert store.calls == []
+
+    @pytest.mark.parametrize('key', ['', 'x' * 256])
+    def test_key_length(self, key):
+        response = _write(KeyStore(), Writer(), key=key)
+        assert response['statusCode'] == 400
+
+    def test_request_hash_covers_method_path_query_and_body(self):
+        base = _event({'a': 1})
+        assert request_hash(base) == request_hash(dict(base))
+        for change in ({'httpMethod': 'PUT'}, {'path': '/darwin_dev/areas'},
+                       {'queryStringParameters': {'return': 'rows'}},
+                       {'body': '{"a": 2}'}):
+            assert request_hash(base) != request_hash(dict(base, **change))
+
+
+class TestHandler:
+
+    def _invoke(self, monkeypatch, store, method, headers):
+        monkeypatch.setattr(handler, 'get_connection', lambda database: store)
+        event = dict(_event({'description': 'x'}, method=method, key=None),
+                     headers=headers,
+                     requestContext={'authorizer': {'claims': {'sub': USER}}})
+        return handler.lambda_handler(event, {})
+
+    def test_a_keyed_post_is_stored(self, monkeypatch):
+        store = KeyStore()
+        with patch.object(handler, 'rest_post',
+                          return_value=compose_rest_response(200, [{'id': 5}])):
+            self._invoke(monkeypatch, store, 'POST', {'Idempotency-Key': 'abc'})
+        assert (USER, 'abc') in store.rows
+
+    def test_an_unkeyed_post_is_not(self, monkeypatch):
+        store = KeyStore()
+        with patch.object(handler, 'rest_post',
+                          return_value=compose_rest_response(200, [{'id': 5}])):
+            self._invoke(monkeypatch, store, 'POST', {})
+        assert store.rows == {} and store.calls == []
+
+    def test_a_get_ignores_the_key(self, monkeypatch):
+        store = KeyStore()
+        with patch.object(handler, 'rest_get_table',
+                          return_value=compose_rest_response(200, [])):
+            self._invoke(monkeypatch, store, 'GET', {'Idempotency-Key': 'abc'})
+        assert store.calls == []
@@ -29,7 +29,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from auth_utils import (CREATOR_FK_TABLES, JUNCTION_OWNERSHIP, PROFILE_TABLE,
                         UNSCOPED_TABLES, _reference_value,
                         check_junction_parent_ownership,
-                        junction_parent_columns, junction_scope_clause)
+                        junction_parent_columns, junction_scope_clause,
+                        table_policy)
 
 
 # ---------------------------------------------------------------------------
@@ -272,7 +273,9 @@ def test_reference_value_rejects_booleans(raw):
 # ---------------------------------------------------------------------------
 
 class FakeCursor:
-    """Answers `SELECT id, creator_fk FROM parent WHERE id IN (...)` from a map.
+    """Answers the tagged lookup — `SELECT 'parent' AS parent_table, id,
+    creator_fk FROM parent WHERE id IN (...)`, UNION ALL'd across parents — from
+    a map.
 
     Rows absent from the map do not exist at all — which the check must treat
     differently from rows that exist under another creator.
@@ -286,10 +289,13 @@ class FakeCursor:
 
     def execute(self, sql, params=()):
         self.queries.append((sql, params))
-        parent = re.search(r'FROM (\w+)', sql).group(1)
-        table = self.rows.get(parent, {})
-        self._result = [(i, table[i]) for i in (str(p) for p in params)
-                        if i in table]
+        self._result = []
+        params = list(params)
+        for branch in sql.split(' UNION ALL '):
+            parent = re.search(r'FROM (\w+)', branch).group(1)
+            table = self.rows.get(parent, {})
+            ids = [str(params.pop(0)) for _ in range(branch.count('%s'))]
+            self._result += [(parent, i, table[i]) for i in ids if i in table]
 
     def fetchall(self):
         return self._result
@@ -455,8 +461,8 @@ def test_mixed_int_and_str_ids_collapse_to_one():
               {'step_fk': '1', 'requirement_fk': '10'}]
     assert check_junction_parent_ownership(
         cursor, 'pipeline_step_requirements', bodies, 'victim') is None
-    for _, params in cursor.queries:
-        assert len(params) == 1
+    (_, params), = cursor.queries
+    assert params == ('1', '10')
 
 
 def test_unregistered_tables_are_not_checked():
@@ -596,15 +602,19 @@ def test_handler_403s_unauthenticated_junction_requests():
 
     Every WHERE clause would simply omit the predicate and hand back every user's
     rows, so the junction tables must join the 403 gate rather than fall through
-    it. Read from the source because importing handler.py needs the DB env vars.
+    it. The gate is read from the source because importing handler.py needs the
+    DB env vars; what it asks is answered by the compiled policy.
     """
     here = os.path.dirname(os.path.abspath(__file__))
     source = open(os.path.join(here, '..', 'handler.py')).read()
-    assert 'JUNCTION_OWNERSHIP' in source, \
-        'handler.py does not import the junction registry'
-    gate = re.search(r'if \(table in CREATOR_FK_TABLES.*?FORBIDDEN', source, re.S)
-    assert gate and 'JUNCTION_OWNERSHIP' in gate.group(0), \
-        'the unauthenticated 403 gate does not cover junction tables'
+    gate = re.search(r'if table_policy\(table\)\.requires_identity:.*?FORBIDDEN',
+                     source, re.S)
+    assert gate and 'authenticated_user is None' in gate.group(0), \
+        'the unauthenticated 403 gate no longer reads the compiled policy'
+    uncovered = sorted(table for table in JUNCTION_OWNERSHIP
+                       if not table_policy(table).requires_identity)
+    assert not uncovered, \
+        f'the unauthenticated 403 gate does not cover junction tables: {uncovered}'
 
 
 # ---------------------------------------------------------------------------
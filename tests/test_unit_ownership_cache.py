@@ -0,0 +1,137 @@
+"""ownership_cache — the per-container memory of parent rows a caller owns,
+as `resolve_parent_lookups` uses it. No database: a fake cursor counts the
+round trips the cache saves, and the ones it must never save."""
+import re
+
+import pytest
+
+import ownership_cache
+from auth_utils import plan_parent_lookups, resolve_parent_lookups
+from conftest import FakeConn
+
+pytestmark = pytest.mark.unit
+
+
+class FakeCursor:
+    """Answers the tagged UNION ALL parent lookup from a map, counting it."""
+
+    def __init__(self, rows):
+        self.rows = {parent: {str(i): owner for i, owner in table.items()}
+                     for parent, table in rows.items()}
+        self.queries = []
+        self._result = []
+
+    def execute(self, sql, params=()):
+        self.queries.append((sql, params))
+        self._result = []
+        params = list(params)
+        for branch in sql.split(' UNION ALL '):
+            parent = re.search(r'FROM (\w+)', branch).group(1)
+            table = self.rows.get(parent, {})
+            ids = [str(params.pop(0)) for _ in range(branch.count('%s'))]
+            self._result += [(parent, i, table[i]) for i in ids if i in table]
+
+    def fetchall(self):
+        return self._result
+
+
+ROWS = {'areas': {20: 'victim', 21: 'stranger'},
+        'map_runs': {7: 'victim'},
+        'domains': {5: 'victim'}}
+
+
+def _check(cursor, table, body, user='victim'):
+    lookups, refusal = plan_parent_lookups(table, [body], require_scope=False)
+    assert refusal is None and lookups
+    return resolve_parent_lookups(cursor, table, lookups, user)
+
+
+def test_an_owned_parent_is_asked_once():
+    cursor = FakeCursor(ROWS)
+    for _ in range(3):
+        assert _check(cursor, 'map_coordinates', {'map_run_fk': 7}) is None
+    assert len(cursor.queries) == 1
+
+
+def test_only_the_unknown_ids_are_asked():
+    cursor = FakeCursor(ROWS)
+    _check(cursor, 'tasks', {'area_fk': 20})
+    _check(cursor, 'tasks', {'area_fk': 20, 'recurring_task_fk': 30})
+    sql, params = cursor.queries[-1]
+    assert 'FROM areas' not in sql and params == ('30',)
+
+
+def test_another_callers_hit_is_not_theirs():
+    cursor = FakeCursor(ROWS)
+    _check(cursor, 'map_coordinates', {'map_run_fk': 7})
+    assert _check(cursor, 'map_coordinates', {'map_run_fk': 7},
+                  user='stranger') == (403, 'FORBIDDEN')
+    assert len(cursor.queries) == 2
+
+
+def test_a_foreign_parent_is_never_remembered():
+    cursor = FakeCursor(ROWS)
+    for _ in range(2):
+        assert _check(cursor, 'tasks', {'area_fk': 21}) == (403, 'FORBIDDEN')
+    assert len(cursor.queries) == 2
+
+
+def test_an_absent_parent_is_never_remembered():
+    """Absent falls through to the FK (409) — and is asked again next time."""
+    cursor = FakeCursor(ROWS)
+    for _ in range(2):
+        assert _check(cursor, 'tasks', {'area_fk': 999}) is None
+    assert len(cursor.queries) == 2
+
+
+def test_a_table_without_a_foreign_key_always_asks():
+    """`priority_card_order` must learn that a parent is GONE; a cached
+    "yours" would outlive the row it describes."""
+    cursor = FakeCursor(ROWS)
+    for _ in range(2):
+        assert _check(cursor, 'priority_card_order',
+                      {'domain_id': 5, 'task_id': 1}) is None
+    cursor.rows['domains'] = {}
+    assert _check(cursor, 'priority_card_order',
+                  {'domain_id': 5, 'task_id': 1}) == (403, 'FORBIDDEN')
+    assert len(cursor.queries) == 3
+
+
+def test_entries_expire(monkeypatch):
+    cursor = FakeCursor(ROWS)
+    clock = [1000.0]
+    monkeypatch.setattr(ownership_cache.time, 'monotonic', lambda: clock[0])
+    _check(cursor, 'map_coordinates', {'map_run_fk': 7})
+    clock[0] += ownership_cache.OWNERSHIP_CACHE_TTL_SECONDS + 1
+    _check(cursor, 'map_coordinates', {'map_run_fk': 7})
+    assert len(cursor.queries) == 2
+
+
+def test_a_ttl_of_zero_turns_it_off(monkeypatch):
+    monkeypatch.setattr(ownership_cache, 'OWNERSHIP_CACHE_TTL_SECONDS', 0)
+    cursor = FakeCursor(ROWS)
+    _check(cursor, 'map_coordinates', {'map_run_fk': 7})
+    _check(cursor, 'map_coordinates', {'map_run_fk': 7})
+    assert len(cursor.queries) == 2
+
+
+def test_the_least_recently_used_entry_goes_first(monkeypatch):
+    monkeypatch.setattr(ownership_cache, 'OWNERSHIP_CACHE_MAX_ENTRIES', 2)
+    for row_id in ('1', '2'):
+        ownership_cache.remember('areas', row_id, 'victim', 'victim')
+    assert ownership_cache.owned('areas', '1', 'victim')      # 2 is now oldest
+    ownership_cache.remember('areas', '3', 'victim', 'victim')
+    assert ownership_cache.owned('areas', '1', 'victim')
+    assert not ownership_cache.owned('areas', '2', 'victim')
+
+
+def test_a_delete_forgets_the_table():
+    from rest_delete import rest_delete
+
+    ownership_cache.remember('map_runs', '7', 'victim', 'victim')
+    ownership_cache.remember('areas', '20', 'victim', 'victim')
+    response = rest_delete('DELETE', FakeConn(), 'darwin_dev', 'map_runs',
+                           [{'id': 7}], 'victim')
+    assert response['statusCode'] == 200
+    assert not ownership_cache.owned('map_runs', '7', 'victim')
+    assert ownership_cache.owned('areas', '20', 'victim')
@@ -0,0 +1,155 @@
+"""Keyset pagination on GET /{database}/{table} — no database.
+
+`?limit=N` returns at most N rows; when more remain, `X-Next-Cursor` carries an
+opaque token and `&next=<token>` resumes with a `(sort_col, id) > (...)` seek
+rather than an OFFSET. The properties pinned here are the ones a fake can
+prove: the SQL shape, that scoping rides on EVERY page, and that a token is
+only honoured for the sort it was cut under.
+"""
+import json
+
+import pytest
+
+from conftest import FakeConn
+from rest_get_table import PAGE_CURSOR_HEADER, rest_get_table
+
+pytestmark = pytest.mark.unit
+
+USER = 'user-1'
+
+INFO_ROWS = [
+    ('tasks', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('tasks', 'priority', 'tinyint', 'NO', '', ''),
+    ('tasks', 'done_ts', 'datetime', 'YES', '', ''),
+    ('tasks', 'creator_fk', 'varchar(64)', 'NO', 'MUL', ''),
+    ('map_coordinates', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('map_coordinates', 'map_run_fk', 'int', 'NO', 'MUL', ''),
+    ('map_coordinates', 'seq', 'int', 'NO', '', ''),
+    ('requirement_sessions', 'requirement_fk', 'int', 'NO', 'PRI', ''),
+    ('requirement_sessions', 'session_fk', 'int', 'NO', 'PRI', ''),
+]
+
+
+class PageConn(FakeConn):
+    def __init__(self, page_rows):
+        super().__init__(info_rows=INFO_ROWS)
+        self.page_rows = page_rows
+
+    def answer(self, sql, args):
+        return self.page_rows
+
+
+def _rows(ids, extra=()):
+    """Rows as the paged SELECT returns them: JSON_OBJECT, then the sort keys."""
+    return [(json.dumps({'id': i}),) + tuple(extra) + (i,) for i in ids]
+
+
+def _get(conn, table='tasks', **qsp):
+    return rest_get_table('GET', conn, 'darwin_dev', table,
+                          {'queryStringParameters': qsp or None}, USER)
+
+
+def test_a_first_page_reads_limit_plus_one_in_id_order_and_scoped():
+    conn = PageConn(_rows([1, 2, 3]))
+    response = _get(conn, limit='2')
+
+    sql, params = conn.executed[0]
+    assert 'ORDER BY id asc' in sql
+    assert sql.endswith('LIMIT 3')
+    assert 'creator_fk = %s' in sql and params == (USER,)
+    assert 'GROUP_CONCAT' not in sql
+    assert [row['id'] for row in json.loads(response['body'])] == [1, 2]
+    assert PAGE_CURSOR_HEADER in response['headers']
+    assert PAGE_CURSOR_HEADER in response['headers']['Access-Control-Expose-Headers']
+
+
+def test_the_last_page_carries_no_cursor():
+    conn = PageConn(_rows([5]))
+    response = _get(conn, limit='2')
+    assert response['statusCode'] == 200
+    assert PAGE_CURSOR_HEADER not in response['headers']
+
+
+def test_the_next_page_seeks_past_the_token_and_is_still_scoped():
+    token = _get(PageConn(_rows([1, 2, 3])), limit='2')['headers'][PAGE_CURSOR_HEADER]
+    conn = PageConn(_rows([3]))
+
+    _get(conn, limit='2', next=token)
+
+    sql, params = conn.executed[0]
+    assert 'creator_fk = %s AND (id) > (%s)' in sql
+    assert params == (USER, 2)
+    assert 'OFFSET' not in sql
+
+
+def test_a_sort_column_is_encoded_with_the_id_tiebreak():
+    page = _rows([7, 8, 9], extra=(4,))
+    token = _get(PageConn(page), limit='2', sort='priority:desc')['headers'][
+        PAGE_CURSOR_HEADER]
+    conn = PageConn(page)
+
+    _get(conn, limit='2', sort='priority:desc', next=token)
+
+    sql, params = conn.executed[0]
+    assert 'ORDER BY priority desc, id desc' in sql
+    assert '(priority, id) < (%s, %s)' in sql
+    assert params == (USER, 4, 8)
+
+
+def test_a_nullable_sort_key_expands_instead_of_dropping_null_rows():
+    page = [(json.dumps({'id': 1}), None, 1), (json.dumps({'id': 2}), None, 2),
+            (json.dumps({'id': 3}), None, 3)]
+    token = _get(PageConn(page), limit='2', sort='done_ts:asc')['headers'][
+        PAGE_CURSOR_HEADER]
+    conn = PageConn(page)
+
+    _get(conn, limit='2', sort='done_ts:asc', next=token)
+
+    sql, params = conn.executed[0]
+    assert '((done_ts IS NOT NULL) OR (done_ts IS NULL AND id > %s))' in sql
+    assert params == (USER, 2)
+
+
+def test_junction_scoping_applies_on_every_page():
+    token = _get(PageConn(_rows([1, 2])), table='map_coordinates',
+                 limit='1')['headers'][PAGE_CURSOR_HEADER]
+    conn = PageConn(_rows([2]))
+
+    _get(conn, table='map_coordinates', limit='1', next=token)
+
+    sql, params = conn.executed[0]
+    assert 'map_run_fk IN (SELECT id FROM map_runs WHERE creator_fk = %s)' in sql
+    assert params == (USER, 1)
+
+
+def test_a_token_cut_for_another_sort_is_refused():
+    token = _get(PageConn(_rows([1, 2, 3])), limit='2')['headers'][PAGE_CURSOR_HEADER]
+    conn = PageConn(_rows([3]))
+    response = _get(conn, limit='2', sort='priority:asc', next=token)
+    assert response['statusCode'] == 400
+    assert conn.executed == []
+
+
+@pytest.mark.parametrize('qsp', [
+    {'limit': '0'}, {'limit': '-1'}, {'limit': 'ten'}, {'limit': '5001'},
+    {'next': 'abc'},
+    {'limit': '2', 'next': '!!not-base64!!'},
+    {'limit': '2', 'fields': 'count(*),priority'},
+], ids=['zero', 'negative', 'word', 'too-big', 'next-without-limit',
+        'garbage-token', 'count'])
+def test_malformed_pagination_is_a_400_without_a_query(qsp):
+    conn = PageConn(_rows([1]))
+    response = _get(conn, **qsp)
+    assert response['statusCode'] == 400
+    assert conn.executed == []
+
+
+def test_a_table_without_an_id_cannot_be_paged():
+    conn = PageConn([])
+    response = _get(conn, table='requirement_sessions', limit='10')
+    assert response['statusCode'] == 400
+
+
+def test_an_empty_page_is_a_404_like_any_empty_read():
+    response = _get(PageConn([]), limit='10')
+    assert response['statusCode'] == 404
@@ -0,0 +1,145 @@
+"""`DELETE /{database}/_purge` (`rest_purge.py`) — chunked, resumable,
+deadline-aware pruning, no database: statements asserted as built."""
+import datetime
+import json
+
+import pytest
+
+import rest_purge
+import timing
+from conftest import FakeConn
+from rest_purge import rest_purge as purge
+
+pytestmark = pytest.mark.unit
+
+USER = 'sub-alice'
+CUTOFF = datetime.datetime(2026, 9, 17, 8, 0, 0)
+
+INFO_ROWS = [
+    ('agent_telemetry_rows', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('agent_telemetry_rows', 'role', 'varchar', 'NO', '', ''),
+    ('agent_telemetry_rows', 'create_ts', 'datetime', 'NO', '', ''),
+    ('agent_telemetry_rows', 'creator_fk', 'varchar', 'NO', 'MUL', ''),
+    ('map_coordinates', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('map_coordinates', 'map_run_fk', 'int', 'NO', 'MUL', ''),
+]
+
+
+class Conn(FakeConn):
+    def __init__(self, deletes=(), ceiling=900):
+        super().__init__(info_rows=INFO_ROWS)
+        self.deletes = list(deletes)
+        self.ceiling = ceiling
+
+    def answer(self, sql, args):
+        if sql.startswith('SELECT NOW()'):
+            return [(CUTOFF, self.ceiling)]
+        return self.deletes.pop(0) if self.deletes else 0
+
+
+class Context:
+    def __init__(self, remaining):
+        self.remaining = remaining
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining
+
+
+@pytest.fixture(autouse=True)
+def no_deadline():
+    timing.start_invocation()
+    yield
+    timing.start_invocation()
+
+
+def _purge(conn, qsp, user=USER, method='DELETE'):
+    response = purge(method, conn, 'darwin_dev', {'queryStringParameters': qsp}, user)
+    return response, json.loads(response['body'])
+
+
+class TestChunks:
+
+    def test_age_purge_runs_to_the_end(self):
+        conn = Conn(deletes=[2, 2, 1])
+        response, body = _purge(conn, {'table': 'agent_telemetry_rows',
+                                       'older_than_days': '30', 'limit': '2'})
+        assert response['statusCode'] == 200
+        assert body['done'] is True
+        assert [chunk['deleted'] for chunk in body['chunks']] == [2, 2, 1]
+        assert body['deleted'] == body['deleted_total'] == 5
+        assert 'X-Next-Cursor' not in response['headers']
+
+        (resolve, resolve_args), (sql, args) = conn.executed[:2]
+        assert resolve.startswith('SELECT NOW() - INTERVAL %s DAY, MAX(id)')
+        assert resolve_args == (30,)
+        assert sql == ('DELETE FROM agent_telemetry_rows WHERE create_ts < %s '
+                       'AND creator_fk = %s AND id <= %s ORDER BY id LIMIT 2')
+        assert args == (str(CUTOFF), USER, 900)
+
+    def test_filters_use_the_get_grammar_and_junction_scope(self):
+        conn = Conn(deletes=[0])
+        _purge(conn, {'table': 'map_coordinates', 'map_run_fk': '(7,8)'})
+        sql, args = conn.executed[1]
+        assert sql == ('DELETE FROM map_coordinates WHERE map_run_fk in (%s, %s) '
+                       'AND map_run_fk IN (SELECT id FROM map_runs WHERE creator_fk = %s) '
+                       'AND id <= %s ORDER BY id LIMIT 1000')
+        assert args == ('7', '8', USER, 900)
+
+    def test_an_empty_table_deletes_nothing(self):
+        conn = Conn(ceiling=None)
+        _, body = _purge(conn, {'table': 'map_coordinates', 'map_run_fk': '7'})
+        assert body['done'] is True and body['chunks'] == []
+
+
+class TestDeadline:
+
+    def test_stops_before_the_deadline_and_resumes_from_the_token(self):
+        timing.start_invocation(Context(remaining=rest_purge.PURGE_DEADLINE_RESERVE_MS - 1))
+        conn = Conn()
+        qsp = {'table': 'agent_telemetry_rows', 'older_than_days': '30'}
+        response, body = _purge(conn, qsp)
+        assert body['done'] is False and body['chunks'] == []
+        token = response['headers']['X-Next-Cursor']
+
+        timing.start_invocation(Context(remaining=60000))
+        conn = Conn(deletes=[3], ceiling=99999)
+        response, body = _purge(conn, dict(qsp, next=token))
+        assert body['done'] is True and body['deleted_total'] == 3
+        (sql, args), = conn.executed          # nothing re-resolved
+        assert args == (str(CUTOFF), USER, 900)
+
+    def test_the_time_budget_applies_without_a_context(self, monkeypatch):
+        monkeypatch.setattr(rest_purge, 'PURGE_TIME_BUDGET_MS', 0)
+        response, body = _purge(Conn(deletes=[1000]),
+                                {'table': 'agent_telemetry_rows', 'role': 'lead'})
+        assert body['done'] is False and 'X-Next-Cursor' in response['headers']
+
+
+class TestRefusals:
+
+    @pytest.mark.parametrize('qsp, user, status', [
+        ({'table': 'tasks', 'done': '1'}, USER, 403),
+        ({'table': 'agent_telemetry_rows', 'role': 'x'}, None, 403),
+        ({'table': 'agent_telemetry_rows'}, USER, 400),
+        ({'table': 'agent_telemetry_rows', 'older_than_days': '-1'}, USER, 400),
+        ({'table': 'agent_telemetry_rows', 'role': 'x', 'limit': '0'}, USER, 400),
+        ({'table': 'agent_telemetry_rows', 'nope': 'x'}, USER, 400),
+        ({'table': 'agent_telemetry_rows', 'role': 'x', 'next': 'garbage'}, USER, 400),
+    ])
+    def test_nothing_runs(self, qsp, user, status):
+        conn = Conn(deletes=[1])
+        response, _ = _purge(conn, qsp, user=user)
+        assert response['statusCode'] == status
+        assert conn.executed == []
+
+    def test_a_token_is_bound_to_its_filters(self):
+        timing.start_invocation(Context(remaining=0))
+        response, _ = _purge(Conn(), {'table': 'agent_telemetry_rows', 'role': 'a'})
+        token = response['headers']['X-Next-Cursor']
+        response, _ = _purge(Conn(), {'table': 'agent_telemetry_rows', 'role': 'b',
+                                      'next': token})
+        assert response['statusCode'] == 400
+
+    def test_delete_only(self):
+        response, _ = _purge(Conn(), {'table': 'map_coordinates'}, method='POST')
+        assert response['statusCode'] == 400
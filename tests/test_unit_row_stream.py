@@ -0,0 +1,146 @@
+"""The `stream` GET engine emits the same bytes as the GROUP_CONCAT engine — no DB.
+
+The GROUP_CONCAT engine's body is `json.dumps(json.loads(<MySQL's text>))`. The
+fixtures below pair a row as pymysql's text protocol hands it to Python with
+the text `JSON_OBJECT` renders for the same row, and require the two engines to
+agree byte for byte — key order, timestamp precision, DECIMAL shape and all.
+"""
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from rest_get_table import rest_get_table
+from row_stream import encode_rows, json_value, mysql_key_order
+
+pytestmark = pytest.mark.unit
+
+COLUMNS = ['id', 'area_name', 'closed', 'create_ts', 'distance_mi', 'run_date',
+           'run_time', 'settings', 'creator_fk']
+TYPES = {'id': 'int', 'area_name': 'varchar(256)', 'closed': 'tinyint',
+         'create_ts': 'datetime', 'distance_mi': 'decimal(6,2)',
+         'run_date': 'date', 'run_time': 'time', 'settings': 'json',
+         'creator_fk': 'varchar(64)'}
+
+ROWS = [
+    (1, 'Lambda "api"', 0, datetime(2026, 1, 2, 3, 4, 5), Decimal('10.50'),
+     date(2026, 1, 2), timedelta(hours=1, minutes=2, seconds=3),
+     '{"a": "x", "b": [1, 2]}', 'user-1'),
+    (2, 'Café', 1, datetime(2026, 1, 2, 3, 4, 5, 120000), Decimal('7'),
+     None, timedelta(hours=-1), 'null', 'user-1'),
+]
+
+# What `JSON_OBJECT(...)` renders for ROWS, joined the way GROUP_CONCAT joins.
+# Keys shortest-first then bytewise; six fractional digits on every DATETIME and
+# TIME; a JSON column embedded rather than quoted. (MySQL stores JSON normalized,
+# so the column's own text — second-to-last in each row — is already key-sorted.)
+MYSQL_TEXT = (
+    '[{"id": 1, "closed": 0, "run_date": "2026-01-02", "run_time": "01:02:03.000000", '
+    '"settings": {"a": "x", "b": [1, 2]}, "area_name": "Lambda \\"api\\"", '
+    '"create_ts": "2026-01-02 03:04:05.000000", "creator_fk": "user-1", '
+    '"distance_mi": 10.50}, '
+    '{"id": 2, "closed": 1, "run_date": null, "run_time": "-01:00:00.000000", '
+    '"settings": null, "area_name": "Café", '
+    '"create_ts": "2026-01-02 03:04:05.120000", "creator_fk": "user-1", '
+    '"distance_mi": 7}]'
+)
+
+
+class BatchCursor:
+    def __init__(self, rows):
+        self._rows = list(rows)
+        self.fetches = 0
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        batch, self._rows = self._rows[:size], self._rows[size:]
+        return batch
+
+
+def test_the_two_engines_agree_byte_for_byte():
+    body, count = encode_rows(BatchCursor(ROWS), COLUMNS, TYPES)
+    assert count == 2
+    assert body == json.dumps(json.loads(MYSQL_TEXT))
+
+
+def test_keys_follow_mysql_json_order_not_column_order():
+    assert mysql_key_order(['creator_fk', 'id', 'ab', 'aa']) == [
+        'aa', 'ab', 'id', 'creator_fk']
+
+
+@pytest.mark.parametrize('value, expected', [
+    (Decimal('5'), 5),
+    (Decimal('10.0'), 10.0),
+    (Decimal('37.101000'), 37.101),
+    (b'\x01', 'base64:type16:AQ=='),
+    (timedelta(days=1, hours=2), '26:00:00.000000'),
+])
+def test_value_conversions(value, expected):
+    column_type = 'bit(1)' if isinstance(value, bytes) else ''
+    converted = json_value(value, column_type)
+    assert converted == expected
+    assert type(converted) is type(expected)
+
+
+def test_rows_are_fetched_in_batches_not_all_at_once():
+    cursor = BatchCursor([(i,) for i in range(2500)])
+    _, count = encode_rows(cursor, ['id'])
+    assert count == 2500
+    assert cursor.fetches == 4                   # 1000 + 1000 + 500 + the empty fetch
+
+
+class StreamConn:
+    """Answers the schema read and then one unbuffered SELECT."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.cursor_classes = []
+        self.statements = []
+
+    def cursor(self, cursor_class=None):
+        self.cursor_classes.append(cursor_class)
+        conn = self
+
+        class Cursor(BatchCursor):
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, args=None):
+                conn.statements.append((' '.join(sql.split()), args))
+                if 'information_schema' in sql:
+                    self._rows = [('areas', name, TYPES[name], 'YES', '', '')
+                                  for name in COLUMNS]
+                else:
+                    self._rows = list(conn.rows)
+
+            def fetchall(self):
+                return self._rows
+
+        return Cursor([])
+
+
+def test_rest_get_table_stream_engine_end_to_end():
+    import pymysql
+    conn = StreamConn(ROWS)
+    response = rest_get_table('GET', conn, 'darwin_dev', 'areas',
+                              {'queryStringParameters': {'sort': 'id:asc'}},
+                              'user-1', read_engine='stream')
+
+    assert response['statusCode'] == 200
+    assert response['body'] == json.dumps(json.loads(MYSQL_TEXT))
+    assert conn.cursor_classes[-1] is pymysql.cursors.SSCursor
+    sql, args = conn.statements[-1]
+    assert 'GROUP_CONCAT' not in sql and 'JSON_OBJECT' not in sql
+    assert sql.endswith('WHERE creator_fk = %s ORDER BY id asc')
+    assert args == ('user-1',)
+
+
+def test_stream_engine_empty_read_is_a_404():
+    response = rest_get_table('GET', StreamConn([]), 'darwin_dev', 'areas',
+                              {'queryStringParameters': None}, 'user-1',
+                              read_engine='stream')
+    assert response['statusCode'] == 404
@@ -0,0 +1,196 @@
+"""The per-container schema cache that replaced `DESC {table}` — no database.
+
+What matters is the statement count: a warm GET is exactly ONE statement, and
+a database's metadata costs one `information_schema` read however many of its
+tables are touched. Invalidation is the other half — 1054/1146 drop the entry,
+and nothing else does.
+"""
+import json
+from unittest.mock import patch
+
+import pymysql
+import pytest
+
+import schema_cache
+from conftest import FakeConn
+from rest_delete import rest_delete
+from rest_get_table import rest_get_table
+from schema_cache import invalidate_on_error, table_schema
+
+pytestmark = pytest.mark.unit
+
+
+# (TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, EXTRA)
+INFO_ROWS = [
+    ('areas', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('areas', 'area_name', 'varchar(256)', 'NO', '', ''),
+    ('areas', 'creator_fk', 'varchar(64)', 'NO', 'MUL', ''),
+    ('profiles', 'id', 'varchar(64)', 'NO', 'PRI', ''),
+    ('profiles', 'email', 'varchar(256)', 'YES', '', ''),
+]
+
+
+class RecordingConn(FakeConn):
+    """Records every statement, the schema cache's own reads included."""
+
+    def __init__(self, info_rows=INFO_ROWS):
+        super().__init__(info_rows=info_rows)
+
+    def lookup(self, sql, args):
+        return None
+
+    def answer(self, sql, args):
+        if 'information_schema.COLUMNS' in sql:
+            return self.info_rows
+        if sql.startswith('DELETE'):
+            return 1
+        return [('[{"id": 1}]',)]
+
+    @property
+    def statements(self):
+        return [sql for sql, _ in self.executed]
+
+    def metadata_reads(self):
+        return [s for s in self.statements if 'information_schema' in s]
+
+
+def _get(conn, table='areas'):
+    return rest_get_table('GET', conn, 'darwin_dev', table,
+                          {'queryStringParameters': None}, 'user-1')
+
+
+def test_the_schema_is_read_once_per_database_not_per_table():
+    conn = RecordingConn()
+    assert table_schema(conn, 'darwin_dev', 'areas').names == ['id', 'area_name',
+                                                               'creator_fk']
+    assert table_schema(conn, 'darwin_dev', 'profiles').names == ['id', 'email']
+    assert len(conn.metadata_reads()) == 1
+
+
+def test_column_attributes_come_through():
+    conn = RecordingConn()
+    areas = table_schema(conn, 'darwin_dev', 'areas')
+    profiles = table_schema(conn, 'darwin_dev', 'profiles')
+    assert areas.id_is_auto_increment
+    assert not profiles.id_is_auto_increment
+    assert areas.by_name['id'].key == 'PRI'
+    assert profiles.by_name['email'].nullable
+    assert not areas.by_name['area_name'].nullable
+
+
+def test_a_warm_get_runs_exactly_one_statement():
+    conn = RecordingConn()
+    assert _get(conn)['statusCode'] == 200        # cold: metadata + SELECT
+    conn.executed.clear()
+
+    response = _get(conn)
+
+    assert response['statusCode'] == 200
+    assert len(conn.statements) == 1
+    assert conn.statements[0].startswith('SELECT CONCAT')
+
+
+def test_delete_key_check_reads_the_cache_too():
+    conn = RecordingConn()
+    _get(conn)
+    conn.executed.clear()
+
+    response = rest_delete('DELETE', conn, 'darwin_dev', 'areas', {'id': 5}, 'user-1')
+
+    assert response['statusCode'] == 200
+    assert len(conn.statements) == 1
+    assert conn.statements[0].startswith('DELETE')
+
+
+def test_an_unknown_table_is_a_1146_like_desc_was():
+    conn = RecordingConn()
+    with pytest.raises(pymysql.ProgrammingError) as info:
+        table_schema(conn, 'darwin_dev', 'nonexistent_table')
+    assert info.value.args[0] == 1146
+    assert _get(conn, 'nonexistent_table')['statusCode'] == 500
+
+
+def test_a_table_missing_from_a_cached_read_earns_one_reload():
+    """It may have been created since the cache was filled."""
+    conn = RecordingConn()
+    table_schema(conn, 'darwin_dev', 'areas')
+    conn.info_rows = INFO_ROWS + [('new_table', 'id', 'int', 'NO', 'PRI', '')]
+
+    assert table_schema(conn, 'darwin_dev', 'new_table').names == ['id']
+    assert len(conn.metadata_reads()) == 2
+
+
+def test_misses_reload_at_most_once_per_interval():
+    conn = RecordingConn()
+    table_schema(conn, 'darwin_dev', 'areas')
+    for _ in range(5):
+        with pytest.raises(pymysql.ProgrammingError):
+            table_schema(conn, 'darwin_dev', 'nonexistent_table')
+    assert len(conn.metadata_reads()) == 2
+
+    with patch('schema_cache.SCHEMA_MISS_RELOAD_SECONDS', -1):
+        with pytest.raises(pymysql.ProgrammingError):
+            table_schema(conn, 'darwin_dev', 'nonexistent_table')
+    assert len(conn.metadata_reads()) == 3
+
+
+def test_a_delete_on_an_unknown_table_keeps_the_cache():
+    conn = RecordingConn()
+    _get(conn)
+    for _ in range(3):
+        response = rest_delete('DELETE', conn, 'darwin_dev', 'nonexistent_table',
+                               {'id': 5}, 'user-1')
+        assert response['statusCode'] == 500
+    assert 'darwin_dev' in schema_cache._CACHE
+    assert len(conn.metadata_reads()) == 2
+
+
+@pytest.mark.parametrize('errno', [1054, 1146])
+def test_a_bulk_delete_stale_schema_errno_invalidates(errno):
+    conn = RecordingConn()
+    _get(conn)
+    conn.error = pymysql.OperationalError(errno, 'stale')
+    response = rest_delete('DELETE', conn, 'darwin_dev', 'areas',
+                           [{'id': 5}, {'id': 6}], 'user-1')
+    assert response['statusCode'] == 500
+    assert 'darwin_dev' not in schema_cache._CACHE
+
+
+def test_the_ttl_expires_an_entry():
+    conn = RecordingConn()
+    table_schema(conn, 'darwin_dev', 'areas')
+    with patch('schema_cache.SCHEMA_CACHE_TTL_SECONDS', -1):
+        table_schema(conn, 'darwin_dev', 'areas')
+    assert len(conn.metadata_reads()) == 2
+
+
+@pytest.mark.parametrize('errno', [1054, 1146])
+def test_a_stale_schema_errno_invalidates(errno):
+    conn = RecordingConn()
+    _get(conn)
+    conn.error = pymysql.OperationalError(errno, 'stale')
+    assert _get(conn)['statusCode'] == 500
+    conn.error = None
+    conn.executed.clear()
+
+    _get(conn)
+
+    assert len(conn.metadata_reads()) == 1
+
+
+@pytest.mark.parametrize('exc', [pymysql.OperationalError(2013, 'Lost connection'),
+                                 pymysql.ProgrammingError('Cursor closed'),
+                                 pymysql.Error()])
+def test_other_errors_leave_the_cache_alone(exc):
+    conn = RecordingConn()
+    table_schema(conn, 'darwin_dev', 'areas')
+    assert invalidate_on_error('darwin_dev', exc) is False
+    assert 'darwin_dev' in schema_cache._CACHE
+
+
+def test_a_get_filter_is_still_validated_against_the_cached_columns():
+    conn = RecordingConn()
+    response = rest_get_table('GET', conn, 'darwin_dev', 'areas',
+                              {'queryStringParameters': {'nope': '1'}}, 'user-1')
+    assert response['statusCode'] == 400
+    assert json.loads(response['body']) == 'BAD REQUEST'
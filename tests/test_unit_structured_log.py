@@ -0,0 +1,137 @@
+"""Structured logging — levels, per-route sampling, lazy SQL — no database."""
+import ast
+import json
+import os
+
+import pytest
+
+import structured_log
+from structured_log import Logger, log_sql, sql_shape
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def logger(monkeypatch):
+    fresh = Logger()
+    monkeypatch.setattr(structured_log, 'log', fresh)
+    return fresh
+
+
+def _lines(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+class TestLevels:
+
+    def test_lines_are_json_with_route(self, logger, capsys):
+        logger.begin_invocation('GET /darwin/tasks')
+        logger.info('hello %s', 'world', status=200)
+        assert _lines(capsys) == [{'level': 'INFO', 'route': 'GET /darwin/tasks',
+                                   'msg': 'hello world', 'status': 200}]
+
+    def test_debug_suppressed_at_info(self, logger, capsys):
+        logger.begin_invocation('GET /darwin/tasks')
+        logger.debug('hidden')
+        assert capsys.readouterr().out == ''
+
+    def test_disabled_level_does_not_format(self, logger):
+        class Exploding:
+            def __str__(self):
+                raise AssertionError('formatted')
+        logger.begin_invocation('GET /darwin/tasks')
+        logger.debug('value %s', Exploding())
+
+    def test_dump_never_logs_content(self, logger, capsys, monkeypatch):
+        monkeypatch.setattr(logger, 'level', structured_log.LEVELS['DEBUG'])
+        logger.dump([{'secret': 'x'}] * 3, 'body')
+        line, = _lines(capsys)
+        assert line['type'] == 'list' and line['size'] == 3
+        assert 'secret' not in json.dumps(line)
+
+
+class TestSampling:
+
+    def test_sampled_route_logs_debug(self, logger, monkeypatch):
+        monkeypatch.setattr(structured_log, 'LOG_SAMPLE_ROUTES',
+                            {'POST /darwin/tasks': 1.0})
+        logger.begin_invocation('POST /darwin/tasks')
+        assert logger.enabled('DEBUG')
+        logger.begin_invocation('GET /darwin/tasks')
+        assert not logger.enabled('DEBUG')
+
+    def test_route_rate_overrides_global(self, logger, monkeypatch):
+        monkeypatch.setattr(structured_log, 'LOG_SAMPLE_RATE', 1.0)
+        monkeypatch.setattr(structured_log, 'LOG_SAMPLE_ROUTES',
+                            {'POST /darwin/map_coordinates': 0.0})
+        logger.begin_invocation('POST /darwin/map_coordinates')
+        assert not logger.enabled('DEBUG')
+
+    def test_route_rates_parsed(self):
+        assert structured_log._parse_route_rates(
+            'POST /darwin/map_coordinates=0, GET /darwin/tasks=0.1') == {
+                'POST /darwin/map_coordinates': 0.0, 'GET /darwin/tasks': 0.1}
+        assert structured_log._parse_route_rates(None) == {}
+
+
+class TestLogSql:
+
+    def test_bulk_insert_summarized(self):
+        values = ', '.join(['(%s, %s, %s)'] * 5000)
+        assert (sql_shape(f"INSERT INTO map_coordinates (a, b, c) VALUES {values}")
+                == 'INSERT INTO map_coordinates (a, b, c) VALUES (%s, %s, %s) x5000')
+
+    def test_bulk_put_case_and_in_list_summarized(self):
+        sql = ("UPDATE areas SET sort_order = CASE id WHEN %s THEN %s WHEN %s THEN %s "
+               "WHEN %s THEN %s ELSE sort_order END WHERE id in (%s, %s, %s);")
+        assert sql_shape(sql) == ("UPDATE areas SET sort_order = CASE id WHEN %s THEN %s x3 "
+                                  "ELSE sort_order END WHERE id in (%s x3);")
+
+    def test_short_statement_untouched(self):
+        assert sql_shape("SELECT a\n   FROM t WHERE id = %s AND b IN (%s, %s)") == \
+            "SELECT a FROM t WHERE id = %s AND b IN (%s, %s)"
+
+    def test_params_counted_not_logged(self, logger, capsys, monkeypatch):
+        monkeypatch.setattr(logger, 'level', structured_log.LEVELS['DEBUG'])
+        log_sql('POST', 'INSERT INTO t (a) VALUES (%s)', ['user-sub-123'])
+        line, = _lines(capsys)
+        assert line['params'] == 1
+        assert 'user-sub-123' not in json.dumps(line)
+
+    def test_params_logged_when_enabled(self, logger, capsys, monkeypatch):
+        monkeypatch.setattr(logger, 'level', structured_log.LEVELS['DEBUG'])
+        monkeypatch.setattr(structured_log, 'LOG_SQL_PARAMS', True)
+        log_sql('POST', 'INSERT INTO t (a) VALUES (%s)', ['x'], rows=1)
+        line, = _lines(capsys)
+        assert line['params'] == ['x'] and line['rows'] == 1
+
+    def test_nothing_built_below_debug(self, logger, monkeypatch):
+        logger.begin_invocation('POST /darwin/tasks')
+        monkeypatch.setattr(structured_log, 'sql_shape',
+                            lambda sql: pytest.fail('shape built at INFO'))
+        log_sql('POST', 'INSERT INTO t (a) VALUES (%s)', ['x'])
+
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+# The two modules whose print IS the log line.
+EMITTERS = {'structured_log.py', 'timing.py'}
+
+
+class TestNoBarePrints:
+    """Every line a request writes goes through `log`, leveled and sampled.
+    Module-init code (handler's cold-start banner) and the emitters may print."""
+
+    @pytest.mark.parametrize('module', sorted(
+        name for name in os.listdir(ROOT)
+        if name.endswith('.py') and name not in EMITTERS))
+    def test_no_print_inside_a_function(self, module):
+        with open(os.path.join(ROOT, module)) as source:
+            tree = ast.parse(source.read())
+        prints = [call.lineno
+                  for function in ast.walk(tree)
+                  if isinstance(function, (ast.FunctionDef, ast.AsyncFunctionDef))
+                  for call in ast.walk(function)
+                  if isinstance(call, ast.Call) and isinstance(call.func, ast.Name)
+                  and call.func.id == 'print']
+        assert prints == [], f"{module}: print() at line(s) {sorted(set(prints))}"
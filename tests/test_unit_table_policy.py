@@ -0,0 +1,154 @@
+"""auth_utils.TablePolicy — the registries, compiled once per table at import.
+
+The registries stay the source of truth; these tests hold the compiled shape
+to them, table by table, so a policy can never answer differently from the
+ladder every verb used to spell out for itself.
+"""
+import pymysql
+import pytest
+
+import auth_utils
+from auth_utils import (CREATOR_FK_TABLES, CREATOR_TABLE_REFERENCES, ENUM_COLUMNS,
+                        JUNCTION_OWNERSHIP, PROFILE_TABLE, TablePolicy,
+                        table_policy)
+from conftest import FakeConn
+
+pytestmark = pytest.mark.unit
+
+USER = 'sub-alice'
+
+REGISTERED = sorted(CREATOR_FK_TABLES | {PROFILE_TABLE} | set(JUNCTION_OWNERSHIP)
+                    | set(CREATOR_TABLE_REFERENCES) | set(ENUM_COLUMNS))
+
+
+def test_every_registered_table_is_compiled_once():
+    assert sorted(auth_utils._POLICIES) == REGISTERED
+    for table in REGISTERED:
+        assert table_policy(table) is table_policy(table)
+
+
+@pytest.mark.parametrize('table', sorted(CREATOR_FK_TABLES))
+def test_a_creator_fk_table(table):
+    policy = table_policy(table)
+    assert policy.kind == 'creator_fk' and policy.creator_fk
+    assert policy.scope(USER) == ('creator_fk = %s', [USER])
+    assert policy.owner_column == 'creator_fk'
+    assert policy.protected == {'id', 'creator_fk'}
+    assert policy.references == tuple(CREATOR_TABLE_REFERENCES.get(table, ()))
+    assert policy.scope_column is None and policy.fk_enforced
+
+
+def test_the_profile_table():
+    policy = table_policy(PROFILE_TABLE)
+    assert policy.kind == 'profile' and not policy.creator_fk
+    assert policy.scope(USER) == ('id = %s', [USER])
+    assert policy.owner_column == 'id' and policy.protected == {'id'}
+
+
+@pytest.mark.parametrize('table', sorted(JUNCTION_OWNERSHIP))
+def test_a_junction_table(table):
+    entry = JUNCTION_OWNERSHIP[table]
+    column, parent = entry['scope']
+    policy = table_policy(table)
+    assert policy.kind == 'junction' and policy.owner_column is None
+    assert policy.strategy == entry.get('strategy', 'in')
+    # Without a connection every strategy spells the subquery.
+    assert policy.scope(USER) == (
+        f"{column} IN (SELECT id FROM {parent} WHERE creator_fk = %s)", [USER])
+    assert policy.scope_column == column
+    assert policy.references == (entry['scope'],) + tuple(entry.get('verify', ()))
+    assert policy.fk_enforced == entry.get('fk_enforced', True)
+
+
+@pytest.mark.parametrize('table', REGISTERED)
+def test_the_column_sets_are_the_registries(table):
+    policy = table_policy(table)
+    assert policy.enum_columns == tuple(sorted(ENUM_COLUMNS.get(table, ())))
+    assert policy.requires_identity == (policy.scope_sql is not None)
+
+
+def test_an_unregistered_table_scopes_nothing():
+    policy = table_policy('not_a_table')
+    assert policy.kind is None and policy.scope(USER) is None
+    assert not policy.requires_identity and not policy.creator_fk
+    assert policy.references == () and policy.enum_columns == ()
+    assert policy.protected == {'id'}
+    assert 'not_a_table' not in auth_utils._POLICIES
+
+
+@pytest.mark.parametrize('table', ['tasks', PROFILE_TABLE, 'pipeline_step_deps'])
+def test_no_identity_no_scope(table):
+    assert table_policy(table).scope(None) is None
+
+
+# ---------------------------------------------------------------------------
+# Scope strategies — the same rows, spelled for a better plan
+# ---------------------------------------------------------------------------
+
+class Conn(FakeConn):
+    """Answers the 'ids' prefetch from a list, or fails it."""
+
+    def __init__(self, ids, fail=False):
+        super().__init__(error=pymysql.err.OperationalError(2013, 'Lost connection')
+                         if fail else None)
+        self.ids = ids
+
+    def answer(self, sql, args):
+        return [(i,) for i in self.ids]
+
+
+@pytest.fixture
+def ids_policy(monkeypatch):
+    """map_coordinates compiled as `junction_scope_strategies=map_coordinates=ids`
+    would compile it; no registry entry defaults to 'ids'."""
+    monkeypatch.setitem(auth_utils.JUNCTION_SCOPE_STRATEGIES, 'map_coordinates', 'ids')
+    return TablePolicy('map_coordinates')
+
+
+def test_no_table_reads_first_by_default():
+    conn = Conn([7, 9])
+    for table in JUNCTION_OWNERSHIP:
+        table_policy(table).scope(USER, conn)
+    assert conn.executed == []
+
+
+def test_the_ids_strategy_sends_the_parent_ids(ids_policy):
+    conn = Conn([7, 9])
+    assert ids_policy.scope(USER, conn) == (
+        'map_run_fk IN (%s, %s)', [7, 9])
+    (sql, args), = conn.executed
+    assert sql.startswith('SELECT id FROM map_runs WHERE creator_fk = %s LIMIT')
+    assert args == (USER,)
+
+
+def test_no_parents_is_false_not_an_empty_list(ids_policy):
+    assert ids_policy.scope(USER, Conn([])) == ('FALSE', [])
+
+
+@pytest.mark.parametrize('conn', [Conn([1, 2, 3]), Conn([], fail=True)])
+def test_too_many_parents_or_a_failed_read_spells_the_subquery(monkeypatch, ids_policy,
+                                                              conn):
+    monkeypatch.setattr(auth_utils, 'SCOPE_ID_LIST_MAX', 2)
+    assert ids_policy.scope(USER, conn) == (
+        'map_run_fk IN (SELECT id FROM map_runs WHERE creator_fk = %s)', [USER])
+
+
+def test_an_in_table_never_reads_first():
+    conn = Conn([1])
+    scope = table_policy('pipeline_step_deps').scope(USER, conn)
+    assert scope[0].startswith('step_fk IN (SELECT') and conn.executed == []
+
+
+def test_exists_is_correlated_on_the_scoped_table(monkeypatch):
+    monkeypatch.setitem(auth_utils.JUNCTION_SCOPE_STRATEGIES,
+                        'pipeline_step_requirements', 'exists')
+    assert TablePolicy('pipeline_step_requirements').scope(USER) == (
+        'EXISTS (SELECT 1 FROM pipeline_steps WHERE pipeline_steps.id = '
+        'pipeline_step_requirements.step_fk AND pipeline_steps.creator_fk = %s)',
+        [USER])
+
+
+def test_an_unknown_strategy_fails_the_compile(monkeypatch):
+    monkeypatch.setitem(auth_utils.JUNCTION_SCOPE_STRATEGIES, 'map_coordinates', 'join')
+    with pytest.raises(ValueError):
+        TablePolicy('map_coordinates')
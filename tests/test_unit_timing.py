@@ -0,0 +1,125 @@
+"""Per-phase timing — Server-Timing header and the EMF metrics line — no database."""
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import timing
+
+with patch.dict(os.environ, {'endpoint': 'localhost', 'username': 'test_user',
+                             'db_password': 'test_pass', 'db_name': 'darwin_dev'}):
+    import handler
+    from db_connection import LazyConnection, TimedCursor
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def fresh_invocation():
+    timing.start_invocation()
+    yield
+
+
+class TestRecorder:
+
+    def test_spans_of_one_phase_add_up(self):
+        with timing.span('sql'):
+            pass
+        first = timing.phases()['sql']
+        with timing.span('sql'):
+            pass
+        assert timing.phases()['sql'] >= first
+        assert set(timing.phases()) == {'sql', 'total'}
+
+    def test_span_recorded_when_the_block_raises(self):
+        with pytest.raises(ValueError):
+            with timing.span('guard'):
+                raise ValueError('boom')
+        assert 'guard' in timing.phases()
+
+    def test_start_invocation_forgets_the_last_one(self):
+        with timing.span('connect'):
+            pass
+        timing.count('rows', 3)
+        timing.start_invocation()
+        assert set(timing.phases()) == {'total'}
+        assert timing.finish_invocation({'statusCode': 204}, 'GET unrouted')['bytes'] == 0
+
+    def test_server_timing_format(self):
+        assert (timing.server_timing({'connect': 3.14159, 'total': 10})
+                == 'connect;dur=3.1, total;dur=10.0')
+
+    def test_finish_invocation_emits_emf(self, capsys):
+        with timing.span('sql'):
+            pass
+        timing.count('sql_statements')
+        timing.count('rows', 4)
+        response = {'statusCode': 200, 'headers': {}, 'body': '[1, 2, 3, 4]'}
+
+        timing.finish_invocation(response, 'GET /darwin_dev/tasks')
+
+        document = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+        directive = document['_aws']['CloudWatchMetrics'][0]
+        assert directive['Dimensions'] == [['Route']]
+        names = {metric['Name']: metric['Unit'] for metric in directive['Metrics']}
+        assert names['sql_ms'] == 'Milliseconds'
+        assert names['total_ms'] == 'Milliseconds'
+        assert names['bytes'] == 'Bytes'
+        assert document['Route'] == 'GET /darwin_dev/tasks'
+        assert document['status'] == 200
+        assert document['sql_statements'] == 1
+        assert document['rows'] == 4
+        assert document['bytes'] == len('[1, 2, 3, 4]')
+        assert response['headers']['Server-Timing'].startswith('sql;dur=')
+        assert response['headers']['Timing-Allow-Origin'] == '*'
+
+
+class TestTimedCursor:
+
+    def test_statements_counted_and_timed(self):
+        inner = MagicMock(name='cursor')
+        inner.__enter__.return_value = inner
+        inner.execute.return_value = 1
+        with TimedCursor(inner) as cursor:
+            assert cursor.execute('SELECT 1') == 1
+            cursor.execute('SELECT 2')
+            cursor.fetchall()
+        assert timing._COUNTERS['sql_statements'] == 2
+        assert 'sql' in timing.phases()
+        inner.fetchall.assert_called_once()
+
+    def test_lazy_connection_times_the_connect(self):
+        conn = LazyConnection('darwin_dev', lambda database: MagicMock())
+        conn.cursor()
+        assert 'connect' in timing.phases()
+
+
+class TestLambdaHandler:
+
+    def test_server_timing_on_every_response(self, monkeypatch):
+        conn = MagicMock(name='conn')
+        conn.cursor.return_value.__enter__.return_value.fetchall.return_value = [('areas',)]
+        monkeypatch.setattr(handler, 'get_connection', lambda database: conn)
+
+        response = handler.lambda_handler({'httpMethod': 'GET', 'path': '/darwin_dev',
+                                           'queryStringParameters': None, 'body': None}, {})
+
+        phases = dict(entry.split(';dur=')
+                      for entry in response['headers']['Server-Timing'].split(', '))
+        assert {'connect', 'sql', 'encode', 'total'} <= set(phases)
+        assert timing._COUNTERS['sql_statements'] == 1
+
+    @pytest.mark.parametrize('path, route', [
+        ('/darwin_dev/tasks', 'GET /darwin_dev/tasks'),
+        ('/darwin_dev', 'GET /darwin_dev/'),
+        ('/elsewhere/tasks', 'GET unrouted'),
+        ('/darwin_dev/x;y', 'GET unrouted'),
+    ])
+    def test_route_dimension_is_bounded(self, path, route):
+        assert handler._route({'httpMethod': 'GET', 'path': path}) == route
+
+    def test_answered_without_sql_still_timed(self):
+        response = handler.lambda_handler({'httpMethod': 'OPTIONS', 'path': '/darwin_dev/tasks',
+                                           'queryStringParameters': None, 'body': None}, {})
+        assert response['headers']['Server-Timing'].startswith('encode;dur=')
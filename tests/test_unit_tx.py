@@ -0,0 +1,172 @@
+"""`POST /{database}/_tx` — an ordered write graph in one transaction, later
+items naming the rows earlier ones created — no database.
+
+Items are dispatched back through `rest_api_from_table`, so `rest_post` and
+`rest_put` are patched in `handler`'s namespace, as in test_unit_batch.
+"""
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+with patch.dict(os.environ, {'endpoint': 'localhost', 'username': 'test_user',
+                             'db_password': 'test_pass', 'db_name': 'darwin_dev'}):
+    import handler
+
+from rest_api_utils import compose_rest_response
+from rest_tx import MAX_TX_ITEMS
+
+pytestmark = pytest.mark.unit
+
+USER = 'user-1'
+
+
+def _event(body, user=USER, method='POST'):
+    return {
+        'httpMethod': method,
+        'path': '/darwin_dev/_tx',
+        'queryStringParameters': None,
+        'body': json.dumps(body),
+        'requestContext': ({'authorizer': {'claims': {'sub': user}}}
+                           if user is not None else {}),
+    }
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = MagicMock(name='conn')
+    monkeypatch.setattr(handler, 'get_connection', lambda database: conn)
+    return conn
+
+
+def _run(body, **kwargs):
+    response = handler.lambda_handler(_event(body, **kwargs), {})
+    return response, json.loads(response['body'])
+
+
+class FakeWrites:
+    """rest_post answers the read-back `[{row}]` with ids from 100 up."""
+
+    def __init__(self, fail_table=None):
+        self.calls = []
+        self.next_id = 100
+        self.fail_table = fail_table
+
+    def post(self, method, c, database, table, body, user, **kwargs):
+        self.calls.append(('POST', table, body, user))
+        if table == self.fail_table:
+            return compose_rest_response(409, '', {'error': 'CONFLICT'})
+        self.next_id += 1
+        return compose_rest_response(200, [dict(body, id=self.next_id)], 'CREATED')
+
+    def put(self, method, c, database, table, body, user, **kwargs):
+        self.calls.append(('PUT', table, body, user))
+        return compose_rest_response(200, body, 'OK')
+
+
+def _patched(writes):
+    return (patch.object(handler, 'rest_post', side_effect=writes.post),
+            patch.object(handler, 'rest_put', side_effect=writes.put))
+
+
+GRAPH = [
+    {'method': 'POST', 'table': 'domains', 'body': {'domain_name': 'd'}},
+    {'method': 'POST', 'table': 'areas',
+     'body': {'area_name': 'a', 'domain_fk': '$ref:0'}},
+    {'method': 'POST', 'table': 'tasks',
+     'body': {'description': 't', 'area_fk': '$ref:1', 'note': '$ref:1.area_name'}},
+    {'method': 'PUT', 'table': 'domains',
+     'body': [{'id': '$ref:0', 'closed': 1}]},
+]
+
+
+class TestWriteGraph:
+
+    def test_refs_resolve_to_earlier_creates_in_one_transaction(self, conn):
+        writes = FakeWrites()
+        post, put = _patched(writes)
+        with post, put:
+            response, items = _run(GRAPH)
+
+        assert response['statusCode'] == 200
+        assert writes.calls == [
+            ('POST', 'domains', {'domain_name': 'd'}, USER),
+            ('POST', 'areas', {'area_name': 'a', 'domain_fk': 101}, USER),
+            ('POST', 'tasks', {'description': 't', 'area_fk': 102, 'note': 'a'}, USER),
+            ('PUT', 'domains', [{'id': 101, 'closed': 1}], USER),
+        ]
+        assert [item['body'][0]['id'] for item in items] == [101, 102, 103, 101]
+        conn.begin.assert_called_once()
+        conn.commit.assert_called_once()
+        conn.rollback.assert_not_called()
+
+    def test_a_failing_item_rolls_everything_back(self, conn):
+        writes = FakeWrites(fail_table='tasks')
+        post, put = _patched(writes)
+        with post, put:
+            response, body = _run(GRAPH)
+
+        assert response['statusCode'] == 409
+        assert body == {'error': 'ROLLED BACK', 'item': 2,
+                        'detail': {'error': 'CONFLICT'}}
+        assert len(writes.calls) == 3
+        conn.rollback.assert_called_once()
+        conn.commit.assert_not_called()
+
+    def test_a_create_without_an_id_cannot_be_referenced(self, conn):
+        def post(method, c, database, table, body, user, **kwargs):
+            return compose_rest_response(201, '', 'CREATED')
+
+        with patch.object(handler, 'rest_post', side_effect=post):
+            response, body = _run(GRAPH[:2])
+
+        assert response['statusCode'] == 400
+        assert body['item'] == 1 and 'item 0 created no id' in body['detail']
+        conn.rollback.assert_called_once()
+
+    def test_the_callers_identity_scopes_every_item(self, conn):
+        """No identity: the first user-scoped item is its own 403, and it ends
+        the transaction."""
+        response, body = _run(GRAPH, user=None)
+        assert response['statusCode'] == 403
+        assert body['item'] == 0
+        conn.commit.assert_not_called()
+
+
+class TestPlan:
+
+    @pytest.mark.parametrize('body, message', [
+        ([], 'non-empty list'),
+        ([{'method': 'GET', 'table': 'tasks', 'body': {}}], 'method must be'),
+        ([{'method': 'POST', 'table': '_batch', 'body': {'x': 1}}], 'no valid table'),
+        ([{'method': 'POST', 'table': 'tasks'}], 'no body'),
+        ([{'method': 'POST', 'table': 'tasks', 'body': {'area_fk': '$ref:0'}}],
+         'has not run yet'),
+        ([{'method': 'POST', 'table': 'tasks', 'body': [{'x': 1}]},
+          {'method': 'POST', 'table': 'tasks', 'body': {'area_fk': '$ref:0'}}],
+         'not a single-row POST'),
+        ([{'method': 'POST', 'table': 'tasks', 'body': {'x': 1}}] * (MAX_TX_ITEMS + 1),
+         'at most'),
+        ([{'method': 'POST', 'table': 'tasks', 'body': {'x': 1},
+           'headers': ['Idempotency-Key', 'k']}], 'headers must be an object'),
+        ([{'method': 'POST', 'table': 'tasks', 'body': {'x': 1}, 'headers': 'x'}],
+         'headers must be an object'),
+    ])
+    def test_malformed_graphs_never_start(self, conn, body, message):
+        response, text = _run(body)
+        assert response['statusCode'] == 400
+        assert message in text
+        conn.begin.assert_not_called()
+
+    def test_a_ref_inside_a_longer_string_is_data(self, conn):
+        writes = FakeWrites()
+        post, put = _patched(writes)
+        with post, put:
+            _run([{'method': 'POST', 'table': 'tasks',
+                   'body': {'description': 'see $ref:0'}}])
+        assert writes.calls[0][2] == {'description': 'see $ref:0'}
+
+    def test_get_is_refused(self, conn):
+        response = handler.lambda_handler(_event(GRAPH, method='GET'), {})
+        assert response['statusCode'] == 400
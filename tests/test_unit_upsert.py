@@ -0,0 +1,156 @@
+"""`POST ?on_conflict=update` — INSERT ... ON DUPLICATE KEY UPDATE that only
+ever updates the caller's own rows — no database."""
+import json
+
+import pytest
+
+from conftest import FakeConn
+from rest_post import rest_post, UPSERT_RESULT_HEADER
+
+pytestmark = pytest.mark.unit
+
+USER = 'sub-alice'
+
+# (TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, EXTRA)
+INFO_ROWS = [
+    ('instructions', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('instructions', 'name', 'varchar(128)', 'NO', 'UNI', ''),
+    ('instructions', 'body', 'text', 'YES', '', ''),
+    ('instructions', 'creator_fk', 'varchar(64)', 'NO', 'MUL', ''),
+    ('priority_card_order', 'id', 'int', 'NO', 'PRI', 'auto_increment'),
+    ('priority_card_order', 'domain_id', 'int', 'NO', 'MUL', ''),
+    ('priority_card_order', 'task_id', 'int', 'NO', 'UNI', ''),
+    ('priority_card_order', 'sort_order', 'int', 'NO', '', ''),
+]
+
+
+class Conn(FakeConn):
+    def __init__(self, affected=1, lastrowid=7, found=(7,)):
+        super().__init__(info_rows=INFO_ROWS, lastrowid=lastrowid)
+        self.affected = affected
+        self.found = found
+
+    def answer(self, sql, args):
+        if sql.startswith('INSERT'):
+            return self.affected
+        if sql.startswith('SELECT'):
+            return [(key, json.dumps({'id': key})) for key in self.found]
+        return 1
+
+
+def _upsert(conn, table, body, user=USER, **kwargs):
+    kwargs.setdefault('on_conflict', 'update')
+    response = rest_post('POST', conn, 'darwin_dev', table, body,
+                         authenticated_user=user, **kwargs)
+    text = response['body']
+    return response, json.loads(text)
+
+
+@pytest.fixture(autouse=True)
+def no_parent_lookups(monkeypatch):
+    # The guard's own SELECTs are covered elsewhere; here it always approves.
+    monkeypatch.setattr('rest_post.parent_reference_guard', lambda *a, **kw: None)
+
+
+class TestSingleRow:
+
+    def test_clause_updates_only_rows_the_caller_owns(self):
+        conn = Conn()
+        _upsert(conn, 'instructions', {'name': 'lint', 'body': 'x'})
+        sql, args = conn.sql('INSERT')[0]
+        assert ('ON DUPLICATE KEY UPDATE '
+                'id = IF(creator_fk = %s, LAST_INSERT_ID(id), id), '
+                'name = IF(creator_fk = %s, VALUES(name), name), '
+                'body = IF(creator_fk = %s, VALUES(body), body)') in sql
+        assert args == ('lint', 'x', USER, USER, USER, USER)
+
+    def test_creator_fk_is_forced_and_never_reassigned(self):
+        conn = Conn()
+        _upsert(conn, 'instructions', {'name': 'lint', 'CREATOR_FK': 'sub-mallory'})
+        sql, args = conn.sql('INSERT')[0]
+        assert 'creator_fk = IF' not in sql
+        assert 'sub-mallory' not in args
+
+    @pytest.mark.parametrize('affected, outcome, status', [
+        (1, 'inserted', 200), (2, 'updated', 200), (0, 'unchanged', 200)])
+    def test_outcome_header(self, affected, outcome, status):
+        response, body = _upsert(Conn(affected=affected), 'instructions',
+                                 {'name': 'lint'})
+        assert response['statusCode'] == status
+        assert response['headers'][UPSERT_RESULT_HEADER] == outcome
+        assert body == [{'id': 7}]
+
+    def test_read_back_is_scoped_to_the_caller(self):
+        conn = Conn(affected=0, found=())
+        response, body = _upsert(conn, 'instructions', {'name': 'theirs'})
+        sql, args = conn.sql('SELECT id')[0]
+        assert sql.endswith('WHERE id IN (%s) AND creator_fk = %s')
+        assert args == (7, USER)
+        assert response['statusCode'] == 200 and body == ''
+
+    def test_minimal(self):
+        response, body = _upsert(Conn(affected=1), 'instructions', {'name': 'lint'},
+                                 return_minimal=True)
+        assert response['statusCode'] == 201 and body == {'id': 7}
+
+    def test_allowlist(self):
+        conn = Conn()
+        _upsert(conn, 'instructions', {'name': 'lint', 'body': 'x'},
+                update_columns=['BODY'])
+        sql, _ = conn.sql('INSERT')[0]
+        assert 'body = IF' in sql and 'name = IF' not in sql
+
+    @pytest.mark.parametrize('columns', [['title'], ['creator_fk'], ['id']])
+    def test_allowlist_must_name_updatable_body_columns(self, columns):
+        conn = Conn()
+        response, _ = _upsert(conn, 'instructions', {'name': 'lint', 'body': 'x'},
+                              update_columns=columns)
+        assert response['statusCode'] == 400
+        assert conn.sql('INSERT') == []
+
+    def test_unknown_mode(self):
+        response, _ = _upsert(Conn(), 'instructions', {'name': 'lint'},
+                              on_conflict='ignore')
+        assert response['statusCode'] == 400
+
+    def test_junction_scope_column_is_assigned_last(self):
+        conn = Conn()
+        _upsert(conn, 'priority_card_order',
+                {'domain_id': 3, 'task_id': 9, 'sort_order': 1})
+        sql, _ = conn.sql('INSERT')[0]
+        assignments = sql.split('ON DUPLICATE KEY UPDATE ')[1]
+        assert assignments.index('task_id = IF') < assignments.index('domain_id = IF')
+        assert 'domain_id IN (SELECT id FROM domains WHERE creator_fk = %s)' in assignments
+
+
+class TestBulk:
+
+    ITEMS = [{'domain_id': 3, 'task_id': n, 'sort_order': n} for n in range(3)]
+
+    @pytest.mark.parametrize('affected, counts', [
+        (0, {'inserted': 0, 'updated': 0, 'unchanged': 3}),
+        (6, {'inserted': 0, 'updated': 3, 'unchanged': 0}),
+    ])
+    def test_counts_the_affected_total_proves(self, affected, counts):
+        response, body = _upsert(Conn(affected=affected), 'priority_card_order',
+                                 [dict(item) for item in self.ITEMS])
+        assert response['statusCode'] == 201
+        assert body == counts
+
+    def test_another_owners_row_is_not_reported_as_an_insert(self):
+        # 3 = 1 insert + 1 update (2) + another caller's conflicting row, left
+        # as it was by the IF(...). MySQL's info string would say
+        # `Records: 3  Duplicates: 1` — which reads as two inserts.
+        conn = Conn(affected=3)
+        _, body = _upsert(conn, 'priority_card_order',
+                          [dict(item) for item in self.ITEMS])
+        assert body == {'submitted': 3, 'affected': 3}
+
+    def test_rows_by_marker_are_scoped(self):
+        conn = Conn(affected=3, found=(0, 1, 2))
+        _, body = _upsert(conn, 'priority_card_order',
+                          [dict(item) for item in self.ITEMS], return_rows=True)
+        sql, args = conn.sql('SELECT task_id')[0]
+        assert 'AND domain_id IN (SELECT id FROM domains WHERE creator_fk = %s)' in sql
+        assert args[-1] == USER
+        assert len(body['rows']) == 3
@@ -0,0 +1,119 @@
+"""Per-invocation phase timing: a `Server-Timing` header and one EMF metrics line.
+
+A Lambda container serves one invocation at a time, so the recorder lives at
+module scope like the connection pool and the schema cache do, and
+`start_invocation` resets it. The CRUD modules mark their phases with
+
+    with timing.span('guard'):
+        ...
+
+and bump counters with `timing.count('rows', n)`; nothing is threaded through
+their signatures. Recording is a `perf_counter()` pair and a dict update per
+span — a few microseconds per invocation, cheap enough to leave on.
+
+Phases overlap: `sql` is every statement's execute() and so includes the
+`schema` and `guard` statements. Each phase sums every span of that name, so a
+`_batch` reports its items' time together.
+
+    connect   LazyConnection opening (a fresh connect or pool validation)
+    schema    information_schema read on a schema-cache miss
+    guard     parent_reference_guard's ownership SELECT
+    sql       cursor.execute() of every statement (buffered rows included)
+    decode    json.loads of a GROUP_CONCAT / JSON_OBJECT result
+    encode    json.dumps of the response body, or the stream engine's rows
+    compress  response compression
+
+`finish_invocation` adds `total`, stamps the `Server-Timing` header and prints
+one CloudWatch Embedded Metric Format document, which CloudWatch Logs turns
+into metrics dimensioned by route without a PutMetricData call.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+
+METRICS_NAMESPACE = os.environ.get('metrics_namespace', 'RestApi')
+
+COUNTER_UNITS = {'sql_statements': 'Count', 'rows': 'Count', 'bytes': 'Bytes'}
+
+# {phase: milliseconds}, {counter: n}, when the invocation started, and its
+# Lambda context (None outside Lambda).
+_PHASES = {}
+_COUNTERS = {}
+_started = [time.perf_counter()]
+_context = [None]
+
+
+def start_invocation(context=None):
+    """Forget the previous invocation's phases and counters."""
+    _PHASES.clear()
+    _COUNTERS.clear()
+    _started[0] = time.perf_counter()
+    _context[0] = context
+
+
+def remaining_ms():
+    """Milliseconds left before Lambda stops this invocation, or None when
+    there is no deadline to read (tests, tools, a context without one)."""
+    remaining = getattr(_context[0], 'get_remaining_time_in_millis', None)
+    return remaining() if remaining is not None else None
+
+
+@contextmanager
+def span(phase):
+    """Add the time spent inside the block to `phase`, even when it raises."""
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        _PHASES[phase] = _PHASES.get(phase, 0.0) + (time.perf_counter() - began) * 1000
+
+
+def count(counter, n=1):
+    _COUNTERS[counter] = _COUNTERS.get(counter, 0) + n
+
+
+def phases():
+    """{phase: ms} so far, plus the running `total`."""
+    return dict(_PHASES, total=(time.perf_counter() - _started[0]) * 1000)
+
+
+def server_timing(measured):
+    """`Server-Timing` header value for a `phases()` snapshot."""
+    return ', '.join(f"{phase};dur={ms:.1f}" for phase, ms in measured.items())
+
+
+def finish_invocation(response, route):
+    """Stamp `Server-Timing` on `response` and print its EMF metrics line.
+
+    `bytes` is the body as it leaves the function — compressed and base64'd
+    when it was — which is what counts against Lambda's 6 MB response cap.
+    """
+    body = response.get('body') if isinstance(response, dict) else None
+    count('bytes', len(body) if body else 0)
+    measured = phases()
+
+    if isinstance(response, dict):
+        headers = response.setdefault('headers', {})
+        headers['Server-Timing'] = server_timing(measured)
+        # Without it a browser reports the header's durations as zero on a
+        # cross-origin request — which is every request the Darwin UI makes.
+        headers['Timing-Allow-Origin'] = '*'
+
+    metrics = [{'Name': f"{phase}_ms", 'Unit': 'Milliseconds'} for phase in measured]
+    metrics += [{'Name': counter, 'Unit': COUNTER_UNITS.get(counter, 'Count')}
+                for counter in _COUNTERS]
+    document = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{'Namespace': METRICS_NAMESPACE,
+                                   'Dimensions': [['Route']],
+                                   'Metrics': metrics}],
+        },
+        'Route': route,
+        'status': response.get('statusCode') if isinstance(response, dict) else None,
+        **{f"{phase}_ms": round(ms, 2) for phase, ms in measured.items()},
+        **_COUNTERS,
+    }
+    print(json.dumps(document, separators=(',', ':')))
+    return document
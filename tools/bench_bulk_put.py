@@ -0,0 +1,130 @@
+"""Multi-row PUT: the `case` engine against the `join` engine at 100 / 1k / 10k rows.
+
+    python3 tools/bench_bulk_put.py [--rows 100,1000,10000] [--repeat 3] [--execute]
+
+Without `--execute` it needs no database and reports the Lambda side: time
+to build the statement(s), their parameter count and expanded SQL size (what
+has to fit in max_allowed_packet).
+
+With `--execute` (after `. exports.sh`) it also runs each engine against a
+TEMPORARY table of `tasks`-shaped rows on the configured server and reports
+the best server round trip. Each run flips `done` and reassigns `sort_order`
+on every row, the shape of a hand-sort save or a bulk status flip, so every
+row really changes. The temporary table disappears with the connection.
+
+    case   UPDATE t SET done = CASE id WHEN .. THEN .. ELSE done END, ...
+           WHERE id IN (...)
+    join   UPDATE t JOIN (VALUES ROW(..), ...) AS v ON t.id = v.column_0
+           SET t.done = v.column_1, ...          (UNION ALL before 8.0.19)
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pymysql  # noqa: E402
+from pymysql.converters import escape_item  # noqa: E402
+
+from rest_put import case_update, join_updates  # noqa: E402
+from schema_cache import supports_values_rows  # noqa: E402
+
+TABLE = 'bench_bulk_put'
+SCOPE = ('creator_fk = %s', ['37df7531-0000-4000-8000-000000000000'])
+
+
+def make_rows(n, flip):
+    """[(id, {column: value})] — one reorder-and-flip save over n rows."""
+    return [(i, {'done': (i + flip) % 2, 'sort_order': n - i if flip else i})
+            for i in range(1, n + 1)]
+
+
+def build(engine, rows, values_rows):
+    if engine == 'case':
+        return [case_update(TABLE, rows, SCOPE)]
+    return join_updates(TABLE, rows, SCOPE, values_rows=values_rows)
+
+
+def expanded_size(statements):
+    """Bytes of SQL the server receives once pymysql interpolates the params."""
+    return sum(len(sql % tuple(escape_item(p, 'utf8mb4') for p in params))
+               for sql, params, _ in statements)
+
+
+def measure_build(engine, n, repeat, values_rows):
+    best = None
+    for _ in range(repeat):
+        rows = make_rows(n, 0)
+        start = time.perf_counter()
+        statements = build(engine, rows, values_rows)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    params = sum(len(p) for _, p, _ in statements)
+    return best, len(statements), params, expanded_size(statements)
+
+
+def connect():
+    return pymysql.connect(host=os.environ['endpoint'], user=os.environ['username'],
+                           password=os.environ['db_password'],
+                           database=os.environ.get('db_name', 'darwin_dev'),
+                           autocommit=True)
+
+
+def prepare(conn, n):
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {TABLE}")
+        cursor.execute(f"""CREATE TEMPORARY TABLE {TABLE} (
+                               id INT PRIMARY KEY, done TINYINT NOT NULL,
+                               sort_order INT NOT NULL, creator_fk VARCHAR(64) NOT NULL
+                           ) ENGINE=InnoDB""")
+        for start in range(1, n + 1, 1000):
+            ids = range(start, min(start + 1000, n + 1))
+            cursor.execute(f"INSERT INTO {TABLE} VALUES "
+                           + ', '.join(['(%s, 0, %s, %s)'] * len(ids)),
+                           [v for i in ids for v in (i, i, SCOPE[1][0])])
+
+
+def measure_execute(conn, engine, n, repeat, values_rows):
+    prepare(conn, n)
+    best = None
+    for run in range(repeat):
+        statements = build(engine, make_rows(n, (run + 1) % 2), values_rows)
+        start = time.perf_counter()
+        conn.begin()
+        with conn.cursor() as cursor:
+            for sql, params, _ in statements:
+                cursor.execute(sql, tuple(params))
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='100,1000,10000')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--execute', action='store_true',
+                        help='also time each engine on the configured server')
+    args = parser.parse_args()
+
+    conn = connect() if args.execute else None
+    values_rows = supports_values_rows(conn) if conn is not None else True
+
+    header = f"{'rows':>8}  {'engine':<7}{'build ms':>10}{'stmts':>7}{'params':>9}{'SQL KiB':>10}"
+    print(header + (f"{'server ms':>11}" if conn is not None else ''))
+    for n in (int(x) for x in args.rows.split(',')):
+        for engine in ('case', 'join'):
+            elapsed, count, params, size = measure_build(engine, n, args.repeat,
+                                                         values_rows)
+            line = (f"{n:>8}  {engine:<7}{elapsed * 1000:>10.1f}{count:>7}"
+                    f"{params:>9}{size / 1024:>10.1f}")
+            if conn is not None:
+                line += f"{measure_execute(conn, engine, n, args.repeat, values_rows) * 1000:>11.1f}"
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Peak memory and latency of the two GET read engines at 1k / 10k / 100k rows.
+
+    python3 tools/bench_get_engines.py [--rows 1000,10000,100000] [--repeat 3]
+
+Measures the Lambda side of each engine — what the function's memory ceiling
+and billed duration actually pay for — with the database's half replaced by
+its output:
+
+  group_concat  MySQL's GROUP_CONCAT text arrives as one str; it is
+                `json.loads`-ed and then `json.dumps`-ed by
+                `compose_rest_response`, exactly as `rest_get_table` does.
+  stream        rows arrive in `fetchmany` batches from an unbuffered cursor
+                and are encoded by `row_stream.encode_rows` straight into the
+                body.
+
+The server-side cost of building a GROUP_CONCAT string (and the
+`group_concat_max_len` truncation it risks) is not in these numbers; on RDS it
+only adds to the group_concat column. No database or `exports.sh` needed.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from row_stream import encode_rows, json_value, mysql_key_order  # noqa: E402
+
+# A `tasks`-shaped row: the table the Darwin frontend lists most.
+COLUMNS = ['id', 'priority', 'done', 'description', 'area_fk', 'sort_order',
+           'create_ts', 'update_ts', 'done_ts', 'creator_fk']
+TYPES = {'create_ts': 'datetime', 'update_ts': 'datetime', 'done_ts': 'datetime'}
+_BASE_TS = datetime(2026, 1, 1, 8, 0, 0)
+
+
+def make_row(i):
+    ts = _BASE_TS + timedelta(minutes=i)
+    return (i, i % 2, i % 3 == 0, f"Task number {i} with a realistic description",
+            1000 + i % 50, Decimal(i % 200), ts, ts, None if i % 3 else ts,
+            '37df7531-0000-4000-8000-000000000000')
+
+
+def mysql_text(n):
+    """The string GROUP_CONCAT(JSON_OBJECT(...)) would hand back for n rows."""
+    ordered = mysql_key_order(COLUMNS)
+    positions = [COLUMNS.index(name) for name in ordered]
+    parts = []
+    for i in range(n):
+        row = make_row(i)
+        parts.append(json.dumps({name: json_value(row[pos], TYPES.get(name, ''))
+                                 for name, pos in zip(ordered, positions)}))
+    return '[' + ', '.join(parts) + ']'
+
+
+class BatchCursor:
+    """An unbuffered cursor over pre-decoded rows.
+
+    Row decoding is the driver's cost under either engine, so it happens
+    before measurement; `fetchmany` only hands out one batch at a time.
+    """
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._next = 0
+
+    def fetchmany(self, size):
+        batch = self._rows[self._next:self._next + size]
+        self._next += len(batch)
+        return batch
+
+
+def run_group_concat(text):
+    text = ''.join([text])                   # the driver's copy of the one big cell
+    body = json.dumps(json.loads(text))      # rest_get_table + compose_rest_response
+    return len(body)
+
+
+def run_stream(rows):
+    body, _count = encode_rows(BatchCursor(rows), COLUMNS, TYPES)
+    return len(body)
+
+
+def measure(engine, n, repeat):
+    """(best seconds, peak traced bytes, body bytes).
+
+    Latency is timed with tracemalloc OFF — it taxes every allocation, and the
+    stream engine makes many small ones — then one traced run takes the peak.
+    """
+    source = mysql_text(n) if engine is run_group_concat else [make_row(i) for i in range(n)]
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = engine(source)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    engine(source)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}  {'engine':<13}{'best ms':>10}{'peak MiB':>11}{'body MiB':>11}")
+    for n in (int(x) for x in args.rows.split(',')):
+        for name, engine in (('group_concat', run_group_concat), ('stream', run_stream)):
+            elapsed, peak, size = measure(engine, n, args.repeat)
+            print(f"{n:>8}  {name:<13}{elapsed * 1000:>10.1f}"
+                  f"{peak / 2 ** 20:>11.2f}{size / 2 ** 20:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
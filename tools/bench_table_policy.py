@@ -0,0 +1,83 @@
+"""Per-request cost of deciding a table's policy: the registry ladder against
+the compiled `TablePolicy`.
+
+    python3 tools/bench_table_policy.py [--number 200000] [--repeat 5]
+
+`ladder` is what each verb did before `auth_utils.TablePolicy`: the if/elif
+over `CREATOR_FK_TABLES`, `PROFILE_TABLE` and `JUNCTION_OWNERSHIP`, the
+junction subquery formatted on demand, the references and enum columns
+looked up and sorted per call. `policy` is one dict lookup and the
+precomputed answers. Both derive everything a single-row PUT asks about its
+table — scope, creator_fk override, references, enum columns — and the two
+are checked to agree before anything is timed.
+
+One table of each kind, plus one no registry names. No database needed.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from auth_utils import (CREATOR_FK_TABLES, CREATOR_TABLE_REFERENCES,  # noqa: E402
+                        ENUM_COLUMNS, JUNCTION_OWNERSHIP, PROFILE_TABLE,
+                        table_policy)
+
+USER = '37df7531-0000-4000-8000-000000000000'
+
+# creator_fk with references, profile, junction, unregistered.
+TABLES = ('requirements', 'profiles', 'pipeline_step_deps', 'bench_unregistered')
+
+
+def ladder(table, user):
+    """The pre-policy derivation, as the verbs spelled it."""
+    if table in CREATOR_FK_TABLES:
+        scope = 'creator_fk = %s', [user]
+    elif table == PROFILE_TABLE:
+        scope = 'id = %s', [user]
+    else:
+        entry = JUNCTION_OWNERSHIP.get(table)
+        if entry is not None:
+            column, parent = entry['scope']
+            scope = f"{column} IN (SELECT id FROM {parent} WHERE creator_fk = %s)", [user]
+        else:
+            scope = None
+    entry = JUNCTION_OWNERSHIP.get(table)
+    if entry is not None:
+        references = [entry['scope']] + list(entry.get('verify', ()))
+    else:
+        references = list(CREATOR_TABLE_REFERENCES.get(table, ()))
+    enums = tuple(sorted(ENUM_COLUMNS.get(table, ())))
+    return scope, table in CREATOR_FK_TABLES, references, enums
+
+
+def compiled(table, user):
+    policy = table_policy(table)
+    return (policy.scope(user), policy.creator_fk, list(policy.references),
+            policy.enum_columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for table in TABLES:
+        assert ladder(table, USER) == compiled(table, USER), table
+
+    print(f"{'table':<22}{'ladder ns':>11}{'policy ns':>11}{'speedup':>9}")
+    for table in TABLES:
+        timings = {}
+        for name, derive in (('ladder', ladder), ('policy', compiled)):
+            best = min(timeit.repeat(lambda: derive(table, USER),
+                                     number=args.number, repeat=args.repeat))
+            timings[name] = best / args.number * 1e9
+        print(f"{table:<22}{timings['ladder']:>11.0f}{timings['policy']:>11.0f}"
+              f"{timings['ladder'] / timings['policy']:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
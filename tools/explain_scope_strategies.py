@@ -0,0 +1,194 @@
+"""EXPLAIN every spelling of a junction's scope predicate against seeded data,
+and count the rows each one really examines.
+
+    python3 tools/explain_scope_strategies.py [--host 127.0.0.1] [--port 3306]
+        [--user root] [--password ...] [--database scope_explain]
+        [--tables map_coordinates,pipeline_step_requirements]
+        [--users 50] [--parents 20] [--children 500]
+
+Point it at a LOCAL MySQL stand-in, never at RDS. It creates the scoped table
+and its parent under their real names in `--database` (created when missing),
+in the minimal shape the predicate touches — `id`, the scope column with its
+index, `creator_fk` with its index — and seeds `--users` creators each owning
+`--parents` parents with `--children` children apiece. It refuses a database
+holding any other table, so it cannot drop anything it did not create.
+
+Every form comes from `auth_utils`, so what is measured is the SQL the gateway
+sends:
+
+    in       junction_scope_clause(table, 'in')
+    exists   junction_scope_clause(table, 'exists')
+    ids      scope_id_list_clause() over owned_parent_ids() — one extra query,
+             not counted below
+    join     `JOIN parent ON parent.id = t.col AND parent.creator_fk = %s`,
+             for comparison only: the gateway cannot spell it (see the
+             `strategy` comment in auth_utils)
+
+for three statements — the scoped SELECT, an UPDATE, and a `_purge`-shaped
+`DELETE ... ORDER BY id LIMIT 1000` — each over all of one creator's rows and
+over one parent's. `est` is EXPLAIN's row estimate summed over the plan;
+`examined` is the session's Handler_read_* delta for actually running it,
+inside a transaction that is rolled back.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pymysql  # noqa: E402
+
+from auth_utils import (JUNCTION_OWNERSHIP, junction_scope_clause,  # noqa: E402
+                        owned_parent_ids, scope_id_list_clause)
+
+FORMS = ('in', 'exists', 'ids', 'join')
+
+
+def connect(args):
+    conn = pymysql.connect(host=args.host, port=args.port, user=args.user,
+                           password=args.password, autocommit=True)
+    with conn.cursor() as cursor:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {args.database}")
+    conn.select_db(args.database)
+    return conn
+
+
+def seed(conn, database, tables, users, parents, children):
+    """Create and fill every scoped table and its parent; refuse a database
+    that holds anything else."""
+    ours = {name for table in tables
+            for name in (table, JUNCTION_OWNERSHIP[table]['scope'][1])}
+    with conn.cursor() as cursor:
+        cursor.execute("SHOW TABLES")
+        foreign = sorted({row[0] for row in cursor.fetchall()} - ours)
+        if foreign:
+            sys.exit(f"refusing to seed: {database} also holds {foreign}")
+
+        for table in tables:
+            column, parent = JUNCTION_OWNERSHIP[table]['scope']
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(f"DROP TABLE IF EXISTS {parent}")
+            cursor.execute(f"""CREATE TABLE {parent} (
+                                   id INT AUTO_INCREMENT PRIMARY KEY,
+                                   creator_fk VARCHAR(64) NOT NULL,
+                                   KEY (creator_fk)) ENGINE=InnoDB""")
+            cursor.execute(f"""CREATE TABLE {table} (
+                                   id INT AUTO_INCREMENT PRIMARY KEY,
+                                   {column} INT NOT NULL,
+                                   payload INT NOT NULL DEFAULT 0,
+                                   KEY ({column})) ENGINE=InnoDB""")
+            cursor.executemany(f"INSERT INTO {parent} (creator_fk) VALUES (%s)",
+                               [(f"user-{u}",) for u in range(users)
+                                for _ in range(parents)])
+            parent_ids = range(1, users * parents + 1)
+            for start in range(0, len(parent_ids), 100):
+                batch = parent_ids[start:start + 100]
+                cursor.execute(f"INSERT INTO {table} ({column}) VALUES "
+                               + ', '.join(['(%s)'] * (len(batch) * children)),
+                               [p for p in batch for _ in range(children)])
+            cursor.execute(f"ANALYZE TABLE {parent}, {table}")
+            cursor.fetchall()
+
+
+def statements(conn, table, form, user, one_parent):
+    """{kind: (sql, params)} for one form; a kind the form cannot spell is
+    absent."""
+    column, parent = JUNCTION_OWNERSHIP[table]['scope']
+    extra, extra_params = '', []
+    if one_parent is not None:
+        extra, extra_params = f" AND {table}.{column} = %s", [one_parent]
+
+    if form == 'join':
+        join = (f"JOIN {parent} ON {parent}.id = {table}.{column} "
+                f"AND {parent}.creator_fk = %s")
+        where = f" WHERE {extra[5:]}" if extra else ''
+        params = [user] + extra_params
+        return {
+            'select': (f"SELECT {table}.id FROM {table} {join}{where}", params),
+            'update': (f"UPDATE {table} {join} SET {table}.payload = "
+                       f"{table}.payload + 1{where}", params),
+        }
+
+    if form == 'ids':
+        ids = owned_parent_ids(conn, parent, user)
+        if ids is None:
+            sys.exit(f"{user} owns more {parent} than scope_id_list_max; "
+                     "seed fewer --parents")
+        scope, scope_params = scope_id_list_clause(column, ids), ids
+    else:
+        scope, scope_params = junction_scope_clause(table, form), [user]
+    where = f"WHERE {scope}{extra}"
+    params = scope_params + extra_params
+    return {
+        'select': (f"SELECT id FROM {table} {where}", params),
+        'update': (f"UPDATE {table} SET payload = payload + 1 {where}", params),
+        'delete': (f"DELETE FROM {table} {where} ORDER BY id LIMIT 1000", params),
+    }
+
+
+def handler_reads(cursor):
+    cursor.execute("SHOW SESSION STATUS LIKE 'Handler_read%'")
+    return sum(int(value) for _, value in cursor.fetchall())
+
+
+def measure(conn, sql, params):
+    """(EXPLAIN's summed row estimate, plan, rows examined running it)."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {sql}", params)
+        names = [d[0] for d in cursor.description]
+        plan = [dict(zip(names, row)) for row in cursor.fetchall()]
+        estimate = sum(int(step['rows'] or 0) for step in plan)
+        access = ' '.join(f"{step['table']}:{step['type']}" for step in plan)
+
+        # Two back-to-back reads calibrate what SHOW STATUS itself costs.
+        first = handler_reads(cursor)
+        overhead = handler_reads(cursor) - first
+        conn.begin()
+        try:
+            before = handler_reads(cursor)
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            examined = handler_reads(cursor) - before - overhead
+        finally:
+            conn.rollback()
+    return estimate, access, examined
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default=os.environ.get('MYSQL_PWD', ''))
+    parser.add_argument('--database', default='scope_explain')
+    parser.add_argument('--tables', default='map_coordinates,pipeline_step_requirements')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--parents', type=int, default=20)
+    parser.add_argument('--children', type=int, default=500)
+    args = parser.parse_args()
+
+    tables = [table for table in args.tables.split(',') if table]
+    unknown = [table for table in tables if table not in JUNCTION_OWNERSHIP]
+    if unknown:
+        sys.exit(f"not junction tables: {unknown}")
+
+    conn = connect(args)
+    seed(conn, args.database, tables, args.users, args.parents, args.children)
+    user = 'user-0'
+
+    print(f"{'table':<28}{'rows':<11}{'form':<8}{'stmt':<8}{'est':>10}"
+          f"{'examined':>10}  plan")
+    for table in tables:
+        # The creator's first parent is id 1: parents were seeded per user.
+        for rows, one_parent in (('mine', None), ('one', 1)):
+            for form in FORMS:
+                for kind, (sql, params) in statements(conn, table, form, user,
+                                                      one_parent).items():
+                    estimate, access, examined = measure(conn, sql, params)
+                    print(f"{table:<28}{rows:<11}{form:<8}{kind:<8}{estimate:>10}"
+                          f"{examined:>10}  {access}")
+
+
+if __name__ == '__main__':
+    main()